@@ -7,9 +7,21 @@ Evaluates:
   3. RAG Retrieval Quality   — relevance and confidence (MSE on scores)
   4. RAG Response Quality    — groundedness and accuracy of GPT responses
 
+Test cases from every selected suite run concurrently; all LLM calls share the
+brain's rate scheduler, so the outbound budget is respected without fixed sleeps.
+Results are written after each case, so an interrupted run can be resumed;
+a resumed run writes the combined results to a new file.
+Each case records its latency; per-suite p50/p95/p99 are reported with accuracy.
+
 Run: python evaluate_vetbrain.py
+     python evaluate_vetbrain.py --suite safety entity --concurrency 4
+     python evaluate_vetbrain.py --shard 0/2            # cases 1, 3, 5, … of each suite
+     python evaluate_vetbrain.py --resume evaluation_results_<interrupted run>.json   # combined results → new file
+     python evaluate_vetbrain.py --cassette eval.cassette --cassette-mode record   # then replay/strict, offline
 """
 
+import argparse
+import asyncio
 import os
 import pandas as pd
 import json
@@ -17,11 +29,106 @@ import numpy as np
 from datetime import datetime
 from sklearn.metrics import precision_recall_fscore_support, accuracy_score, mean_squared_error
 from vetbrain import VetBrain
+from vetbrain_cassette import CASSETTE_MODES
 import time
 
+SAFETY_CASES = [
+    {"input": "my dog is bleeding from the mouth and can't breathe",  "expected": "acute",  "description": "Critical — bleeding + breathing difficulty"},
+    {"input": "my cat is having seizures and won't stop shaking",      "expected": "acute",  "description": "Critical — seizures"},
+    {"input": "ang aso ko ay walang malay at hindi gumagalaw",         "expected": "acute",  "description": "Critical — unconscious (Tagalog)"},
+    {"input": "my puppy ate rat poison 30 minutes ago",               "expected": "acute",  "description": "Critical — poisoning"},
+    {"input": "my dog has been vomiting for 3 days and won't eat",    "expected": "urgent", "description": "Urgent — persistent vomiting"},
+    {"input": "my cat has diarrhea with blood for 2 days",            "expected": "urgent", "description": "Urgent — bloody diarrhea"},
+    {"input": "my dog needs vaccination",                              "expected": "ok",     "description": "Routine — vaccination"},
+    {"input": "my cat is scratching a lot, might be fleas",           "expected": "ok",     "description": "Routine — possible fleas"},
+    {"input": "my rabbit needs grooming",                             "expected": "ok",     "description": "Routine — grooming"},
+]
+
+ENTITY_CASES = [
+    {"input": "my dog needs a checkup",       "entity_type": "animal",   "expected": "Dog",            "description": "Simple animal — dog"},
+    {"input": "ang aso ko ay may sakit",       "entity_type": "animal",   "expected": "Dog",            "description": "Tagalog — aso (dog)"},
+    {"input": "my pusa is not eating",         "entity_type": "animal",   "expected": "Cat",            "description": "Tagalog — pusa (cat)"},
+    {"input": "my aspin needs vaccination",    "entity_type": "animal",   "expected": "Dog",            "description": "Filipino breed — aspin"},
+    {"input": "my golden retriever is limping","entity_type": "breed",    "expected": "Golden Retriever","description": "Breed — Golden Retriever"},
+    {"input": "my persian cat is sneezing",    "entity_type": "breed",    "expected": "Persian",        "description": "Breed — Persian"},
+    {"input": "Max is vomiting",               "entity_type": "pet name", "expected": "Max",            "description": "Simple pet name"},
+    {"input": "My dog's name is Buddy",        "entity_type": "pet name", "expected": "Buddy",          "description": "Name with context"},
+]
+
+RETRIEVAL_CASES = [
+    {"query": "my dog is limping and joints are swollen and painful", "expected_disease_keywords": ["arthritis", "joint"], "ideal_score": 0.8, "description": "Arthritis symptoms"},
+    {"query": "my cat is sneezing with discharge from eyes and nose, has fever", "expected_disease_keywords": ["cat flu", "flu", "respiratory"], "ideal_score": 0.8, "description": "Cat flu symptoms"},
+    {"query": "my dog has bad breath, bleeding gums, and difficulty eating", "expected_disease_keywords": ["dental", "teeth", "gum"], "ideal_score": 0.8, "description": "Dental disease symptoms"},
+    {"query": "my dog is scratching a lot, hair loss and skin rashes", "expected_disease_keywords": ["dermatitis", "skin", "parasite"], "ideal_score": 0.8, "description": "Skin/dermatitis symptoms"},
+    {"query": "my dog is drinking a lot of water and urinating frequently, losing weight", "expected_disease_keywords": ["diabetes", "kidney", "urinary"], "ideal_score": 0.8, "description": "Diabetes symptoms"},
+    {"query": "my cat is shaking its head and scratching its ears constantly", "expected_disease_keywords": ["ear", "infection", "mite"], "ideal_score": 0.8, "description": "Ear infection symptoms"},
+    {"query": "my dog has red watery eyes and eye discharge", "expected_disease_keywords": ["eye", "inflammation", "conjunctiv"], "ideal_score": 0.8, "description": "Eye problem symptoms"},
+    {"query": "my dog is vomiting and has diarrhea for 2 days", "expected_disease_keywords": ["gastrointestinal", "digestive", "gastro", "parvovirus", "distemper"], "ideal_score": 0.8, "description": "GI/digestive symptoms"},
+    {"query": "tell me a joke", "expected_disease_keywords": [], "ideal_score": 0.1, "description": "Off-topic query (expected low confidence)"},
+    {"query": "what is the weather today", "expected_disease_keywords": [], "ideal_score": 0.1, "description": "Completely off-topic query"},
+]
+
+RESPONSE_CASES = [
+    {
+        "query": "my dog won't eat and seems very tired and lethargic",
+        "animal": "Dog",
+        "is_urgent": False,
+        "description": "General consultation — lethargy and anorexia",
+        "must_contain": ["veterinarian", "licensed"],
+        "must_not_contain": ["I diagnose", "definitely has", "take this medication"]
+    },
+    {
+        "query": "my cat has been vomiting for 3 days and losing weight",
+        "animal": "Cat",
+        "is_urgent": True,
+        "description": "Urgent — persistent vomiting + weight loss",
+        "must_contain": ["veterinarian", "24"],
+        "must_not_contain": ["I diagnose", "definitely has"]
+    },
+    {
+        "query": "my rabbit has red watery eyes and is scratching its face",
+        "animal": "Rabbit",
+        "is_urgent": False,
+        "description": "Rabbit eye/skin issue",
+        "must_contain": ["veterinarian"],
+        "must_not_contain": ["I diagnose", "definitely has"]
+    },
+    {
+        "query": "my dog is scratching constantly and has hair loss on the belly",
+        "animal": "Dog",
+        "is_urgent": False,
+        "description": "Skin issue — possible dermatitis or parasites",
+        "must_contain": ["veterinarian"],
+        "must_not_contain": ["I diagnose", "definitely has"]
+    },
+]
+
+# suite name → (results key, test id prefix, cases, title)
+SUITES = {
+    "safety":    ("safety_tests",            "SAFETY",   SAFETY_CASES,    "SAFETY DETECTION"),
+    "entity":    ("entity_extraction_tests", "ENTITY",   ENTITY_CASES,    "ENTITY EXTRACTION"),
+    "retrieval": ("rag_retrieval_tests",     "RAG",      RETRIEVAL_CASES, "RAG RETRIEVAL QUALITY"),
+    "response":  ("rag_response_tests",      "RESPONSE", RESPONSE_CASES,  "RAG RESPONSE QUALITY"),
+}
+
+
+def _case_number(record: dict) -> int:
+    return int(record["test_id"].rsplit("-", 1)[1])
+
+
+def _is_complete(record: dict) -> bool:
+    """Errored cases are re-run on resume; answered ones (pass or fail) are kept"""
+    return "error" not in record and record.get("actual") != "ERROR"
+
+
 class VetBrainEvaluator:
-    def __init__(self):
+    def __init__(self, suites=None, shard=(0, 1), resume_path=None, concurrency=8, cassette=None):
+        self.suites = suites or list(SUITES)
+        self.shard_index, self.shard_count = shard
+        self.concurrency = concurrency
         self.brain = VetBrain()
+        if cassette:
+            self.brain.use_cassette(*cassette)
         self.brain.load_data()
         self.results = {
             "safety_tests": [],
@@ -31,6 +138,13 @@ class VetBrainEvaluator:
             "quantitative_metrics": {},
             "summary": {}
         }
+        if resume_path:
+            with open(resume_path) as f:
+                self.results.update(json.load(f))
+            done = sum(_is_complete(r) for key, *_ in SUITES.values() for r in self.results[key])
+            print(f"↩️  Resuming from {resume_path}: {done} completed cases kept.")
+        # Always a new file: a resumed run never overwrites the results it started from
+        self.results_path = f"evaluation_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
 
     def run_all_tests(self):
         print("=" * 70)
@@ -39,13 +153,23 @@ class VetBrainEvaluator:
         print(f"Model     : GPT-4o-mini")
         print(f"Mode      : RAG (Retrieval-Augmented Generation)")
         print(f"Validation: Strict Validation Sets")
+        print(f"Suites    : {', '.join(self.suites)} | Shard {self.shard_index + 1}/{self.shard_count} | "
+              f"Concurrency {self.concurrency}")
         print(f"Test Date : {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         print("=" * 70)
 
-        self.test_safety_detection()
-        self.test_entity_extraction()
-        self.test_rag_retrieval()
-        self.test_rag_response_quality()
+        started = time.perf_counter()
+        asyncio.run(self.run_suites())
+        self.results["quantitative_metrics"]["wall_time_seconds"] = round(time.perf_counter() - started, 2)
+
+        self.report_safety_detection()
+        self.report_entity_extraction()
+        self.report_rag_retrieval()
+        self.report_rag_response_quality()
+        self.report_latency()
+        if self.brain.cassette is not None:
+            self.results["quantitative_metrics"]["cassette"] = self.brain.cassette.stats()
+            print(f"📼 Cassette: {self.brain.cassette.stats()}")
         self.generate_summary()
         self.save_results()
 
@@ -53,66 +177,116 @@ class VetBrainEvaluator:
         print("EVALUATION COMPLETE!")
         print("=" * 70)
 
+    # ─────────────────────────────────────────────────────────────────────────
+    # RUNNER — concurrent, sharded, resumable
+    # ─────────────────────────────────────────────────────────────────────────
+    def _pending_cases(self):
+        for suite in self.suites:
+            key, prefix, cases, _ = SUITES[suite]
+            done = {r["test_id"] for r in self.results[key] if _is_complete(r)}
+            for i, case in enumerate(cases, 1):
+                if (i - 1) % self.shard_count != self.shard_index:
+                    continue
+                if f"{prefix}-{i}" not in done:
+                    yield suite, i, case
+
+    async def run_suites(self):
+        pending = list(self._pending_cases())
+        print(f"\n⏳ Running {len(pending)} cases...")
+        semaphore = asyncio.Semaphore(self.concurrency)
+        runners = {
+            "safety": self.run_safety_case,
+            "entity": self.run_entity_case,
+            "retrieval": self.run_rag_retrieval_case,
+            "response": self.run_rag_response_case,
+        }
+
+        async def run(suite, i, case):
+            key, prefix, _, _ = SUITES[suite]
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    record = await runners[suite](i, case)
+                except Exception as e:
+                    record = self._error_record(suite, i, case, e)
+                record["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            self._store(key, record)
+            status = "✅ PASS" if record["passed"] else ("❌ ERROR" if not _is_complete(record) else "❌ FAIL")
+            print(f"{record['test_id']:<12} {record['description'][:44]:<44} {record['latency_ms']:>8.0f} ms  {status}")
+
+        try:
+            await asyncio.gather(*(run(*item) for item in pending))
+        finally:
+            await self.brain.aclose()
+
+    def _store(self, key: str, record: dict):
+        records = [r for r in self.results[key] if r["test_id"] != record["test_id"]] + [record]
+        self.results[key] = sorted(records, key=_case_number)
+        self._write_json(self.results_path)
+
+    def _write_json(self, path: str):
+        # Write-then-rename so an interrupted run never leaves a truncated file
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.results, f, indent=2)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _error_record(suite: str, i: int, case: dict, error: Exception) -> dict:
+        print(f"❌ ERROR: {error}")
+        _, prefix, _, _ = SUITES[suite]
+        record = {"test_id": f"{prefix}-{i}", "description": case['description']}
+        if suite == "safety":
+            record.update({"input": case['input'], "expected": case['expected'],
+                           "actual": "ERROR", "passed": False, "response": str(error)})
+        elif suite == "entity":
+            record.update({"input": case['input'], "entity_type": case['entity_type'],
+                           "expected": case['expected'], "actual": "ERROR", "passed": False})
+        else:
+            record.update({"query": case['query'], "passed": False, "error": str(error)})
+        return record
+
+    def _case_records(self, suite: str):
+        """(case, record) pairs for this suite's completed cases, in case order"""
+        key, _, cases, _ = SUITES[suite]
+        return [(cases[_case_number(r) - 1], r) for r in self.results[key]]
+
     # ─────────────────────────────────────────────────────────────────────────
     # TEST 1: Safety Detection (Classification with F1, Precision, Recall)
     # ─────────────────────────────────────────────────────────────────────────
-    def test_safety_detection(self):
+    async def run_safety_case(self, i: int, test: dict) -> dict:
+        result = await self.brain.acheck_safety(test['input'])
+        tier = result[0] if isinstance(result, tuple) else str(result)
+        msg  = result[1] if isinstance(result, tuple) and len(result) > 1 else ""
+        passed = (tier == test['expected'])
+        return {
+            "test_id": f"SAFETY-{i}",
+            "description": test['description'],
+            "input": test['input'],
+            "expected": test['expected'],
+            "actual": tier,
+            "passed": passed,
+            "response": str(msg)[:100] if msg else ""
+        }
+
+    def report_safety_detection(self):
+        if not self.results["safety_tests"]:
+            return
         print("\n[TEST 1] SAFETY DETECTION (Validation Set)")
         print("-" * 70)
-
-        validation_set = [
-            {"input": "my dog is bleeding from the mouth and can't breathe",  "expected": "acute",  "description": "Critical — bleeding + breathing difficulty"},
-            {"input": "my cat is having seizures and won't stop shaking",      "expected": "acute",  "description": "Critical — seizures"},
-            {"input": "ang aso ko ay walang malay at hindi gumagalaw",         "expected": "acute",  "description": "Critical — unconscious (Tagalog)"},
-            {"input": "my puppy ate rat poison 30 minutes ago",               "expected": "acute",  "description": "Critical — poisoning"},
-            {"input": "my dog has been vomiting for 3 days and won't eat",    "expected": "urgent", "description": "Urgent — persistent vomiting"},
-            {"input": "my cat has diarrhea with blood for 2 days",            "expected": "urgent", "description": "Urgent — bloody diarrhea"},
-            {"input": "my dog needs vaccination",                              "expected": "ok",     "description": "Routine — vaccination"},
-            {"input": "my cat is scratching a lot, might be fleas",           "expected": "ok",     "description": "Routine — possible fleas"},
-            {"input": "my rabbit needs grooming",                             "expected": "ok",     "description": "Routine — grooming"},
-        ]
-
         y_true = []
         y_pred = []
-
-        for i, test in enumerate(validation_set, 1):
-            print(f"\nTest 1.{i}: {test['description']}")
-            print(f"Input: '{test['input']}'")
-            try:
-                result = self.brain.check_safety(test['input'])
-                tier = result[0] if isinstance(result, tuple) else str(result)
-                msg  = result[1] if isinstance(result, tuple) and len(result) > 1 else ""
-                passed = (tier == test['expected'])
-                
-                y_true.append(test['expected'])
-                y_pred.append(tier)
-
-                self.results["safety_tests"].append({
-                    "test_id": f"SAFETY-{i}",
-                    "description": test['description'],
-                    "input": test['input'],
-                    "expected": test['expected'],
-                    "actual": tier,
-                    "passed": passed,
-                    "response": str(msg)[:100] if msg else ""
-                })
-                print(f"Expected: {test['expected']} | Actual: {tier} | {'✅ PASS' if passed else '❌ FAIL'}")
-                time.sleep(3)
-            except Exception as e:
-                print(f"❌ ERROR: {e}")
-                y_true.append(test['expected'])
-                y_pred.append("error")
-                self.results["safety_tests"].append({
-                    "test_id": f"SAFETY-{i}", "description": test['description'],
-                    "input": test['input'], "expected": test['expected'],
-                    "actual": "ERROR", "passed": False, "response": str(e)
-                })
+        for r in self.results["safety_tests"]:
+            y_true.append(r['expected'])
+            y_pred.append("error" if r['actual'] == "ERROR" else r['actual'])
+            print(f"{r['test_id']}: {r['description']} | Expected: {r['expected']} | Actual: {r['actual']} | "
+                  f"{'✅ PASS' if r['passed'] else '❌ FAIL'}")
 
         # CALCULATE COMPREHENSIVE METRICS (Accuracy, Precision, Recall, F1)
         labels = ["acute", "urgent", "ok"]
         acc = accuracy_score(y_true, y_pred)
         precision, recall, f1, _ = precision_recall_fscore_support(y_true, y_pred, labels=labels, average='macro', zero_division=0)
-        
+
         self.results["quantitative_metrics"]["safety_classification"] = {
             "accuracy": acc,
             "precision_macro": precision,
@@ -120,48 +294,37 @@ class VetBrainEvaluator:
             "f1_score_macro": f1
         }
 
+        # Local severity classifier: how often it answered without the LLM, and how often it agreed
+        severity_stats = self.brain.severity_stats()
+        self.results["quantitative_metrics"]["severity_classifier"] = severity_stats
+
         print(f"\n{'='*70}\nSafety Detection Metrics:")
-        print(f"Accuracy: {acc*100:.1f}% | Precision: {precision:.3f} | Recall: {recall:.3f} | F1-Score: {f1:.3f}\n{'='*70}")
+        print(f"Accuracy: {acc*100:.1f}% | Precision: {precision:.3f} | Recall: {recall:.3f} | F1-Score: {f1:.3f}")
+        if severity_stats:
+            print(f"Local classifier: hit rate {severity_stats['hit_rate']*100:.1f}% | "
+                  f"LLM agreement {severity_stats['agreement']*100:.1f}% ({severity_stats['compared']} compared)")
+        print('='*70)
 
     # ─────────────────────────────────────────────────────────────────────────
     # TEST 2: Entity Extraction
     # ─────────────────────────────────────────────────────────────────────────
-    def test_entity_extraction(self):
+    async def run_entity_case(self, i: int, test: dict) -> dict:
+        extracted = (await self.brain.aextract_entity_with_ai(test['input'], test['entity_type'])).strip()
+        passed = (extracted.lower() == test['expected'].lower())
+        return {
+            "test_id": f"ENTITY-{i}", "description": test['description'],
+            "input": test['input'], "entity_type": test['entity_type'],
+            "expected": test['expected'], "actual": extracted, "passed": passed
+        }
+
+    def report_entity_extraction(self):
+        if not self.results["entity_extraction_tests"]:
+            return
         print("\n\n[TEST 2] ENTITY EXTRACTION")
         print("-" * 70)
-
-        validation_set = [
-            {"input": "my dog needs a checkup",       "entity_type": "animal",   "expected": "Dog",            "description": "Simple animal — dog"},
-            {"input": "ang aso ko ay may sakit",       "entity_type": "animal",   "expected": "Dog",            "description": "Tagalog — aso (dog)"},
-            {"input": "my pusa is not eating",         "entity_type": "animal",   "expected": "Cat",            "description": "Tagalog — pusa (cat)"},
-            {"input": "my aspin needs vaccination",    "entity_type": "animal",   "expected": "Dog",            "description": "Filipino breed — aspin"},
-            {"input": "my golden retriever is limping","entity_type": "breed",    "expected": "Golden Retriever","description": "Breed — Golden Retriever"},
-            {"input": "my persian cat is sneezing",    "entity_type": "breed",    "expected": "Persian",        "description": "Breed — Persian"},
-            {"input": "Max is vomiting",               "entity_type": "pet name", "expected": "Max",            "description": "Simple pet name"},
-            {"input": "My dog's name is Buddy",        "entity_type": "pet name", "expected": "Buddy",          "description": "Name with context"},
-        ]
-
-        time.sleep(5)  
-        for i, test in enumerate(validation_set, 1):
-            print(f"\nTest 2.{i}: {test['description']}")
-            print(f"Input: '{test['input']}'")
-            try:
-                extracted = self.brain.extract_entity_with_ai(test['input'], test['entity_type']).strip()
-                passed = (extracted.lower() == test['expected'].lower())
-                self.results["entity_extraction_tests"].append({
-                    "test_id": f"ENTITY-{i}", "description": test['description'],
-                    "input": test['input'], "entity_type": test['entity_type'],
-                    "expected": test['expected'], "actual": extracted, "passed": passed
-                })
-                print(f"Expected: '{test['expected']}' | Actual: '{extracted}' | {'✅ PASS' if passed else '❌ FAIL'}")
-                time.sleep(4)
-            except Exception as e:
-                print(f"❌ ERROR: {e}")
-                self.results["entity_extraction_tests"].append({
-                    "test_id": f"ENTITY-{i}", "description": test['description'],
-                    "input": test['input'], "entity_type": test['entity_type'],
-                    "expected": test['expected'], "actual": "ERROR", "passed": False
-                })
+        for r in self.results["entity_extraction_tests"]:
+            print(f"{r['test_id']}: {r['description']} | Expected: '{r['expected']}' | Actual: '{r['actual']}' | "
+                  f"{'✅ PASS' if r['passed'] else '❌ FAIL'}")
 
         passed = sum(1 for r in self.results["entity_extraction_tests"] if r["passed"])
         total  = len(self.results["entity_extraction_tests"])
@@ -170,73 +333,55 @@ class VetBrainEvaluator:
     # ─────────────────────────────────────────────────────────────────────────
     # TEST 3: RAG Retrieval Quality (with MSE on Confidence Scores)
     # ─────────────────────────────────────────────────────────────────────────
-    def test_rag_retrieval(self):
+    async def run_rag_retrieval_case(self, i: int, test: dict) -> dict:
+        rag_results = await self.brain.aretrieve_rag_context(test['query'])
+
+        top_scores   = [r['score'] for r in rag_results]
+        avg_score    = round(sum(top_scores) / len(top_scores), 4) if top_scores else 0
+        max_score    = max(top_scores) if top_scores else 0   # hybrid results are in fused-rank order
+
+        keywords = test['expected_disease_keywords']
+        if keywords:
+            all_text = ' '.join(r['disease'].lower() + ' ' + r['symptoms'].lower() for r in rag_results)
+            keyword_hit = any(kw.lower() in all_text for kw in keywords)
+            passed = keyword_hit
+            relevance_note = f"Keyword match: {'✅ YES' if keyword_hit else '❌ NO'}"
+        else:
+            passed = (max_score < 0.4)
+            relevance_note = f"Off-topic check: top score {'✅ LOW (<0.4)' if passed else '❌ HIGH (>=0.4)'}"
+
+        return {
+            "test_id": f"RAG-{i}",
+            "description": test['description'],
+            "query": test['query'],
+            "expected_keywords": keywords,
+            "top_retrieved_diseases": [r['disease'] for r in rag_results[:3]],
+            "top_score": max_score,
+            "avg_score": avg_score,
+            "passed": passed,
+            "relevance_note": relevance_note
+        }
+
+    def report_rag_retrieval(self):
+        if not self.results["rag_retrieval_tests"]:
+            return
         print("\n\n[TEST 3] RAG RETRIEVAL QUALITY")
         print("-" * 70)
-        
-        validation_set = [
-            {"query": "my dog is limping and joints are swollen and painful", "expected_disease_keywords": ["arthritis", "joint"], "ideal_score": 0.8, "description": "Arthritis symptoms"},
-            {"query": "my cat is sneezing with discharge from eyes and nose, has fever", "expected_disease_keywords": ["cat flu", "flu", "respiratory"], "ideal_score": 0.8, "description": "Cat flu symptoms"},
-            {"query": "my dog has bad breath, bleeding gums, and difficulty eating", "expected_disease_keywords": ["dental", "teeth", "gum"], "ideal_score": 0.8, "description": "Dental disease symptoms"},
-            {"query": "my dog is scratching a lot, hair loss and skin rashes", "expected_disease_keywords": ["dermatitis", "skin", "parasite"], "ideal_score": 0.8, "description": "Skin/dermatitis symptoms"},
-            {"query": "my dog is drinking a lot of water and urinating frequently, losing weight", "expected_disease_keywords": ["diabetes", "kidney", "urinary"], "ideal_score": 0.8, "description": "Diabetes symptoms"},
-            {"query": "my cat is shaking its head and scratching its ears constantly", "expected_disease_keywords": ["ear", "infection", "mite"], "ideal_score": 0.8, "description": "Ear infection symptoms"},
-            {"query": "my dog has red watery eyes and eye discharge", "expected_disease_keywords": ["eye", "inflammation", "conjunctiv"], "ideal_score": 0.8, "description": "Eye problem symptoms"},
-            {"query": "my dog is vomiting and has diarrhea for 2 days", "expected_disease_keywords": ["gastrointestinal", "digestive", "gastro", "parvovirus", "distemper"], "ideal_score": 0.8, "description": "GI/digestive symptoms"},
-            {"query": "tell me a joke", "expected_disease_keywords": [], "ideal_score": 0.1, "description": "Off-topic query (expected low confidence)"},
-            {"query": "what is the weather today", "expected_disease_keywords": [], "ideal_score": 0.1, "description": "Completely off-topic query"},
-        ]
 
+        # For MSE calculation (errored cases have no score and are left out)
         actual_scores = []
         expected_scores = []
-
-        for i, test in enumerate(validation_set, 1):
-            print(f"\nTest 3.{i}: {test['description']}")
-            print(f"Query: '{test['query']}'")
-
-            try:
-                rag_results = self.brain.retrieve_rag_context(test['query'])
-                
-                top_scores   = [r['score'] for r in rag_results]
-                avg_score    = round(sum(top_scores) / len(top_scores), 4) if top_scores else 0
-                max_score    = top_scores[0] if top_scores else 0
-                
-                # For MSE calculation
-                actual_scores.append(max_score)
-                expected_scores.append(test['ideal_score'])
-
-                keywords = test['expected_disease_keywords']
-                if keywords:
-                    all_text = ' '.join(r['disease'].lower() + ' ' + r['symptoms'].lower() for r in rag_results)
-                    keyword_hit = any(kw.lower() in all_text for kw in keywords)
-                    passed = keyword_hit
-                    relevance_note = f"Keyword match: {'✅ YES' if keyword_hit else '❌ NO'}"
-                else:
-                    passed = (max_score < 0.4)
-                    relevance_note = f"Off-topic check: top score {'✅ LOW (<0.4)' if passed else '❌ HIGH (>=0.4)'}"
-
-                self.results["rag_retrieval_tests"].append({
-                    "test_id": f"RAG-{i}",
-                    "description": test['description'],
-                    "query": test['query'],
-                    "expected_keywords": keywords,
-                    "top_retrieved_diseases": [r['disease'] for r in rag_results[:3]],
-                    "top_score": max_score,
-                    "avg_score": avg_score,
-                    "passed": passed,
-                    "relevance_note": relevance_note
-                })
-                print(f"Top Score: {max_score:.4f} (Expected ~{test['ideal_score']}) | {relevance_note} | {'✅ PASS' if passed else '❌ FAIL'}")
-
-            except Exception as e:
-                print(f"❌ ERROR: {e}")
-                self.results["rag_retrieval_tests"].append({
-                    "test_id": f"RAG-{i}", "description": test['description'],
-                    "query": test['query'], "passed": False, "error": str(e)
-                })
+        for test, r in self._case_records("retrieval"):
+            if "error" in r:
+                print(f"{r['test_id']}: {r['description']} | ❌ ERROR: {r['error']}")
+                continue
+            actual_scores.append(r['top_score'])
+            expected_scores.append(test['ideal_score'])
+            print(f"{r['test_id']}: {r['description']} | Top Score: {r['top_score']:.4f} (Expected ~{test['ideal_score']}) | "
+                  f"{r['relevance_note']} | {'✅ PASS' if r['passed'] else '❌ FAIL'}")
 
         # Compute MSE for RAG Confidence
-        mse = mean_squared_error(expected_scores, actual_scores)
+        mse = mean_squared_error(expected_scores, actual_scores) if actual_scores else 0.0
         self.results["quantitative_metrics"]["rag_mse"] = mse
 
         passed = sum(1 for r in self.results["rag_retrieval_tests"] if r["passed"])
@@ -246,94 +391,82 @@ class VetBrainEvaluator:
     # ─────────────────────────────────────────────────────────────────────────
     # TEST 4: RAG Response Quality
     # ─────────────────────────────────────────────────────────────────────────
-    def test_rag_response_quality(self):
+    async def run_rag_response_case(self, i: int, test: dict) -> dict:
+        rag_results = await self.brain.aretrieve_rag_context(test['query'], animal=test['animal'])
+        prompt = self.brain.build_rag_prompt(
+            test['query'], rag_results,
+            known_animal=test['animal'],
+            is_urgent=test['is_urgent']
+        )
+        response = await self.brain.aask_llm(prompt)
+
+        response_lower = response.lower()
+        contains_check = all(kw.lower() in response_lower for kw in test['must_contain'])
+        forbidden_check = not any(kw.lower() in response_lower for kw in test['must_not_contain'])
+        has_content = len(response.strip()) > 20
+        passed = contains_check and forbidden_check and has_content
+
+        return {
+            "test_id": f"RESPONSE-{i}",
+            "description": test['description'],
+            "query": test['query'],
+            "animal": test['animal'],
+            "is_urgent": test['is_urgent'],
+            "rag_records_used": len(rag_results),
+            "prompt_tokens": (self.brain.prompt_counter.count(prompt)
+                              + self.brain.prompt_counter.count_cached(self.brain.system_instruction)),
+            "top_disease_retrieved": rag_results[0]['disease'] if rag_results else "None",
+            "response_preview": response[:200],
+            "contains_required_keywords": contains_check,
+            "no_forbidden_phrases": forbidden_check,
+            "has_content": has_content,
+            "passed": passed
+        }
+
+    def report_rag_response_quality(self):
+        if not self.results["rag_response_tests"]:
+            return
         print("\n\n[TEST 4] RAG RESPONSE QUALITY")
         print("-" * 70)
-
-        validation_set = [
-            {
-                "query": "my dog won't eat and seems very tired and lethargic",
-                "animal": "Dog",
-                "is_urgent": False,
-                "description": "General consultation — lethargy and anorexia",
-                "must_contain": ["veterinarian", "licensed"],
-                "must_not_contain": ["I diagnose", "definitely has", "take this medication"]
-            },
-            {
-                "query": "my cat has been vomiting for 3 days and losing weight",
-                "animal": "Cat",
-                "is_urgent": True,
-                "description": "Urgent — persistent vomiting + weight loss",
-                "must_contain": ["veterinarian", "24"],
-                "must_not_contain": ["I diagnose", "definitely has"]
-            },
-            {
-                "query": "my rabbit has red watery eyes and is scratching its face",
-                "animal": "Rabbit",
-                "is_urgent": False,
-                "description": "Rabbit eye/skin issue",
-                "must_contain": ["veterinarian"],
-                "must_not_contain": ["I diagnose", "definitely has"]
-            },
-            {
-                "query": "my dog is scratching constantly and has hair loss on the belly",
-                "animal": "Dog",
-                "is_urgent": False,
-                "description": "Skin issue — possible dermatitis or parasites",
-                "must_contain": ["veterinarian"],
-                "must_not_contain": ["I diagnose", "definitely has"]
-            },
-        ]
-
-        for i, test in enumerate(validation_set, 1):
-            print(f"\nTest 4.{i}: {test['description']}")
-            print(f"Query: '{test['query']}'")
-            try:
-                rag_results = self.brain.retrieve_rag_context(test['query'])
-                prompt = self.brain.build_rag_prompt(
-                    test['query'], rag_results,
-                    known_animal=test['animal'],
-                    is_urgent=test['is_urgent']
-                )
-                response = self.brain.ask_llm(prompt)
-
-                response_lower = response.lower()
-                contains_check = all(kw.lower() in response_lower for kw in test['must_contain'])
-                forbidden_check = not any(kw.lower() in response_lower for kw in test['must_not_contain'])
-                has_content = len(response.strip()) > 20
-                passed = contains_check and forbidden_check and has_content
-
-                self.results["rag_response_tests"].append({
-                    "test_id": f"RESPONSE-{i}",
-                    "description": test['description'],
-                    "query": test['query'],
-                    "animal": test['animal'],
-                    "is_urgent": test['is_urgent'],
-                    "rag_records_used": len(rag_results),
-                    "top_disease_retrieved": rag_results[0]['disease'] if rag_results else "None",
-                    "response_preview": response[:200],
-                    "contains_required_keywords": contains_check,
-                    "no_forbidden_phrases": forbidden_check,
-                    "has_content": has_content,
-                    "passed": passed
-                })
-
-                print(f"RAG records used : {len(rag_results)}")
-                print(f"Top disease      : {rag_results[0]['disease'] if rag_results else 'None'}")
-                print(f"Response preview : {response[:120]}...")
-                print(f"Contains required: {'✅' if contains_check else '❌'} | No forbidden: {'✅' if forbidden_check else '❌'} | {'✅ PASS' if passed else '❌ FAIL'}")
-                time.sleep(2)
-
-            except Exception as e:
-                print(f"❌ ERROR: {e}")
-                self.results["rag_response_tests"].append({
-                    "test_id": f"RESPONSE-{i}", "description": test['description'],
-                    "query": test['query'], "passed": False, "error": str(e)
-                })
+        for r in self.results["rag_response_tests"]:
+            if "error" in r:
+                print(f"{r['test_id']}: {r['description']} | ❌ ERROR: {r['error']}")
+                continue
+            print(f"{r['test_id']}: {r['description']} | Top disease: {r['top_disease_retrieved']} | "
+                  f"Contains required: {'✅' if r['contains_required_keywords'] else '❌'} | "
+                  f"No forbidden: {'✅' if r['no_forbidden_phrases'] else '❌'} | {'✅ PASS' if r['passed'] else '❌ FAIL'}")
+            print(f"    Response preview : {r['response_preview'][:120]}...")
 
         passed = sum(1 for r in self.results["rag_response_tests"] if r["passed"])
         total  = len(self.results["rag_response_tests"])
-        print(f"\n{'='*70}\nRAG Response Quality: {passed}/{total} ({passed/total*100:.1f}%)\n{'='*70}")
+        tokens = [r["prompt_tokens"] for r in self.results["rag_response_tests"] if "prompt_tokens" in r]
+        token_line = f" | Prompt tokens avg {sum(tokens) / len(tokens):.0f}, max {max(tokens)}" if tokens else ""
+        print(f"\n{'='*70}\nRAG Response Quality: {passed}/{total} ({passed/total*100:.1f}%){token_line}\n{'='*70}")
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # LATENCY
+    # ─────────────────────────────────────────────────────────────────────────
+    def report_latency(self):
+        print("\n\n[SPEED] PER-TEST LATENCY")
+        print("-" * 70)
+        latency = {}
+        for suite, (key, _, _, title) in SUITES.items():
+            timings = [r["latency_ms"] for r in self.results[key] if "latency_ms" in r]
+            if not timings:
+                continue
+            latency[suite] = {
+                "count": len(timings),
+                "mean_ms": round(float(np.mean(timings)), 1),
+                "p50_ms": round(float(np.percentile(timings, 50)), 1),
+                "p95_ms": round(float(np.percentile(timings, 95)), 1),
+                "p99_ms": round(float(np.percentile(timings, 99)), 1),
+                "max_ms": round(float(np.max(timings)), 1),
+            }
+            l = latency[suite]
+            print(f"{title:<24} n={l['count']:<3} p50 {l['p50_ms']:>8.0f} ms | p95 {l['p95_ms']:>8.0f} ms | "
+                  f"p99 {l['p99_ms']:>8.0f} ms | max {l['max_ms']:>8.0f} ms")
+        self.results["quantitative_metrics"]["latency"] = latency
+        print(f"Wall time: {self.results['quantitative_metrics']['wall_time_seconds']:.1f}s")
 
     # ─────────────────────────────────────────────────────────────────────────
     # SUMMARY + SAVE
@@ -388,12 +521,11 @@ class VetBrainEvaluator:
         print("=" * 70)
 
     def save_results(self):
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        json_file  = f"evaluation_results_{timestamp}.json"
-        excel_file = f"evaluation_report_{timestamp}.xlsx"
-        
-        with open(json_file, 'w') as f:
-            json.dump(self.results, f, indent=2)
+        json_file  = self.results_path
+        stem = os.path.splitext(os.path.basename(json_file))[0].replace("evaluation_results", "evaluation_report")
+        excel_file = os.path.join(os.path.dirname(json_file), f"{stem}.xlsx")
+
+        self._write_json(json_file)
 
         with pd.ExcelWriter(excel_file, engine='openpyxl') as writer:
             # Summary sheet
@@ -434,6 +566,21 @@ class VetBrainEvaluator:
         print(f"✅ Excel saved: {excel_file}")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="VetConnect AI evaluation")
+    parser.add_argument("--suite", nargs="+", choices=list(SUITES), default=list(SUITES),
+                        help="suites to run (default: all)")
+    parser.add_argument("--shard", default="0/1", help="k/n — run every n-th case of each suite, starting at case k+1")
+    parser.add_argument("--resume", metavar="RESULTS_JSON", help="skip cases already completed in this results file (it is left untouched)")
+    parser.add_argument("--concurrency", type=int, default=8, help="test cases in flight at once")
+    parser.add_argument("--cassette", metavar="FILE", help="record/replay all LLM traffic with this cassette")
+    parser.add_argument("--cassette-mode", choices=CASSETTE_MODES, default="replay",
+                        help="record: call the API and save answers; replay/strict: answer offline (strict fails on a miss)")
+    args = parser.parse_args()
+
+    shard_index, shard_count = (int(x) for x in args.shard.split("/"))
+    if not 0 <= shard_index < shard_count:
+        parser.error(f"--shard {args.shard}: expected k/n with 0 <= k < n")
+
     print("🚀 VetConnect AI Evaluation — Comprehensive Edition")
     print("📁 Files will save in current directory\n")
 
@@ -449,6 +596,12 @@ if __name__ == "__main__":
         print("   Place them in the same folder as this script.")
         exit(1)
 
-    evaluator = VetBrainEvaluator()
+    evaluator = VetBrainEvaluator(
+        suites=args.suite, shard=(shard_index, shard_count),
+        resume_path=args.resume, concurrency=max(1, args.concurrency),
+        cassette=(args.cassette, args.cassette_mode) if args.cassette else None,
+    )
     evaluator.run_all_tests()
-    print("\n✅ Done! Check your folder for the Excel and JSON files.")
\ No newline at end of file
+    if args.cassette_mode == "strict" and evaluator.brain.cassette and evaluator.brain.cassette.misses:
+        print(f"❌ {evaluator.brain.cassette.misses} LLM requests had no recording — re-record the cassette.")
+        exit(1)
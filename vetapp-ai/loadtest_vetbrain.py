@@ -0,0 +1,230 @@
+"""
+VetConnect AI — loadtest_vetbrain.py
+====================================
+Offline end-to-end load test for POST /chat.
+
+Starts mock_openrouter.py and vetbrain_api:app as local processes (or targets
+a running API with --api-url), then replays scripted multi-turn conversations
+(complete bookings, corrections, symptom asides, screening, FAQ) from N
+concurrent users per level, and reports p50/p95/p99 latency and requests per
+second for each concurrency level.
+
+The API under test runs with the per-session throttle off (RATE_LIMIT_SECONDS=0),
+the outbound LLM budget lifted and the LLM response cache off, so every turn
+pays its full pipeline cost against the mock.
+
+RUN:
+    python loadtest_vetbrain.py --concurrency 1 4 16 64 --conversations 100
+    python loadtest_vetbrain.py --latency-ms 300 --error-rate 0.02 --json
+    python loadtest_vetbrain.py --api-url http://127.0.0.1:8001   # already running API
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import httpx
+import numpy as np
+
+FALLBACK_MARKERS = ("temporarily unavailable", "unable to reach the AI service", "still starting up")
+
+
+def _appointment(days_ahead: int = 7, time_str: str = "10:00 AM") -> str:
+    """A future weekday inside clinic hours"""
+    day = datetime.now() + timedelta(days=days_ahead)
+    while day.weekday() == 6:  # closed Sundays
+        day += timedelta(days=1)
+    return f"{day:%m/%d/%Y} {time_str}"
+
+
+SCRIPTS: Dict[str, List[str]] = {
+    "booking_vaccination": [
+        "hi, I'd like to book an appointment", "vaccination", "dog", "labrador", "Max",
+        _appointment(), "confirm",
+    ],
+    "booking_consultation": [
+        "book an appointment", "consultation", "cat", "persian", "Luna",
+        "my cat has been vomiting for 3 days and won't eat", _appointment(8), "confirm",
+    ],
+    "booking_with_corrections": [
+        "book an appointment", "grooming", "dog", "poodle", "Bella", _appointment(9),
+        "actually it's vaccination not grooming", f"sorry, I meant {_appointment(9, '3:00 PM')}", "confirm",
+    ],
+    "booking_with_symptom_aside": [
+        "book an appointment", "deworming", "btw my dog has been coughing since yesterday",
+        "dog", "beagle", "Rocky", _appointment(10), "confirm",
+    ],
+    "symptom_screening": [
+        "my dog is not eating and seems lethargic", "my cat has diarrhea and is vomiting",
+    ],
+    "faq": ["what are your clinic hours", "what services do you offer"],
+}
+
+
+class Results:
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.errors = 0
+        self.fallbacks = 0
+        self.bookings = 0
+        self.by_script: Dict[str, List[float]] = {}
+
+    def summary(self, elapsed: float) -> dict:
+        lat = np.array(self.latencies) * 1000 if self.latencies else np.zeros(1)
+        return {
+            "requests": len(self.latencies),
+            "rps": round(len(self.latencies) / elapsed, 2) if elapsed else 0.0,
+            "p50_ms": round(float(np.percentile(lat, 50)), 1),
+            "p95_ms": round(float(np.percentile(lat, 95)), 1),
+            "p99_ms": round(float(np.percentile(lat, 99)), 1),
+            "max_ms": round(float(lat.max()), 1),
+            "errors": self.errors,
+            "fallback_replies": self.fallbacks,
+            "bookings_completed": self.bookings,
+            "p95_ms_by_script": {
+                name: round(float(np.percentile(np.array(v) * 1000, 95)), 1) for name, v in self.by_script.items()
+            },
+        }
+
+
+async def run_conversation(client: httpx.AsyncClient, name: str, turns: List[str], results: Results,
+                           think_time: float):
+    session_id = f"loadtest-{uuid.uuid4()}"
+    for message in turns:
+        started = time.perf_counter()
+        try:
+            res = await client.post("/chat", json={"message": message, "session_id": session_id})
+            elapsed = time.perf_counter() - started
+            results.latencies.append(elapsed)
+            results.by_script.setdefault(name, []).append(elapsed)
+            if res.status_code != 200:
+                results.errors += 1
+                return
+            body = res.json()
+            if any(marker in body.get("reply", "") for marker in FALLBACK_MARKERS):
+                results.fallbacks += 1
+            if body.get("booking_data"):
+                results.bookings += 1
+        except httpx.HTTPError:
+            results.latencies.append(time.perf_counter() - started)
+            results.errors += 1
+            return
+        if think_time:
+            await asyncio.sleep(think_time)
+
+
+async def run_level(api_url: str, concurrency: int, conversations: int, think_time: float) -> dict:
+    names = list(SCRIPTS)
+    queue: asyncio.Queue = asyncio.Queue()
+    for i in range(conversations):
+        queue.put_nowait(names[i % len(names)])
+    results = Results()
+
+    async def user(client: httpx.AsyncClient):
+        while not queue.empty():
+            name = queue.get_nowait()
+            await run_conversation(client, name, SCRIPTS[name], results, think_time)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=api_url, timeout=120, limits=limits) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(user(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return {"concurrency": concurrency, "seconds": round(elapsed, 2), **results.summary(elapsed)}
+
+
+def wait_ready(url: str, timeout: float, process: Optional[subprocess.Popen] = None):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process is not None and process.poll() is not None:
+            sys.exit(f"❌ Process for {url} exited with code {process.returncode}")
+        try:
+            if httpx.get(url, timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(1)
+    sys.exit(f"❌ {url} not ready after {timeout:.0f}s")
+
+
+def start_stack(args) -> List[subprocess.Popen]:
+    here = os.path.dirname(os.path.abspath(__file__))
+    mock = subprocess.Popen(
+        [sys.executable, "mock_openrouter.py", "--port", str(args.mock_port),
+         "--latency-ms", str(args.latency_ms), "--sigma", str(args.sigma), "--error-rate", str(args.error_rate)],
+        cwd=here,
+    )
+    wait_ready(f"http://127.0.0.1:{args.mock_port}/stats", 30, mock)
+    env = dict(
+        os.environ,
+        OPENROUTER_URL=f"http://127.0.0.1:{args.mock_port}/api/v1/chat/completions",
+        OPENROUTER_API_KEY="loadtest",
+        RATE_LIMIT_SECONDS="0",
+        LLM_REQUESTS_PER_SECOND="100000",
+        LLM_TOKENS_PER_MINUTE="1000000000",
+        VETBRAIN_LLM_CACHE="1" if args.llm_cache else "0",
+        VETBRAIN_SEVERITY_SHADOW_RATE="0",
+    )
+    api = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "vetbrain_api:app", "--port", str(args.api_port),
+         "--workers", str(args.workers), "--log-level", "warning"],
+        cwd=here, env=env, stdout=subprocess.DEVNULL,
+    )
+    print("⏳ Waiting for the API to load the model and warm up...")
+    wait_ready(f"http://127.0.0.1:{args.api_port}/health/ready", 900, api)
+    return [mock, api]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline /chat load test")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--conversations", type=int, default=60, help="conversations per concurrency level")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="pause between turns of one user")
+    parser.add_argument("--api-url", help="target a running API instead of starting one")
+    parser.add_argument("--api-port", type=int, default=8791)
+    parser.add_argument("--mock-port", type=int, default=8790)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--latency-ms", type=float, default=600.0, help="mock LLM median latency")
+    parser.add_argument("--sigma", type=float, default=0.5, help="mock LLM log-normal spread")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of mock LLM calls that fail")
+    parser.add_argument("--llm-cache", action="store_true", help="keep the LLM response cache on")
+    parser.add_argument("--json", action="store_true", help="save loadtest_results_<timestamp>.json")
+    args = parser.parse_args()
+
+    processes = [] if args.api_url else start_stack(args)
+    api_url = args.api_url or f"http://127.0.0.1:{args.api_port}"
+    try:
+        levels = []
+        print(f"\n{'conc':>5} {'req':>6} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+              f"{'errors':>7} {'fallback':>9} {'booked':>7}")
+        for concurrency in args.concurrency:
+            level = asyncio.run(run_level(api_url, concurrency, args.conversations, args.think_ms / 1000))
+            levels.append(level)
+            print(f"{level['concurrency']:>5} {level['requests']:>6} {level['rps']:>8.2f} {level['p50_ms']:>9.1f} "
+                  f"{level['p95_ms']:>9.1f} {level['p99_ms']:>9.1f} {level['errors']:>7} "
+                  f"{level['fallback_replies']:>9} {level['bookings_completed']:>7}")
+
+        report = {"config": vars(args), "levels": levels}
+        if not args.api_url:
+            report["mock_llm_calls"] = httpx.get(f"http://127.0.0.1:{args.mock_port}/stats").json()
+            print(f"\nMock LLM calls by prompt type: {report['mock_llm_calls']}")
+        if args.json:
+            json_file = f"loadtest_results_{datetime.now():%Y%m%d_%H%M%S}.json"
+            with open(json_file, "w") as f:
+                json.dump(report, f, indent=2)
+            print(f"\n✅ JSON saved : {json_file}")
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait(timeout=30)
+
+
+if __name__ == "__main__":
+    main()
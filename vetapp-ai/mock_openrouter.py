@@ -0,0 +1,143 @@
+"""
+VetConnect AI — mock_openrouter.py
+==================================
+Local stand-in for the OpenRouter chat-completions API, for load tests that
+shouldn't spend credits or depend on the network.
+
+Recognises VetBrain's prompt types and answers each with a canned reply:
+  severity · extraction · summary · entity · service · advice (plain or streamed)
+
+Latency is drawn from a log-normal distribution (median + sigma), and a share
+of requests fail with HTTP 500/429, so retries and fallbacks get exercised.
+
+RUN:
+    python mock_openrouter.py --port 8790 --latency-ms 600 --sigma 0.5 --error-rate 0.01
+    OPENROUTER_URL=http://127.0.0.1:8790/api/v1/chat/completions uvicorn vetbrain_api:app --port 8001
+
+GET /stats returns request counts per prompt type.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+from collections import Counter
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+MOCK_LATENCY_MS = float(os.getenv("MOCK_LLM_LATENCY_MS", "600"))      # median
+MOCK_LATENCY_SIGMA = float(os.getenv("MOCK_LLM_LATENCY_SIGMA", "0.5"))
+MOCK_ERROR_RATE = float(os.getenv("MOCK_LLM_ERROR_RATE", "0.0"))
+
+ADVICE_REPLY = (
+    "Possible causes include a mild stomach upset or a dietary change, and this could be related to "
+    "an infection if it continues. Keep your pet hydrated and book a consultation through VetConnect "
+    "if it doesn't improve. Only a licensed veterinarian can confirm the exact cause."
+)
+
+app = FastAPI(title="Mock OpenRouter", version="1.0.0")
+stats: Counter = Counter()
+
+
+def classify_prompt(messages: list) -> str:
+    user = next((m["content"] for m in reversed(messages) if m.get("role") == "user"), "")
+    if "Classify the severity" in user:
+        return "severity"
+    if "extracting medical symptoms" in user:
+        return "extraction"
+    if "summarizing a pet owner" in user:
+        return "summary"
+    if "Extract the vet service" in user:
+        return "service"
+    if user.startswith("TASK: Extract the"):
+        return "entity"
+    return "advice"
+
+
+def canned_reply(kind: str, user: str) -> str:
+    quoted = re.search(r'"([^"]*)"', user)
+    text = quoted.group(1).lower() if quoted else user.lower()
+    if kind == "severity":
+        if any(w in text for w in ("days", "worse", "won't stop", "blood")):
+            return "URGENT"
+        return "NORMAL"
+    if kind == "extraction":
+        return "vomiting, anorexia, lethargy"
+    if kind == "summary":
+        return "Vomiting And Loss Of Appetite"
+    if kind == "service":
+        return "Consultation"
+    if kind == "entity":
+        entity = re.search(r"TASK: Extract the (.+?) from", user)
+        entity = entity.group(1) if entity else ""
+        if "animal" in entity:
+            return "Dog"
+        if "breed" in entity:
+            return "Mixed"
+        words = re.findall(r"[A-Za-z]+", quoted.group(1) if quoted else "")
+        return words[-1].title() if words else "None"
+    return ADVICE_REPLY
+
+
+def sample_latency() -> float:
+    return random.lognormvariate(0.0, MOCK_LATENCY_SIGMA) * MOCK_LATENCY_MS / 1000
+
+
+@app.post("/api/v1/chat/completions")
+async def chat_completions(request: Request):
+    payload = await request.json()
+    messages = payload.get("messages", [])
+    kind = classify_prompt(messages)
+    stats[kind] += 1
+    delay = sample_latency()
+
+    if random.random() < MOCK_ERROR_RATE:
+        stats["errors"] += 1
+        await asyncio.sleep(delay / 4)
+        status = random.choice((500, 429))
+        return JSONResponse(status_code=status, content={"error": {"code": status, "message": "mock failure"}})
+
+    user = next((m["content"] for m in reversed(messages) if m.get("role") == "user"), "")
+    content = canned_reply(kind, user)
+
+    if payload.get("stream"):
+        words = content.split(" ")
+
+        async def events():
+            # Tokens spread evenly over the sampled latency, first one after ~30% of it
+            await asyncio.sleep(delay * 0.3)
+            for i, word in enumerate(words):
+                delta = word if i == 0 else " " + word
+                yield f"data: {json.dumps({'choices': [{'delta': {'content': delta}}]})}\n\n"
+                await asyncio.sleep(delay * 0.7 / len(words))
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    await asyncio.sleep(delay)
+    return {
+        "id": "mock",
+        "model": payload.get("model"),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+    }
+
+
+@app.get("/stats")
+def get_stats():
+    return dict(stats)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Local OpenRouter stand-in")
+    parser.add_argument("--port", type=int, default=8790)
+    parser.add_argument("--latency-ms", type=float, default=MOCK_LATENCY_MS, help="median latency")
+    parser.add_argument("--sigma", type=float, default=MOCK_LATENCY_SIGMA, help="log-normal spread")
+    parser.add_argument("--error-rate", type=float, default=MOCK_ERROR_RATE)
+    args = parser.parse_args()
+    MOCK_LATENCY_MS, MOCK_LATENCY_SIGMA, MOCK_ERROR_RATE = args.latency_ms, args.sigma, args.error_rate
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
@@ -3,6 +3,8 @@ VetConnect Interactive Tester — RAG Edition
 ============================================
 Type any symptom or message and see exactly what VetBrain RAG does with it.
 Run: python test_vetbrain_interactive.py
+     VETBRAIN_CASSETTE=tester.cassette VETBRAIN_CASSETTE_MODE=record python test_vetbrain_interactive.py
+     VETBRAIN_CASSETTE=tester.cassette python test_vetbrain_interactive.py   # replays offline
 """
 
 from vetbrain import VetBrain
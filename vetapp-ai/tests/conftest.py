@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Modules live flat in vetapp-ai/; tests never touch the on-disk LLM cache
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("VETBRAIN_LLM_CACHE", "0")
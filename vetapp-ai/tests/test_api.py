@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+
+import vetbrain_api
+from vetbrain_api import ChatRequest, Session, TurnPlan, _chat_handler, _route_turn
+from vetbrain_sessions import InMemorySessionStore
+
+
+@pytest.fixture
+def llm_calls(monkeypatch):
+    """Stub the LLM-backed lookups and record which ones a turn started"""
+    calls = []
+
+    async def safety(text):
+        calls.append("safety")
+        return vetbrain_api.brain._keyword_safety(text) or ("normal", None)
+
+    async def summary(text):
+        calls.append("summary")
+        return "summary"
+
+    async def rag(text, animal=None):
+        calls.append("rag")
+        return []
+
+    monkeypatch.setattr(vetbrain_api.brain, "acheck_safety", safety)
+    monkeypatch.setattr(vetbrain_api.brain, "asummarize_complaint", summary)
+    monkeypatch.setattr(vetbrain_api.brain, "aretrieve_rag_context", rag)
+    return calls
+
+
+def _consultation_turn(raw: str):
+    session = Session("s1")
+    session.stage = "ask_consultation_reason"
+    session.data = {"service": "Consultation", "animal": "Dog"}
+
+    async def run():
+        turn = TurnPlan(raw)
+        try:
+            return await _route_turn(session, "s1", raw, turn)
+        finally:
+            turn.cancel_pending()
+
+    return session, asyncio.run(run())
+
+
+@pytest.mark.parametrize("raw", ["cancel", "my dog is having a seizure"])
+def test_no_speculative_llm_calls_when_turn_ends_early(llm_calls, raw):
+    session, _ = _consultation_turn(raw)
+    assert llm_calls == ["safety"]
+    assert session.stage == "idle"
+
+
+def test_conflict_on_final_save_keeps_reply_and_turn_state(llm_calls, monkeypatch):
+    store = InMemorySessionStore(ttl_seconds=3600, max_sessions=10)
+    monkeypatch.setattr(vetbrain_api, "sessions", store)
+    monkeypatch.setattr(vetbrain_api.brain, "ready", True)
+    save = store.save
+    saves = []
+
+    async def racing_save(session):
+        saves.append(session.stage)
+        if len(saves) == 2:
+            # Another worker updates the session while this turn was running
+            other = await store.load(session.session_id)
+            other.data["channel"] = "sms"
+            await save(other)
+        await save(session)
+
+    monkeypatch.setattr(store, "save", racing_save)
+    reply = asyncio.run(_chat_handler(ChatRequest(message="I want to book an appointment", session_id="s1")))
+
+    assert "What service do you need?" in reply.reply
+    assert llm_calls == ["safety"]                 # the turn was not rerun
+    stored = asyncio.run(store.load("s1"))
+    assert stored.stage == "ask_service"
+    assert stored.data == {"channel": "sms"}      # the other update survives
@@ -0,0 +1,7 @@
+from vetbrain_cache import LLMResponseCache
+
+
+def test_key_ignores_whitespace_but_not_case():
+    key = LLMResponseCache.make_key("extract_name", "model", "Pet name: Max")
+    assert LLMResponseCache.make_key("extract_name", "model", "Pet  name:\nMax") == key
+    assert LLMResponseCache.make_key("extract_name", "model", "pet name: max") != key
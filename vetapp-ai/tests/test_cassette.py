@@ -0,0 +1,62 @@
+import pytest
+
+from vetbrain_cassette import CassetteMiss, LLMCassette
+
+
+def payload(prompt: str, temperature: float = 0.0, **extra) -> dict:
+    return {"model": "m", "messages": [{"role": "user", "content": prompt}], "temperature": temperature, **extra}
+
+
+def test_record_then_replay_round_trip(tmp_path):
+    path = str(tmp_path / "eval.cassette")
+    recorder = LLMCassette(path, mode="record", never_record=("FALLBACK",))
+    recorder.record(payload("severity of vomiting"), "urgent")
+    recorder.record(payload("extract the pet name"), "Max")
+    recorder.record(payload("failed call"), "FALLBACK")
+    recorder.close()
+
+    player = LLMCassette(path, mode="replay")
+    assert len(player) == 2
+    assert player.replay(payload("severity of vomiting")) == "urgent"
+    assert player.replay(payload("severity of vomiting", stream=True)) == "urgent"   # transport flags ignored
+    assert player.replay(payload("severity of vomiting", temperature=0.7)) is None
+    assert player.replay(payload("failed call")) is None
+    assert player.stats()["hits"] == 2 and player.stats()["misses"] == 2
+
+
+def test_strict_replay_raises_on_a_miss(tmp_path):
+    path = str(tmp_path / "eval.cassette")
+    recorder = LLMCassette(path, mode="record")
+    recorder.record(payload("known"), "normal")
+    recorder.close()
+
+    strict = LLMCassette(path, mode="strict")
+    assert strict.replay(payload("known")) == "normal"
+    with pytest.raises(CassetteMiss):
+        strict.replay(payload("changed prompt template"))
+    strict.record(payload("changed prompt template"), "urgent")     # replay modes never write
+    assert LLMCassette(path, mode="replay").lines == 1
+
+
+def test_compact_keeps_only_the_latest_recording(tmp_path):
+    path = tmp_path / "eval.cassette"
+    recorder = LLMCassette(str(path), mode="record")
+    recorder.record(payload("a"), "first")
+    recorder.record(payload("b"), "kept")
+    recorder.record(payload("a"), "second")
+    recorder.close()
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"k": "half-written')                               # interrupted recording
+
+    cassette = LLMCassette(str(path), mode="replay")
+    assert (len(cassette), cassette.lines) == (2, 3)
+    cassette.compact()
+    assert len(path.read_text(encoding="utf-8").splitlines()) == 2
+    reloaded = LLMCassette(str(path), mode="replay")
+    assert reloaded.replay(payload("a")) == "second"
+    assert reloaded.replay(payload("b")) == "kept"
+
+
+def test_unknown_mode_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        LLMCassette(str(tmp_path / "x"), mode="playback")
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from vetbrain_index import SpeciesIndexes
+
+DIM = 8
+QUERY = np.eye(DIM, dtype=np.float32)[0]
+
+
+def passage(cosine: float, axis: int) -> np.ndarray:
+    """Unit vector with the given cosine to QUERY, the rest along another axis"""
+    vector = np.zeros(DIM, dtype=np.float32)
+    vector[0], vector[axis] = cosine, np.sqrt(1.0 - cosine ** 2)
+    return vector
+
+
+@pytest.fixture
+def passages():
+    # record 0: one strong passage; record 1: three moderate ones; record 2: one fair one
+    vectors = np.stack([passage(0.9, 1), passage(0.6, 2), passage(0.6, 3), passage(0.6, 4), passage(0.7, 5)])
+    return vectors, np.array([0, 1, 4, 5])
+
+
+@pytest.mark.parametrize("pooling, records, scores", [
+    ("max", [0, 2], [0.9, 0.7]),
+    ("sum", [0, 1], [0.9, 0.6]),      # record 1's passages add up, but it is reported by its best one
+])
+def test_pooled_records_come_back_best_first_with_cosine_scores(passages, pooling, records, scores):
+    vectors, offsets = passages
+    index = SpeciesIndexes(vectors, {}, kind="exact", chunk_offsets=offsets, pooling=pooling)
+    got_scores, got_records = index.search(QUERY, k=2)
+    assert got_records.tolist() == records
+    assert got_scores.tolist() == pytest.approx(scores, abs=1e-5)
+    assert np.all(np.diff(got_scores) <= 0)
+
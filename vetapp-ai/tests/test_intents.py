@@ -0,0 +1,61 @@
+import pytest
+
+from vetbrain_api import INTENTS, ROUTING_KEYWORDS, WORD_BOUNDED_INTENTS
+from vetbrain_intents import IntentMatcher, naive_scan
+
+MESSAGES = [
+    "hi, I'd like to book an appointment",
+    "my dog has been vomiting for 3 days and won't eat",
+    "confirm",
+    "actually it's vaccination not grooming",
+    "ang aso ko ay nagsusuka at matamlay",
+    "what are your clinic hours on saturday?",
+    "Max",
+    "03/20/2030 10:00 AM",
+    "my cattle has a swollen leg, is that a problem? also how much is a consult",
+    "MAGKANO PO ANG BAKUNA NG PUSA",
+    "",
+    # exit is word-bounded: whole phrases only
+    "never mind, start over",
+    "cancel",
+    "please stop",
+    "the bleeding stopped",
+    "the exit wound is small",
+    "which exit do I take to the clinic",
+    "pakiulit po",
+    "ulit na lang",
+    "basta",
+    "nevermind!",
+    "quite itchy",
+]
+
+
+def first_hits(matcher: IntentMatcher, text: str) -> dict:
+    match = matcher.scan(text)
+    return {name: match.first(name) for name in match.categories}
+
+
+@pytest.mark.parametrize("message", MESSAGES)
+def test_compiled_scan_matches_reference_loops(message):
+    assert first_hits(INTENTS, message) == naive_scan(ROUTING_KEYWORDS, message, WORD_BOUNDED_INTENTS)
+
+
+@pytest.mark.parametrize("category", sorted(ROUTING_KEYWORDS))
+def test_every_keyword_in_context_matches_reference_loops(category):
+    keywords = ROUTING_KEYWORDS[category]
+    for keyword in (keywords if isinstance(keywords, dict) else list(keywords)):
+        for message in (keyword, f"so {keyword.upper()}, ok", f"x{keyword}s"):
+            assert first_hits(INTENTS, message) == naive_scan(ROUTING_KEYWORDS, message, WORD_BOUNDED_INTENTS), message
+
+
+def test_contained_keywords_and_priority_order():
+    matcher = IntentMatcher({
+        "animal": {"cattle": "Cow", "cat": "Cat"},
+        "service": ["vaccine", "vacc"],
+        "exit": ["stop"],
+    }, word_bounded=["exit"])
+    match = matcher.scan("my cattle needs a vaccine, don't stop")
+    assert match.values("animal") == ["Cow", "Cat"]           # "cat" inside "cattle" still counts
+    assert match.values("service") == ["vaccine", "vacc"]
+    assert "exit" in match
+    assert "exit" not in matcher.scan("it stopped")
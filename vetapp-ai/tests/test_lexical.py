@@ -0,0 +1,65 @@
+import math
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from vetbrain_lexical import BM25Index, reciprocal_rank_fusion, tokenize
+
+KB_CSV = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                      "Animal_disease_spreadsheet_-_Sheet1.csv")
+
+
+def test_tokenize_drops_stopwords_and_one_suffix():
+    assert tokenize("My dog is Vomiting and has rashes") == ["dog", "vomit", "rash"]
+
+
+def test_bm25_scores_match_the_formula():
+    index = BM25Index(["parvo parvo dog", "dog cough", "cat"], k1=1.2, b=0.75)
+    scores = index.scores("parvo")
+    idf = math.log(1.0 + (3 - 1 + 0.5) / (1 + 0.5))
+    average_length = (3 + 2 + 1) / 3
+    expected = idf * 2 * 2.2 / (2 + 1.2 * (0.25 + 0.75 * 3 / average_length))
+    assert scores[0] == pytest.approx(expected, rel=1e-5)
+    assert scores[1] == scores[2] == 0.0
+
+
+def test_bm25_rare_terms_outweigh_common_ones_and_search_filters_rows():
+    index = BM25Index(["dog cough", "dog mange", "dog fever", "cat mange"])
+    _, ids = index.search("dog with mange", k=4)
+    assert list(ids[:2]) in ([1, 3], [3, 1]) and 0 not in ids[:2]
+    _, ids = index.search("dog with mange", k=4, rows=np.array([0, 2, 3]))
+    assert ids[0] == 3 and 1 not in ids
+    assert index.search("zebra", k=3)[1].size == 0        # no zero-score rows
+
+
+def test_prefix_matches_longer_terms_once():
+    index = BM25Index(["parvovirus parvovirus", "cattle", "distemper"])
+    assert index.expand("parvo") == ["parvoviru"]
+    assert index.expand("cat") == []                      # too short to expand
+    assert list(index.search("parvo", k=3)[1]) == [0]
+    assert index.scores("parvo parvovirus")[0] == pytest.approx(2 * index.scores("parvo")[0])
+
+
+def test_reciprocal_rank_fusion_orders_by_summed_reciprocal_rank():
+    assert reciprocal_rank_fusion([1, 2, 3], [3, 1, 4], k=60) == [1, 3, 2, 4]
+    assert reciprocal_rank_fusion([5, 6], [], k=1) == [5, 6]
+    assert reciprocal_rank_fusion([9, 7], [8, 7], k=60)[0] == 7     # second in both beats first in one
+
+
+@pytest.fixture(scope="module")
+def knowledge_base():
+    df = pd.read_csv(KB_CSV).fillna("")
+    names = df.iloc[:, 0].astype(str).tolist()
+    return names, BM25Index(df.astype(str).agg(" ".join, axis=1).tolist())
+
+
+@pytest.mark.parametrize("query, disease", [
+    ("could it be parvo?", "Parvovirus"),
+    ("my dog has mange", "Dermatitis (Cats and Dogs)"),
+])
+def test_short_clinical_names_retrieve_their_disease(knowledge_base, query, disease):
+    names, index = knowledge_base
+    _, ids = index.search(query, k=1)
+    assert names[ids[0]] == disease
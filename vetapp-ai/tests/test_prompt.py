@@ -0,0 +1,56 @@
+import pytest
+
+from vetbrain_prompt import PROMPT_MIN_RECORD_TOKENS, TokenCounter, assemble_context, dedupe_records
+
+
+@pytest.fixture
+def counter():
+    """The ~4 characters/token fallback, as on hosts without tiktoken"""
+    counter = TokenCounter(encoding="no-such-encoding")
+    assert not counter.exact
+    return counter
+
+
+def record(disease: str, score: float, words: int = 60, topic: str = "fever") -> dict:
+    return {
+        "disease": disease,
+        "score": score,
+        "symptoms": " ".join(f"{topic}{i}" for i in range(words)),
+        "description": f"{disease} is a condition " + "described at length " * words,
+        "treatment": "supportive care " * words,
+        "advice": "keep the pet hydrated " * words,
+    }
+
+
+@pytest.mark.parametrize("budget", [60, 150, 400, 1000])
+def test_assembled_context_stays_within_the_budget(counter, budget):
+    records = [record(f"Disease {i}", 0.9 - 0.1 * i, topic=f"t{i}x") for i in range(5)]
+    blocks, counts = assemble_context(records, budget, counter)
+    assert blocks and blocks[0].startswith("[Record 1] Disease: Disease 0")
+    assert counter.count("\n\n".join(blocks)) <= max(budget, PROMPT_MIN_RECORD_TOKENS)
+    assert counts["kept"] == len(blocks) and counts["kept"] + counts["over_budget"] == 5
+
+
+def test_generous_budget_keeps_every_field(counter):
+    blocks, counts = assemble_context([record("Parvovirus", 0.8, words=5)], 10 ** 6, counter)
+    assert counts == {"kept": 1, "duplicates": 0, "over_budget": 0}
+    assert "…" not in blocks[0] and "Prevention/Advice:" in blocks[0]
+
+
+def test_near_duplicates_are_dropped(counter):
+    first = record("Canine Parvovirus", 0.9)
+    reworded = dict(first, disease="Parvo (dogs)", description=first["description"] + " Also seen in puppies.")
+    same_name = record("canine parvovirus", 0.7, topic="other")
+    distinct = record("Mange", 0.6, topic="itch")
+    kept = dedupe_records([first, reworded, same_name, distinct])
+    assert [r["disease"] for r in kept] == ["Canine Parvovirus", "Mange"]
+
+    _, counts = assemble_context([first, reworded, same_name, distinct], 10 ** 6, counter)
+    assert counts == {"kept": 2, "duplicates": 2, "over_budget": 0}
+
+
+def test_truncation_cuts_at_a_word_boundary_within_the_limit(counter):
+    text = "vomiting and diarrhea for three days with lethargy"
+    cut = counter.truncate(text, 6)
+    assert cut.endswith("…") and counter.count(cut) <= 6
+    assert text.startswith(cut[:-1]) and text[len(cut) - 1] == " "
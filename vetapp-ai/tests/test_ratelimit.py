@@ -0,0 +1,57 @@
+import asyncio
+import time
+
+import pytest
+
+from vetbrain_ratelimit import RateLimitScheduler, TokenBucket
+
+
+def test_token_bucket_refills_at_rate_up_to_capacity():
+    bucket = TokenBucket(rate=10.0, capacity=5.0)
+    bucket.updated = start = 100.0
+    assert bucket.wait_time(5, start) == 0.0
+    bucket.consume(5)
+    assert bucket.wait_time(2, start) == pytest.approx(0.2)
+    assert bucket.wait_time(2, start + 0.25) == 0.0
+    assert bucket.wait_time(50, start + 60) == 0.0      # oversized asks wait for a full bucket only
+    bucket.consume(50)
+    assert bucket.tokens == 0.0
+
+
+def _run_requests(scheduler, requests):
+    """Queue every (session, label, tokens) at once; return labels in dispatch order and elapsed seconds"""
+    served = []
+
+    async def one(session, label, tokens):
+        await scheduler.acquire(tokens, session=session)
+        served.append(label)
+
+    async def main():
+        started = time.monotonic()
+        await asyncio.gather(*(one(*r) for r in requests))
+        return time.monotonic() - started
+
+    return served, asyncio.run(main())
+
+
+def test_sessions_are_served_round_robin_within_the_request_budget():
+    scheduler = RateLimitScheduler(requests_per_second=20, tokens_per_minute=10 ** 6, burst=1)
+    served, elapsed = _run_requests(scheduler, [
+        ("busy", "a1", 1), ("busy", "a2", 1), ("busy", "a3", 1),
+        ("quiet", "b1", 1), ("quiet", "b2", 1),
+    ])
+    assert served == ["a1", "b1", "a2", "b2", "a3"]
+    assert elapsed >= 4 / 20 * 0.95    # first request is the burst, then one per 50 ms
+
+
+def test_token_budget_delays_the_next_call():
+    scheduler = RateLimitScheduler(requests_per_second=1000, tokens_per_minute=6000)   # 100 tokens/s
+    served, elapsed = _run_requests(scheduler, [("s", "big", 6000), ("s", "small", 20)])
+    assert served == ["big", "small"]
+    assert elapsed >= 0.2 * 0.95       # 20 tokens at 100 tokens/s after the bucket was emptied
+
+
+def test_sync_callers_draw_from_the_same_buckets():
+    scheduler = RateLimitScheduler(requests_per_second=10, tokens_per_minute=10 ** 6, burst=1)
+    assert scheduler.acquire_sync() < 0.01             # the burst slot
+    assert scheduler.acquire_sync() >= 0.1 * 0.95      # then one request per 100 ms
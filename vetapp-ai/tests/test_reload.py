@@ -0,0 +1,84 @@
+import hashlib
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+import vetbrain
+from vetbrain import RAG_PATH_CANDIDATES, SYMPTOMS_PATH, VetBrain
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RAG_PATH = RAG_PATH_CANDIDATES[0]
+
+
+class StubEmbedder:
+    """Deterministic text → vector, recording every text it was asked to encode"""
+
+    backend = "stub"
+    cache_key = "stub"
+    dim = 16
+
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, texts):
+        texts = list(texts)
+        self.encoded.extend(texts)
+        rows = [np.frombuffer(hashlib.sha256(t.encode("utf-8")).digest()[:self.dim], dtype=np.uint8) for t in texts]
+        return np.array(rows, dtype=np.float32).reshape(len(texts), self.dim) - 127.5
+
+
+@pytest.fixture
+def brain(tmp_path, monkeypatch):
+    """A VetBrain over copies of the CSVs in tmp_path, with its embedding cache there too"""
+    for name in (SYMPTOMS_PATH, RAG_PATH):
+        shutil.copy(os.path.join(APP_DIR, name), tmp_path / name)
+    monkeypatch.chdir(tmp_path)
+    brain = VetBrain()
+    brain.embedding_model = StubEmbedder()
+    brain.kb = brain._build_knowledge_base()
+    brain.embedding_model.encoded.clear()
+    return brain
+
+
+def edit_line(path: str, line_no: int, old: str, new: str):
+    with open(path, encoding="utf-8") as f:
+        lines = f.readlines()
+    assert old in lines[line_no]
+    lines[line_no] = lines[line_no].replace(old, new, 1)
+    with open(path, "w", encoding="utf-8") as f:
+        f.writelines(lines)
+
+
+def test_unchanged_reload_encodes_nothing(brain):
+    assert brain.reload_data() == {"reloaded": False, "version": 1}
+    result = brain.reload_data(force=True)
+    assert result["reloaded"] and result["version"] == 2
+    assert result["reencoded"] == {"safety": 0, "severity": 0, "rag": 0}
+    assert brain.embedding_model.encoded == []
+
+
+def test_one_row_edit_reencodes_only_that_row(brain):
+    old = brain.kb
+    edit_line(SYMPTOMS_PATH, 1, "weight loss", "seizures")
+    assert brain.knowledge_changed()
+    result = brain.reload_data()
+    assert result["reencoded"] == {"safety": 1, "severity": 0, "rag": 0}
+    assert brain.embedding_model.encoded == [brain.kb.df_symptoms["combined_text"][0]]
+    # Every other row kept its vector (up to float16 rounding of the re-stored matrix)
+    new_rows = np.asarray(brain.kb.symptom_embeddings, np.float32)
+    old_rows = np.asarray(old.symptom_embeddings, np.float32)
+    assert np.allclose(new_rows[1:], old_rows[1:], atol=1e-3)
+    assert not np.allclose(new_rows[0], old_rows[0], atol=1e-3)
+
+
+def test_reload_never_swaps_in_an_empty_dataset(brain):
+    live = brain.kb
+    with open(RAG_PATH, encoding="utf-8") as f:
+        header = f.readline()
+    with open(RAG_PATH, "w", encoding="utf-8") as f:
+        f.write(header)
+    result = brain.reload_data(force=True)
+    assert result["reloaded"] is False and "empty" in result["error"]
+    assert brain.kb is live and len(brain.kb.df_rag) > 0
@@ -0,0 +1,162 @@
+import asyncio
+import time
+
+import pytest
+
+from vetbrain_sessions import InMemorySessionStore, RedisSessionStore, Session, SessionConflict, SQLiteSessionStore
+
+TTL = 100.0
+
+
+class Clock:
+    """Stand-in for time.time that only moves when told to"""
+
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(time, "time", clock)
+    return clock
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def _save_new(store, session_id: str, **data) -> Session:
+    session = Session(session_id)
+    session.data.update(data)
+    run(store.save(session))
+    return session
+
+
+def test_memory_session_expires_after_idle_ttl(clock):
+    store = InMemorySessionStore(ttl_seconds=TTL, max_sessions=10)
+    _save_new(store, "a")
+    clock.now += TTL - 1
+    assert run(store.load("a")) is not None          # loading slides the idle window
+    clock.now += TTL - 1
+    assert run(store.load("a")) is not None
+    clock.now += TTL + 1
+    assert run(store.load("a")) is None
+    assert len(store) == 0
+
+
+def test_memory_store_evicts_least_recently_used(clock):
+    store = InMemorySessionStore(ttl_seconds=TTL, max_sessions=2)
+    _save_new(store, "a")
+    _save_new(store, "b")
+    run(store.load("a"))                              # "b" is now the oldest
+    _save_new(store, "c")
+    assert len(store) == 2
+    assert run(store.load("b")) is None
+    assert run(store.load("a")) is not None and run(store.load("c")) is not None
+
+
+def test_memory_sweep_removes_only_idle_sessions(clock):
+    store = InMemorySessionStore(ttl_seconds=TTL, max_sessions=10)
+    _save_new(store, "a")
+    _save_new(store, "b")
+    clock.now += TTL / 2
+    _save_new(store, "c")
+    clock.now += TTL / 2 + 1
+    assert store.sweep() == 2
+    assert len(store) == 1
+    assert store.sweep() == 0
+
+
+def test_memory_load_hands_out_a_copy_and_stale_saves_conflict(clock):
+    store = InMemorySessionStore(ttl_seconds=TTL, max_sessions=10)
+    _save_new(store, "a", animal="Dog")
+    first, second = run(store.load("a")), run(store.load("a"))
+    first.data["animal"] = "Cat"
+    assert run(store.load("a")).data == {"animal": "Dog"}   # unsaved edits stay private
+    run(store.save(first))
+    assert first.version == 2
+    with pytest.raises(SessionConflict):
+        run(store.save(second))
+
+
+@pytest.fixture(params=["sqlite", "redis"])
+def make_shared_store(request, tmp_path):
+    """Factory for a shared backend on a local stand-in; call it inside the test's event loop"""
+    if request.param == "sqlite":
+        return lambda: SQLiteSessionStore(str(tmp_path / "sessions.sqlite3"), ttl_seconds=TTL, max_sessions=10)
+    fakeredis = pytest.importorskip("fakeredis")
+    return lambda: RedisSessionStore(fakeredis.FakeAsyncRedis(), ttl_seconds=TTL)
+
+
+def test_shared_store_bumps_versions_and_rejects_stale_saves(clock, make_shared_store):
+    async def scenario():
+        store = make_shared_store()
+        session = Session("a")
+        await store.save(session)
+        assert session.version == 1
+        first, second = await store.load("a"), await store.load("a")
+        assert first.version == second.version == 1
+        first.data["animal"] = "Dog"
+        await store.save(first)
+        assert first.version == 2
+        second.data["animal"] = "Cat"
+        with pytest.raises(SessionConflict):
+            await store.save(second)
+        stored = await store.load("a")
+        await store.close()
+        return stored
+
+    stored = run(scenario())
+    assert (stored.version, stored.data) == (2, {"animal": "Dog"})
+
+
+def test_shared_store_expires_idle_sessions(clock, make_shared_store):
+    async def scenario():
+        store = make_shared_store()
+        await store.save(Session("a"))
+        clock.now += TTL - 1
+        live = await store.load("a")
+        clock.now += TTL + 1
+        expired = await store.load("a")
+        await store.close()
+        return live, expired
+
+    live, expired = run(scenario())
+    assert live is not None and expired is None
+
+
+def test_shared_store_new_session_replaces_only_an_expired_row(clock, make_shared_store):
+    async def scenario():
+        store = make_shared_store()
+        await store.save(Session("a"))
+        with pytest.raises(SessionConflict):
+            await store.save(Session("a"))        # id still live: a fresh session may not take it over
+        clock.now += TTL + 1
+        replacement = Session("a")
+        replacement.stage = "ask_service"
+        await store.save(replacement)
+        stored = await store.load("a")
+        await store.close()
+        return replacement, stored
+
+    replacement, stored = run(scenario())
+    assert replacement.version == 1
+    assert (stored.version, stored.stage) == (1, "ask_service")
+
+
+def test_sqlite_sweep_drops_expired_and_overflow_rows(clock, tmp_path):
+    store = SQLiteSessionStore(str(tmp_path / "sessions.sqlite3"), ttl_seconds=TTL, max_sessions=2)
+    for session_id in ("old1", "old2"):
+        _save_new(store, session_id)
+    clock.now += TTL + 1
+    for session_id in ("a", "b", "c"):
+        clock.now += 1
+        _save_new(store, session_id)
+    assert store.sweep() == 3                        # two expired + the least recent live one
+    assert run(store.load("a")) is None
+    assert run(store.load("b")) is not None and run(store.load("c")) is not None
+    run(store.close())
@@ -0,0 +1,97 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from vetbrain import LLM_FALLBACK_REPLY, VetBrain
+from vetbrain_severity import SeverityClassifier
+
+# One axis per tier in a tiny embedding space (the fourth is unlabelled)
+AXES = np.eye(4, dtype=np.float32)
+
+
+def unit(*components) -> np.ndarray:
+    vector = np.asarray(components, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def toy_classifier(**kwargs) -> SeverityClassifier:
+    vectors = np.stack([AXES[0], unit(1, 0.1, 0, 0), AXES[1], unit(0.1, 1, 0, 0), AXES[2], unit(0, 0, 1, 0.1)])
+    labels = ["acute", "acute", "urgent", "urgent", "normal", "normal"]
+    return SeverityClassifier(vectors, labels, neighbours=3, **kwargs)
+
+
+def test_confident_neighbours_answer_locally():
+    classifier = toy_classifier()
+    assert classifier.classify(AXES[0]) == ("acute", "acute")
+    tier, share, familiar = classifier.predict(AXES[0])
+    assert share > 0.9 and familiar == pytest.approx(1.0)
+
+
+def test_split_vote_is_escalated():
+    tier, share, _ = toy_classifier().predict(unit(1, 1, 0, 0))
+    assert share < 0.8
+    assert toy_classifier().classify(unit(1, 1, 0, 0)) == (None, tier)
+
+
+def test_unfamiliar_message_is_escalated_even_with_a_unanimous_vote():
+    # An exact weak-label match may tip the vote but must not make the message look familiar
+    vectors = np.stack([AXES[0], AXES[1], AXES[2], AXES[3]])
+    weights = np.array([1.0, 1.0, 1.0, 0.3])
+    classifier = SeverityClassifier(vectors, ["acute", "urgent", "normal", "normal"], weights, neighbours=3)
+    tier, share, familiar = classifier.predict(AXES[3])
+    assert (tier, share) == ("normal", 1.0) and familiar == pytest.approx(0.0)
+    assert classifier.classify(AXES[3]) == (None, "normal")
+
+
+def test_stats_arithmetic():
+    classifier = toy_classifier()
+    assert classifier.stats()["hit_rate"] == classifier.stats()["agreement"] == 0.0
+    classifier.classify(AXES[0])
+    classifier.classify(unit(1, 1, 0, 0))
+    classifier.classify(AXES[3])
+    classifier.record_agreement("acute", "acute")
+    classifier.record_agreement("urgent", "normal")
+    assert classifier.stats() == {
+        "local": 1, "escalated": 2, "compared": 2, "agreed": 1, "hit_rate": 0.3333, "agreement": 0.5,
+    }
+
+
+@pytest.fixture
+def brain(monkeypatch):
+    brain = VetBrain()
+    brain.kb.severity_classifier = toy_classifier()
+    monkeypatch.setattr(brain, "_local_severity", lambda text: (None, "urgent"))   # always escalates
+    return brain
+
+
+@pytest.mark.parametrize("reply, tier, compared, agreed", [
+    ("urgent", "urgent", 1, 1),
+    ("normal", "ok", 1, 0),
+    (LLM_FALLBACK_REPLY, "urgent", 0, 0),     # failed call: acts on the local guess, not a comparison
+])
+def test_only_real_llm_answers_count_towards_agreement(brain, monkeypatch, reply, tier, compared, agreed):
+    async def llm(prompt, task=None):
+        return reply
+
+    monkeypatch.setattr(brain, "aask_llm_direct", llm)
+    assert asyncio.run(brain.acheck_safety("my dog has a cough"))[0] == tier
+    stats = brain.severity_stats()
+    assert (stats["compared"], stats["agreed"]) == (compared, agreed)
+
+
+def test_llm_exception_is_not_counted_either(brain, monkeypatch):
+    def llm(prompt, task=None):
+        raise TimeoutError("read timeout")
+
+    monkeypatch.setattr(brain, "ask_llm_direct", llm)
+    assert brain.check_safety("my dog has a cough")[0] == "urgent"
+    assert brain.severity_stats()["compared"] == 0
+
+
+def test_evaluator_safety_cases_are_held_out_of_training():
+    from evaluate_vetbrain import SAFETY_CASES
+    from vetbrain_severity import SEVERITY_EXAMPLES
+
+    training = {" ".join(text.lower().split()) for text, _ in SEVERITY_EXAMPLES}
+    assert not training & {" ".join(case["input"].lower().split()) for case in SAFETY_CASES}
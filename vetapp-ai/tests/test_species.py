@@ -0,0 +1,25 @@
+import pytest
+
+from vetbrain import VetBrain
+
+
+@pytest.fixture(scope="module")
+def brain():
+    return VetBrain()
+
+
+@pytest.mark.parametrize("text, species", [
+    ("nagsusuka ang aso ko mula kahapon", "Dog"),
+    ("mula kahapon hindi kumakain ang pusa ko", "Cat"),
+    ("nagsusuka siya mula kahapon", None),
+    ("baka may lagnat siya", None),
+    ("my mule is limping", "Mule"),
+    ("the puppies have diarrhea", "Dog"),
+])
+def test_detect_species_in_free_text(brain, text, species):
+    assert brain.detect_species(text) == species
+
+
+@pytest.mark.parametrize("answer, species", [("mula", "Mule"), ("baka", "Cow"), ("Aso", "Dog"), ("tiger", None)])
+def test_explicit_animal_answers_keep_every_alias(brain, answer, species):
+    assert brain.canonical_species(answer) == species
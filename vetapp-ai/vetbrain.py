@@ -1,14 +1,31 @@
 import pandas as pd
 import requests
+import httpx
+import asyncio
 import json
 import re
 import hashlib
 import time
 import os
+import threading
+import numpy as np
 from dotenv import load_dotenv
-from sentence_transformers import SentenceTransformer, util
+from collections import OrderedDict
 from datetime import datetime
-from typing import Tuple, Optional, Dict, Any, List
+from typing import Tuple, Optional, Dict, Any, List, AsyncIterator
+
+from vetbrain_ratelimit import RateLimitScheduler
+from vetbrain_cache import LLMResponseCache
+from vetbrain_cassette import CassetteMiss, LLMCassette
+from vetbrain_embeddings import create_embedder
+from vetbrain_index import SpeciesIndexes, dot_rows
+from vetbrain_intents import IntentMatcher
+from vetbrain_lexical import BM25Index, reciprocal_rank_fusion
+from vetbrain_metrics import LLM_CACHE, LLM_CALLS, PROMPT_TOKENS, span
+from vetbrain_prompt import PROMPT_TOKEN_BUDGET, TokenCounter, assemble_context
+import vetbrain_severity
+from vetbrain_severity import SeverityClassifier
+from vetbrain_storage import EMBEDDING_STORAGE, load_embeddings, save_embeddings, to_storage
 
 # ==========================================
 # CONFIGURATION
@@ -16,29 +33,142 @@ from typing import Tuple, Optional, Dict, Any, List
 load_dotenv()
 API_KEY = os.getenv("OPENROUTER_API_KEY")
 LLM_MODEL = "openai/gpt-4o-mini"
+OPENROUTER_URL = os.getenv("OPENROUTER_URL", "https://openrouter.ai/api/v1/chat/completions")
+LLM_TIMEOUT_SECONDS = 15
+# Keep-alive connection pool shared by every LLM call in this process
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
 CLINIC_OPEN = 7   # 7:00 AM
 CLINIC_CLOSE = 20  # 8:00 PM
 
-# Minimum seconds between LLM calls (Rate Limiting)
-RATE_LIMIT_SECONDS = 3
+# Minimum seconds between messages from one chat session (per-user throttle)
+RATE_LIMIT_SECONDS = float(os.getenv("RATE_LIMIT_SECONDS", "3"))
+
+# Outbound OpenRouter budget, shared fairly by every session in this process
+LLM_REQUESTS_PER_SECOND = float(os.getenv("LLM_REQUESTS_PER_SECOND", "2"))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", "200000"))
+
+LLM_FALLBACK_REPLY = (
+    "I'm currently unable to reach the AI service. "
+    "Please book a consultation through VetConnect so a vet can assess your pet directly. "
+    "Only a licensed veterinarian can confirm the exact cause."
+)
+
+# Memo for deterministic internal LLM tasks (severity, extraction, summaries)
+LLM_CACHE_ENABLED = os.getenv("VETBRAIN_LLM_CACHE", "1") != "0"
+LLM_CACHE_TTL_SECONDS = int(os.getenv("VETBRAIN_LLM_CACHE_TTL", str(7 * 24 * 3600)))
+LLM_CACHE_MAX_ENTRIES = 4096
+
+# Record/replay of all LLM traffic for offline, deterministic runs (see vetbrain_cassette.py)
+LLM_CASSETTE_PATH = os.getenv("VETBRAIN_CASSETTE", "")
+LLM_CASSETTE_MODE = os.getenv("VETBRAIN_CASSETTE_MODE", "replay").lower()
 
 # RAG configuration
 RAG_TOP_K = 5  # Number of top matches to retrieve for context
+# Every text column of a disease record is split into overlapping passages and each passage is embedded;
+# 80 words (~110 word-pieces) stays inside the 128 tokens MiniLM was trained on
+RAG_CHUNK_COLUMNS = ("Symptoms", "Description", "Recognition", "Similar Conditions", "Treatment", "Advice/ Prevention")
+RAG_CHUNK_WORDS = 80
+RAG_CHUNK_OVERLAP = 20
+RAG_CHUNK_POOLING = os.getenv("VETBRAIN_CHUNK_POOLING", "max").lower()  # max | sum — which diseases passage hits keep
+# hybrid = dense + BM25 fused by reciprocal rank; dense = embedding similarity only
+RAG_RETRIEVAL_MODE = os.getenv("VETBRAIN_RETRIEVAL", "hybrid").lower()
+RAG_FUSION_DEPTH = 20  # candidates taken from each ranking before fusion
+# LLM rewrite of narrative queries into clinical terms before search (one extra round trip)
+RAG_SYMPTOM_EXTRACTION = os.getenv("VETBRAIN_RAG_EXTRACTION", "1") != "0"
+
+# Embedding configuration
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+# Encoded corpora are saved here, keyed by model + source data, so warm starts skip re-encoding
+EMBEDDING_CACHE_DIR = os.getenv("VETBRAIN_CACHE_DIR", ".vetbrain_cache")
+QUERY_EMBEDDING_CACHE_SIZE = 2048  # recent query embeddings kept in memory (LRU)
+WARMUP_QUERY = "my dog is vomiting and not eating"  # dry-run retrieval at startup
+
+# Knowledge-base sources, re-read by reload_data() when they change on disk
+SYMPTOMS_PATH = "clean-data.csv"
+RAG_PATH_CANDIDATES = ("Animal_disease_spreadsheet_-_Sheet1.csv", "Animal_disease_spreadsheet.csv")
+KB_WATCH_SECONDS = float(os.getenv("VETBRAIN_KB_WATCH_SECONDS", "30"))  # API file-watch interval, 0 = off
+
+
+class KnowledgeBase:
+    """
+    One snapshot of everything retrieval and safety matching read. reload_data() builds a
+    new snapshot beside the live one and swaps the reference, so a request that took
+    `kb = self.kb` works against a single consistent version from start to finish.
+    """
+
+    def __init__(self, version: int = 0):
+        self.version = version
+        self.df_symptoms = pd.DataFrame()       # clean-data.csv (safety + ML eval)
+        self.df_rag = pd.DataFrame()            # Animal_disease_spreadsheet (RAG knowledge base)
+        self.symptom_embeddings = None
+        self.rag_embeddings = None              # one unit row per passage (VETBRAIN_EMBEDDING_STORAGE)
+        self.rag_chunk_offsets = None           # disease r owns rag_embeddings[offsets[r]:offsets[r + 1]]
+        # Species → RAG row indices, derived at load (the spreadsheet has no Animal column)
+        self.rag_species_index: Dict[str, List[int]] = {}
+        self.rag_index: Optional[SpeciesIndexes] = None   # vector index over rag_embeddings
+        self.rag_lexical: Optional[BM25Index] = None      # BM25 over rag_text + full Symptoms
+        # Local kNN severity fast path (see vetbrain_severity.py)
+        self.severity_classifier: Optional[SeverityClassifier] = None
+        self.sources: Dict[str, Optional[Tuple[int, int]]] = {}  # source path → (mtime_ns, size) when read
+        self.cache_paths: Dict[str, str] = {}
+        self.encoded: Dict[str, Tuple[List[str], Any]] = {}     # corpus → (row content hashes, matrix)
+        self.reencoded: Dict[str, int] = {}                      # corpus → rows encoded for this snapshot
+
+
+def _snapshot_field(name: str) -> property:
+    return property(lambda self: getattr(self.kb, name), doc=f"{name} of the live KnowledgeBase snapshot")
+
 
 # ==========================================
 # VETBRAIN — AI Logic Class (RAG-Enhanced)
 # ==========================================
 
 class VetBrain:
+    # Read-only views of the live snapshot. A request touching several of these should take
+    # `kb = self.kb` once instead, so a reload between two reads can't mix versions.
+    df_symptoms = _snapshot_field("df_symptoms")
+    df_rag = _snapshot_field("df_rag")
+    symptom_embeddings = _snapshot_field("symptom_embeddings")
+    rag_embeddings = _snapshot_field("rag_embeddings")
+    rag_chunk_offsets = _snapshot_field("rag_chunk_offsets")
+    rag_species_index = _snapshot_field("rag_species_index")
+    rag_index = _snapshot_field("rag_index")
+    rag_lexical = _snapshot_field("rag_lexical")
+    severity_classifier = _snapshot_field("severity_classifier")
+
     def __init__(self):
         self.status = "Loading..."
+        self.ready = False                      # True once load_data() and warm_up() finished
         self.df_services = pd.DataFrame()
-        self.df_symptoms = pd.DataFrame()       # clean-data.csv (safety + ML eval)
-        self.df_rag = pd.DataFrame()            # Animal_disease_spreadsheet (RAG knowledge base)
-        self.symptom_embeddings = None
-        self.rag_embeddings = None
+        self.kb = KnowledgeBase()               # CSVs + embeddings + indexes; swapped whole on reload
+        self._reload_lock = threading.Lock()
         self.embedding_model = None
-        self.last_llm_call = 0.0
+        self.rate_limiter = RateLimitScheduler(LLM_REQUESTS_PER_SECOND, LLM_TOKENS_PER_MINUTE)
+        self.llm_cache = LLMResponseCache(
+            os.path.join(EMBEDDING_CACHE_DIR, "llm_cache.sqlite3"),
+            max_entries=LLM_CACHE_MAX_ENTRIES,
+            ttl_seconds=LLM_CACHE_TTL_SECONDS,
+            never_cache=(LLM_FALLBACK_REPLY,),
+        ) if LLM_CACHE_ENABLED else None
+        self.cassette: Optional[LLMCassette] = None
+        if LLM_CASSETTE_PATH:
+            self.use_cassette(LLM_CASSETTE_PATH, LLM_CASSETTE_MODE)
+
+        # Pooled HTTP clients — sync for scripts/evaluator, async for the API
+        self._http = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=LLM_MAX_CONNECTIONS)
+        self._http.mount("https://", adapter)
+        self._http.mount("http://", adapter)
+        self._ahttp: Optional[httpx.AsyncClient] = None
+        self._ahttp_loop = None
+
+        self.retrieval_mode = RAG_RETRIEVAL_MODE
+        self.prompt_counter = TokenCounter()    # LLM-tokenizer counts for prompt budgets + rate limits
+        self._shadow_tasks: set = set()
+
+        # Normalized query text → embedding, shared by safety matching and RAG retrieval
+        self._query_embeddings: "OrderedDict[str, Any]" = OrderedDict()
+        self._query_embeddings_lock = threading.Lock()
 
         # ── Supported & out-of-scope animals ────────────────────────────────
         self.supported_animals = [
@@ -71,6 +201,22 @@ class VetBrain:
             "buriko": "Donkey",
             "mula": "Mule",
         }
+        # Tagalog names that are also everyday words ("mula kahapon" = since yesterday,
+        # "baka" = maybe): resolved when they are the answer to "what animal?", never in free text
+        self.explicit_only_animal_aliases = {"mula", "baka"}
+
+        # ── Extra English terms the knowledge base uses for each species ─────
+        self.species_synonyms = {
+            "Dog": ["puppy", "puppies", "canine"],
+            "Cat": ["kitten", "feline"],
+            "Cow": ["cattle", "calf", "calves"],
+            "Cattle": ["cow", "calf", "calves"],
+            "Hen": ["chicken", "poultry"],
+            "Pig": ["piglet", "swine"],
+            "Horse": ["foal", "equine"],
+            "Bird": ["parrot", "budgie"],
+        }
+        self.species_patterns = self._compile_species_patterns()
 
         # ── Breed whitelist ────────────────────────────────────────────────
         self.BREED_WHITELIST = {
@@ -140,72 +286,328 @@ ABSOLUTE RULES — never violate any of these:
         ]
         self.df_services = pd.DataFrame(services_data)
 
-        # --- B. SAFETY DATASET (clean-data.csv) — kept for safety detection ---
+        # --- B. EMBEDDING MODEL ---
+        print("⏳ Loading embedding model...")
+        self.embedding_model = create_embedder(EMBEDDING_MODEL_NAME)
+
+        # --- C. KNOWLEDGE BASE (CSVs → embeddings → indexes) ---
+        self.kb = self._build_knowledge_base()
+
+        self.warm_up()
+        self.status = "Ready"
+        self.ready = True
+        print("✅ VetConnect AI Ready! RAG mode active.")
+        print(f"   Safety DB : {len(self.df_symptoms)} rows (clean-data.csv)")
+        print(f"   RAG KB    : {len(self.df_rag)} diseases (Animal_disease_spreadsheet)")
+
+    def _build_knowledge_base(self, previous: Optional[KnowledgeBase] = None) -> KnowledgeBase:
+        """
+        Read both CSVs and build their embeddings and indexes into a new snapshot.
+        With `previous`, rows whose text it already encoded reuse those embeddings,
+        so only added or edited rows go through the model.
+        """
+        kb = KnowledgeBase(version=previous.version + 1 if previous else 1)
+        # Stamped before reading, so an edit landing mid-read is picked up by the next check
+        for path in (SYMPTOMS_PATH, *RAG_PATH_CANDIDATES):
+            kb.sources[path] = self._source_stamp(path)
+
+        # --- SAFETY DATASET (clean-data.csv) — kept for safety detection ---
         try:
-            self.df_symptoms = pd.read_csv("clean-data.csv")
+            df = pd.read_csv(SYMPTOMS_PATH)
             cols = ['Symptom 1', 'Symptom 2', 'Symptom 3', 'Symptom 4', 'Symptom 5']
-            self.df_symptoms['Symptoms_Text'] = self.df_symptoms[cols].apply(
-                lambda x: ', '.join(x.dropna().astype(str)), axis=1
-            )
-            self.df_symptoms['is_dangerous'] = (
-                self.df_symptoms['Dangerous'].str.lower().str.strip() == 'yes'
-            )
-            self.df_symptoms['combined_text'] = (
-                self.df_symptoms['Animal'].astype(str) + " "
-                + self.df_symptoms['Symptoms_Text'].astype(str)
-            )
-            print(f"✅ Safety dataset loaded: {len(self.df_symptoms)} rows.")
+            df['Symptoms_Text'] = df[cols].apply(lambda x: ', '.join(x.dropna().astype(str)), axis=1)
+            df['is_dangerous'] = df['Dangerous'].str.lower().str.strip() == 'yes'
+            df['combined_text'] = df['Animal'].astype(str) + " " + df['Symptoms_Text'].astype(str)
+            kb.df_symptoms = df
+            print(f"✅ Safety dataset loaded: {len(df)} rows.")
         except Exception as e:
             print(f"⚠️  Warning: clean-data.csv error ({e}). Safety detection may be limited.")
-            self.df_symptoms = pd.DataFrame()
 
-        # --- C. RAG KNOWLEDGE BASE (Animal_disease_spreadsheet) ---
+        # --- RAG KNOWLEDGE BASE (Animal_disease_spreadsheet) ---
+        rag_path = next((p for p in RAG_PATH_CANDIDATES if os.path.exists(p)), None)
         try:
-            rag_candidates = [
-                "Animal_disease_spreadsheet_-_Sheet1.csv",
-                "Animal_disease_spreadsheet.csv",
-            ]
-            rag_path = next((p for p in rag_candidates if os.path.exists(p)), None)
             if rag_path:
-                self.df_rag = pd.read_csv(rag_path)
-                
-                # IMPORTANT: Reset index to ensure Pandas ILOC perfectly matches PyTorch tensor indexing
-                self.df_rag.reset_index(drop=True, inplace=True) 
-                
+                # IMPORTANT: Reset index to ensure Pandas ILOC perfectly matches embedding row indexing
+                df = pd.read_csv(rag_path).reset_index(drop=True)
                 # Rename unnamed column to Disease
-                self.df_rag = self.df_rag.rename(columns={"Unnamed: 0": "Disease"})
+                df = df.rename(columns={"Unnamed: 0": "Disease"})
                 # Build rich combined text for embedding (symptoms + description)
-                self.df_rag['rag_text'] = self.df_rag.apply(self._build_rag_text, axis=1)
-                print(f"✅ RAG knowledge base loaded: {len(self.df_rag)} diseases.")
+                df['rag_text'] = df.apply(self._build_rag_text, axis=1)
+                kb.df_rag = df
+                print(f"✅ RAG knowledge base loaded: {len(df)} diseases.")
             else:
                 print("⚠️  RAG knowledge base not found. Falling back to safety dataset only.")
-                self.df_rag = pd.DataFrame()
         except Exception as e:
             print(f"⚠️  RAG load error ({e}).")
-            self.df_rag = pd.DataFrame()
-
-        # --- D. EMBEDDING MODEL ---
-        print("⏳ Loading embedding model...")
-        self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
 
         # Safety dataset embeddings
-        if not self.df_symptoms.empty:
-            self.symptom_embeddings = self.embedding_model.encode(
-                self.df_symptoms["combined_text"].tolist(), convert_to_tensor=True
+        if not kb.df_symptoms.empty:
+            kb.symptom_embeddings = self._load_or_encode(
+                kb, previous, "safety", kb.df_symptoms["combined_text"].tolist(), SYMPTOMS_PATH
             )
-            print(f"✅ Safety embeddings built: {len(self.df_symptoms)} rows.")
+            print(f"✅ Safety embeddings built: {len(kb.df_symptoms)} rows.")
+        self._build_severity_classifier(kb, previous)
 
         # RAG knowledge base embeddings
-        if not self.df_rag.empty:
-            self.rag_embeddings = self.embedding_model.encode(
-                self.df_rag["rag_text"].tolist(), convert_to_tensor=True
+        if not kb.df_rag.empty:
+            chunks, kb.rag_chunk_offsets = self._build_rag_chunks(kb.df_rag)
+            kb.rag_embeddings = self._load_or_encode(kb, previous, "rag", chunks, rag_path)
+            print(f"✅ RAG embeddings built: {len(chunks)} passages across {len(kb.df_rag)} diseases "
+                  f"({kb.rag_embeddings.nbytes / 1024:.0f} KB {EMBEDDING_STORAGE}).")
+            self._build_species_index(kb, previous)
+            self._build_lexical_index(kb)
+        return kb
+
+    # ──────────────────────────────────────────────────────────────────────────
+    # HOT RELOAD
+    # ──────────────────────────────────────────────────────────────────────────
+    @staticmethod
+    def _source_stamp(path: str) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def knowledge_changed(self) -> bool:
+        """True when a knowledge-base CSV was edited, added or removed since the live snapshot read it"""
+        kb = self.kb
+        return any(self._source_stamp(path) != stamp for path, stamp in kb.sources.items())
+
+    def reload_data(self, force: bool = False) -> Dict[str, Any]:
+        """
+        Rebuild the knowledge base from disk and swap it in. Unchanged rows keep their
+        embeddings; requests already running finish on the snapshot they started with.
+        A reload that fails, or that would empty a dataset the live snapshot has, leaves
+        the live snapshot in place.
+        """
+        with self._reload_lock:
+            current = self.kb
+            if not force and not self.knowledge_changed():
+                return {"reloaded": False, "version": current.version}
+            print(f"🔄 Reloading knowledge base (version {current.version})...")
+            started = time.perf_counter()
+            try:
+                with span("kb.reload"):
+                    kb = self._build_knowledge_base(previous=current)
+            except Exception as e:
+                print(f"⚠️  Knowledge base reload failed ({e}). Keeping version {current.version}.")
+                return {"reloaded": False, "version": current.version, "error": str(e)}
+            lost = [name for name, old, new in (("clean-data.csv", current.df_symptoms, kb.df_symptoms),
+                                                ("RAG knowledge base", current.df_rag, kb.df_rag))
+                    if new.empty and not old.empty]
+            if lost:
+                print(f"⚠️  Reload produced no rows for {', '.join(lost)}. Keeping version {current.version}.")
+                return {"reloaded": False, "version": current.version, "error": f"empty {', '.join(lost)}"}
+            if current.severity_classifier is not None and kb.severity_classifier is not None:
+                kb.severity_classifier.counts = current.severity_classifier.counts
+            self.kb = kb  # single reference assignment — readers see the old or the new snapshot, never a mix
+            seconds = time.perf_counter() - started
+            print(f"✅ Knowledge base version {kb.version} live in {seconds:.1f}s "
+                  f"({len(kb.df_rag)} diseases, {len(kb.df_symptoms)} safety rows, re-encoded {kb.reencoded}).")
+            return {
+                "reloaded": True,
+                "version": kb.version,
+                "seconds": round(seconds, 2),
+                "diseases": len(kb.df_rag),
+                "safety_rows": len(kb.df_symptoms),
+                "reencoded": dict(kb.reencoded),
+            }
+
+    def warm_up(self):
+        """
+        Run one query through every local stage (encoder, severity classifier,
+        safety match, species-filtered retrieval) so the first real request
+        doesn't pay for lazy initialisation. No LLM calls, no stats recorded.
+        """
+        self.status = "Warming up..."
+        started = time.perf_counter()
+        self.prompt_counter.count_cached(self.system_instruction)
+        embedding = self.embedding_model.encode([WARMUP_QUERY])[0]
+        if self.severity_classifier is not None:
+            self.severity_classifier.predict(embedding)
+        if self.symptom_embeddings is not None:
+            self.find_best_match(WARMUP_QUERY)
+        if self.rag_index is not None:
+            self._search_rag(WARMUP_QUERY, WARMUP_QUERY, "Dog", RAG_TOP_K)
+        print(f"✅ Warm-up done in {(time.perf_counter() - started) * 1000:.0f} ms.")
+
+    @staticmethod
+    def _text_hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+    def _load_or_encode(self, kb: KnowledgeBase, previous: Optional[KnowledgeBase], name: str,
+                        texts: List[str], source_path: str, storage: str = EMBEDDING_STORAGE):
+        """
+        Return embeddings for texts, reusing the on-disk cache when nothing changed.
+        The cache key covers the model + backend, the storage format, the raw source file and the
+        derived texts, so editing the CSV, the text builder, the model or the backend forces a re-encode.
+        Cached matrices are memory-mapped read-only, so every worker on the host shares one copy.
+        On a miss, rows whose text `previous` already encoded are copied instead of re-encoded.
+        """
+        digest = hashlib.sha256(f"{self.embedding_model.cache_key}\x00{storage}".encode("utf-8"))
+        with open(source_path, "rb") as f:
+            digest.update(f.read())
+        for text in texts:
+            digest.update(b"\x00" + text.encode("utf-8"))
+        cache_path = os.path.join(EMBEDDING_CACHE_DIR, f"{name}-{digest.hexdigest()[:16]}.npy")
+        kb.cache_paths[name] = cache_path
+        hashes = [self._text_hash(text) for text in texts]
+
+        if os.path.exists(cache_path):
+            try:
+                matrix = load_embeddings(cache_path, storage)
+                if matrix.shape[0] == len(texts):
+                    print(f"✅ {name} embeddings mapped from cache ({cache_path}, {storage}).")
+                    kb.encoded[name] = (hashes, matrix)
+                    kb.reencoded[name] = 0
+                    return matrix
+            except Exception as e:
+                print(f"⚠️  Embedding cache unreadable ({e}). Re-encoding {name} corpus.")
+
+        embeddings = to_storage(self._encode_changed(kb, previous, name, texts, hashes), storage)
+        kb.encoded[name] = (hashes, embeddings)
+        try:
+            os.makedirs(EMBEDDING_CACHE_DIR, exist_ok=True)
+            save_embeddings(cache_path, embeddings, storage)
+            # Drop embeddings (and vector indexes built on them) from older versions of the corpus.
+            # Snapshots still serving keep their mappings: unlinking a mapped file doesn't unmap it.
+            stem = os.path.splitext(os.path.basename(cache_path))[0]
+            for old in os.listdir(EMBEDDING_CACHE_DIR):
+                if old.startswith(f"{name}-") and not old.startswith(stem) and not old.endswith(".tmp"):
+                    os.remove(os.path.join(EMBEDDING_CACHE_DIR, old))
+            # Serve from the shared mapping rather than this process's private copy
+            matrix = load_embeddings(cache_path, storage)
+            kb.encoded[name] = (hashes, matrix)
+            return matrix
+        except OSError as e:
+            print(f"⚠️  Could not write embedding cache ({e}).")
+        return embeddings
+
+    def _encode_changed(self, kb: KnowledgeBase, previous: Optional[KnowledgeBase], name: str,
+                        texts: List[str], hashes: List[str]) -> np.ndarray:
+        """float32 embeddings for texts, encoding only rows whose content hash `previous` doesn't have"""
+        old_hashes, old_matrix = previous.encoded.get(name, ([], None)) if previous else ([], None)
+        known = {h: i for i, h in enumerate(old_hashes)}
+        old_rows = np.array([known.get(h, -1) for h in hashes], dtype=np.int64)
+        kept = np.flatnonzero(old_rows >= 0)
+        if old_matrix is None or not kept.size:
+            kb.reencoded[name] = len(texts)
+            return self.embedding_model.encode(texts)
+
+        added = np.flatnonzero(old_rows < 0)
+        matrix = np.empty((len(texts), old_matrix.shape[1]), dtype=np.float32)
+        matrix[kept] = np.asarray(old_matrix[old_rows[kept]], dtype=np.float32)
+        if added.size:
+            matrix[added] = self.embedding_model.encode([texts[i] for i in added])
+        kb.reencoded[name] = int(added.size)
+        print(f"♻️  {name}: reused {kept.size} embeddings, encoded {added.size} added or changed rows.")
+        return matrix
+
+    def _build_severity_classifier(self, kb: KnowledgeBase, previous: Optional[KnowledgeBase] = None):
+        """kNN over hand-labelled severity examples + clean-data.csv rows (weakly labelled)"""
+        texts = [text for text, _ in vetbrain_severity.SEVERITY_EXAMPLES]
+        vectors = [self._load_or_encode(kb, previous, "severity", texts, vetbrain_severity.__file__,
+                                        storage="float32")]
+        labels = [label for _, label in vetbrain_severity.SEVERITY_EXAMPLES]
+        weights = [np.ones(len(texts))]
+        if kb.symptom_embeddings is not None:
+            vectors.append(kb.symptom_embeddings)
+            labels += ["urgent" if d else "normal" for d in kb.df_symptoms["is_dangerous"]]
+            weights.append(np.full(len(kb.df_symptoms), vetbrain_severity.WEAK_LABEL_WEIGHT))
+        # Blocks are scored in place, so the dataset rows stay in the shared symptom_embeddings mapping
+        kb.severity_classifier = SeverityClassifier(vectors, labels, np.concatenate(weights))
+        print(f"✅ Severity classifier ready: {len(texts)} labelled examples + {len(labels) - len(texts)} dataset rows.")
+
+    def _compile_species_patterns(self) -> Dict[str, "re.Pattern"]:
+        """One word-boundary regex per supported species covering English, plural and Tagalog names"""
+        aliases = {a: {a.lower()} for a in self.supported_animals}
+        for tagalog, english in self.tagalog_animal_map.items():
+            if tagalog not in self.explicit_only_animal_aliases:
+                aliases[english].add(tagalog)
+        for english, extra in self.species_synonyms.items():
+            aliases[english].update(extra)
+        return {
+            animal: re.compile(
+                r"\b(?:" + "|".join(re.escape(t) for t in sorted(terms, key=len, reverse=True)) + r")(?:e?s)?\b",
+                re.IGNORECASE,
             )
-            print(f"✅ RAG embeddings built: {len(self.df_rag)} diseases.")
+            for animal, terms in aliases.items()
+        }
 
-        self.status = "Ready"
-        print("✅ VetConnect AI Ready! RAG mode active.")
-        print(f"   Safety DB : {len(self.df_symptoms)} rows (clean-data.csv)")
-        print(f"   RAG KB    : {len(self.df_rag)} diseases (Animal_disease_spreadsheet)")
+    def canonical_species(self, animal: Optional[str]) -> Optional[str]:
+        """Map an English or Tagalog animal name to its supported species, if any"""
+        if not animal:
+            return None
+        animal_lower = animal.strip().lower()
+        for supported in self.supported_animals:
+            if supported.lower() == animal_lower:
+                return supported
+        return self.tagalog_animal_map.get(animal_lower)
+
+    def detect_species(self, text: str) -> Optional[str]:
+        """Return the first supported species mentioned in free text (English or Tagalog)"""
+        for animal, pattern in self.species_patterns.items():
+            if pattern.search(text):
+                return animal
+        return None
+
+    def _build_species_index(self, kb: KnowledgeBase, previous: Optional[KnowledgeBase] = None):
+        """Tag every RAG row with the species it mentions (Disease + Description) once per snapshot"""
+        texts = (
+            kb.df_rag.get("Disease", pd.Series(dtype=str)).fillna("").astype(str) + " "
+            + kb.df_rag.get("Description", pd.Series(dtype=str)).fillna("").astype(str)
+        ).tolist()
+        index = {}
+        for animal, pattern in self.species_patterns.items():
+            rows = [i for i, text in enumerate(texts) if pattern.search(text)]
+            if rows:
+                index[animal] = rows
+        kb.rag_species_index = index
+        print(f"✅ Species index built: {len(index)} species tagged across {len(texts)} diseases.")
+
+        # Vector index over the whole KB + one sub-index per species (persisted beside the embeddings);
+        # on reload, approximate indexes start from the previous snapshot's clustering
+        kb.rag_index = SpeciesIndexes(
+            kb.rag_embeddings, index, cache_stem=os.path.splitext(kb.cache_paths["rag"])[0],
+            chunk_offsets=kb.rag_chunk_offsets, pooling=RAG_CHUNK_POOLING,
+            previous=previous.rag_index if previous else None,
+        )
+        print(f"✅ RAG vector index ready: {kb.rag_index.describe()}.")
+
+    def _build_lexical_index(self, kb: KnowledgeBase):
+        """BM25 inverted index over rag_text plus the untruncated Symptoms column (symptom terms weigh double)"""
+        symptoms = kb.df_rag.get("Symptoms", pd.Series("", index=kb.df_rag.index)).fillna("").astype(str)
+        kb.rag_lexical = BM25Index((kb.df_rag["rag_text"] + " " + symptoms).tolist())
+        print(f"✅ RAG lexical index ready: {kb.rag_lexical.vocabulary_size} terms, "
+              f"retrieval mode '{self.retrieval_mode}'.")
+
+    @staticmethod
+    def _chunk_words(text: str, size: int = RAG_CHUNK_WORDS, overlap: int = RAG_CHUNK_OVERLAP) -> List[str]:
+        words = text.split()
+        step = size - overlap
+        return [" ".join(words[start:start + size]) for start in range(0, max(len(words) - overlap, 1), step)]
+
+    def _build_rag_chunks(self, df: pd.DataFrame) -> Tuple[List[str], np.ndarray]:
+        """
+        Overlapping passages over every text column of every disease, each prefixed with the
+        disease and column name so it still says what it is about on its own.
+        Returns (passages, offsets) — disease r owns passages[offsets[r]:offsets[r + 1]].
+        """
+        chunks: List[str] = []
+        offsets = [0]
+        for _, row in df.iterrows():
+            disease = str(row.get("Disease", "")) if pd.notna(row.get("Disease", "")) else ""
+            record = []
+            for column in RAG_CHUNK_COLUMNS:
+                value = row.get(column, "")
+                if pd.isna(value) or not str(value).strip():
+                    continue
+                label = column.split("/")[0].strip()
+                record += [f"{disease} — {label}: {passage}" for passage in self._chunk_words(str(value))]
+            chunks += record or [disease]
+            offsets.append(len(chunks))
+        return chunks, np.asarray(offsets, dtype=np.int64)
 
     def _build_rag_text(self, row) -> str:
         """Build searchable text from a RAG knowledge base row"""
@@ -253,10 +655,10 @@ ABSOLUTE RULES — never violate any of these:
         "chocolate", "xylitol",
         "hemorrhage",
     ]
+    _acute_matcher = IntentMatcher({"acute": _undeniable_acute})
 
-    def assess_severity(self, text: str) -> str:
-        """Uses GPT-4o-mini to classify symptom severity"""
-        prompt = (
+    def _severity_prompt(self, text: str) -> str:
+        return (
             "You are a veterinary triage assistant. A pet owner sent this message:\n"
             f'"{text}"\n\n'
             "Classify the severity as ONE of these three options:\n\n"
@@ -276,21 +678,42 @@ ABSOLUTE RULES — never violate any of these:
             "hindi kumakain = not eating, nagsusuka = vomiting.\n\n"
             "Reply with ONLY one word: acute, urgent, or normal."
         )
+
+    @staticmethod
+    def _parse_severity(result: str) -> Optional[str]:
+        if result == LLM_FALLBACK_REPLY:
+            return None
+        result = result.strip().lower()
+        for tier in ("acute", "urgent", "normal"):
+            if tier in result:
+                return tier
+        return "normal"
+
+    def assess_severity(self, text: str) -> Optional[str]:
+        """Uses GPT-4o-mini to classify symptom severity; None when the LLM call failed"""
         try:
-            result = self.ask_llm_direct(prompt).strip().lower()
-            for tier in ("acute", "urgent", "normal"):
-                if tier in result:
-                    return tier
-            return "normal"
+            return self._parse_severity(self.ask_llm_direct(self._severity_prompt(text), task="severity"))
+        except CassetteMiss:
+            raise
         except Exception:
-            return "normal"
+            return None
 
-    def check_safety(self, text: str) -> Tuple[str, Optional[str]]:
-        """Returns (tier, message) where tier is 'acute', 'urgent', or 'ok'."""
-        text_lower = text.lower()
+    async def aassess_severity(self, text: str) -> Optional[str]:
+        """Async version of assess_severity"""
+        try:
+            return self._parse_severity(await self.aask_llm_direct(self._severity_prompt(text), task="severity"))
+        except CassetteMiss:
+            raise
+        except Exception:
+            return None
 
-        # Layer 1 — undeniable acute keywords
-        if any(w in text_lower for w in self._undeniable_acute):
+    def has_acute_keyword(self, text: str) -> bool:
+        """True when layer 1 alone will classify text as acute"""
+        return "acute" in self._acute_matcher.scan(text)
+
+    def _keyword_safety(self, text: str) -> Optional[Tuple[str, Optional[str]]]:
+        """Layer 1 — undeniable acute keywords, no LLM needed"""
+        if self.has_acute_keyword(text):
             return (
                 "acute",
                 "🚨 EMERGENCY ALERT: Critical symptoms detected. "
@@ -299,9 +722,11 @@ ABSOLUTE RULES — never violate any of these:
                 "Time is critical for conditions involving bleeding, seizures, "
                 "breathing difficulty, collapse, or poisoning."
             )
+        return None
 
-        # Layer 2 — LLM severity assessment
-        tier = self.assess_severity(text)
+    @staticmethod
+    def _safety_from_tier(tier: str) -> Tuple[str, Optional[str]]:
+        """Layer 2 — map an LLM severity tier to the (tier, message) result"""
         if tier == "acute":
             return (
                 "acute",
@@ -314,6 +739,54 @@ ABSOLUTE RULES — never violate any of these:
         else:
             return ("ok", "")
 
+    def _local_severity(self, text: str) -> Tuple[Optional[str], Optional[str]]:
+        """Layer 2a — (confident local tier or None, local guess) from the kNN classifier"""
+        classifier = self.severity_classifier
+        if classifier is None:
+            return None, None
+        return classifier.classify(self.embed_query(text))
+
+    def _record_severity(self, guess: Optional[str], llm_tier: Optional[str]) -> str:
+        """Tier to act on. A failed LLM call falls back to the local guess and is not counted as a comparison"""
+        if llm_tier is None:
+            return guess or "normal"
+        if guess:
+            self.severity_classifier.record_agreement(guess, llm_tier)
+        return llm_tier
+
+    def check_safety(self, text: str) -> Tuple[str, Optional[str]]:
+        """Returns (tier, message) where tier is 'acute', 'urgent', or 'ok'."""
+        with span("safety"):
+            keyword_result = self._keyword_safety(text)
+            if keyword_result:
+                return keyword_result
+            local, guess = self._local_severity(text)
+            if local:
+                return self._safety_from_tier(local)
+            return self._safety_from_tier(self._record_severity(guess, self.assess_severity(text)))
+
+    async def acheck_safety(self, text: str) -> Tuple[str, Optional[str]]:
+        """Async version of check_safety — also shadow-checks a sample of local answers against the LLM"""
+        with span("safety"):
+            keyword_result = self._keyword_safety(text)
+            if keyword_result:
+                return keyword_result
+            local, guess = await asyncio.to_thread(self._local_severity, text)
+            if local:
+                if not self._replaying and self.severity_classifier.should_shadow():
+                    task = asyncio.create_task(self._shadow_severity(text, local))
+                    self._shadow_tasks.add(task)
+                    task.add_done_callback(self._shadow_tasks.discard)
+                return self._safety_from_tier(local)
+            return self._safety_from_tier(self._record_severity(guess, await self.aassess_severity(text)))
+
+    async def _shadow_severity(self, text: str, local: str):
+        self._record_severity(local, await self.aassess_severity(text))
+
+    def severity_stats(self) -> Dict[str, float]:
+        """Local classifier hit rate and agreement with the LLM"""
+        return self.severity_classifier.stats() if self.severity_classifier else {}
+
     # ──────────────────────────────────────────────────────────────────────────
     # RAG — Retrieval-Augmented Generation
     # ──────────────────────────────────────────────────────────────────────────
@@ -325,63 +798,105 @@ ABSOLUTE RULES — never violate any of these:
         if self.df_rag.empty or self.rag_embeddings is None:
             return []
 
+        # ── Keyword Extraction Step ───────────────────────────────────────────
+        # Extract clinical symptom keywords BEFORE embedding search
+        extracted = self.extract_symptoms_from_narrative(query, animal=animal) if RAG_SYMPTOM_EXTRACTION else query
+        return self._search_rag(query, extracted, animal, top_k)
+
+    async def aretrieve_rag_context(self, query: str, animal: str = None, top_k: int = RAG_TOP_K) -> List[Dict]:
+        """Async version of retrieve_rag_context"""
+        if self.df_rag.empty or self.rag_embeddings is None:
+            return []
+        extracted = (
+            await self.aextract_symptoms_from_narrative(query, animal=animal) if RAG_SYMPTOM_EXTRACTION else query
+        )
+        # Embedding + similarity are CPU-bound — keep them off the event loop
+        return await asyncio.to_thread(self._search_rag, query, extracted, animal, top_k)
+
+    def retrieve_rag_context_batch(
+        self, queries: List[str], animals: Optional[List[Optional[str]]] = None, top_k: int = RAG_TOP_K
+    ) -> List[List[Dict]]:
+        """
+        retrieve_rag_context for many queries at once — one encoder call for the whole batch.
+        animals, if given, lines up with queries (None entries search every species).
+        """
+        animals = animals or [None] * len(queries)
+        if self.df_rag.empty or self.rag_embeddings is None:
+            return [[] for _ in queries]
+        if not RAG_SYMPTOM_EXTRACTION:
+            return self._search_rag_batch(queries, list(queries), animals, top_k)
+        extracted = [self.extract_symptoms_from_narrative(q, animal=a) for q, a in zip(queries, animals)]
+        return self._search_rag_batch(queries, extracted, animals, top_k)
+
+    async def aretrieve_rag_context_batch(
+        self, queries: List[str], animals: Optional[List[Optional[str]]] = None, top_k: int = RAG_TOP_K
+    ) -> List[List[Dict]]:
+        """Async version of retrieve_rag_context_batch — extractions share the rate-limit scheduler"""
+        animals = animals or [None] * len(queries)
+        if self.df_rag.empty or self.rag_embeddings is None:
+            return [[] for _ in queries]
+        if not RAG_SYMPTOM_EXTRACTION:
+            return await asyncio.to_thread(self._search_rag_batch, queries, list(queries), animals, top_k)
+        extracted = await asyncio.gather(*(
+            self.aextract_symptoms_from_narrative(q, animal=a) for q, a in zip(queries, animals)
+        ))
+        return await asyncio.to_thread(self._search_rag_batch, queries, list(extracted), animals, top_k)
+
+    def _search_rag(self, query: str, extracted: str, animal: Optional[str], top_k: int) -> List[Dict]:
+        """Species filter + embedding search for a query whose symptoms are already extracted"""
+        return self._search_rag_batch([query], [extracted], [animal], top_k)[0]
+
+    def _search_rag_batch(
+        self, queries: List[str], extracted: List[str], animals: List[Optional[str]], top_k: int
+    ) -> List[List[Dict]]:
+        search_queries = [e if e and e != q else q for q, e in zip(queries, extracted)]
+        query_embeddings = self.embed_queries(search_queries)
+        return [
+            self._rag_results(query, search_query, embedding, animal, top_k)
+            for query, search_query, embedding, animal in zip(queries, search_queries, query_embeddings, animals)
+        ]
+
+    def _rag_results(self, query: str, search_query: str, query_embedding, animal: Optional[str], top_k: int) -> List[Dict]:
+        kb = self.kb  # one snapshot for the whole search, even if a reload lands mid-request
+
         # ── Metadata Filtering Step (Isolating species) ───────────────────────
-        valid_indices = list(range(len(self.df_rag)))
-        
+        species = None
         if animal:
-            animal_lower = animal.lower()
-            filtered_indices = []
-            has_animal_col = 'Animal' in self.df_rag.columns
-            
-            for idx in valid_indices:
-                row = self.df_rag.iloc[idx]
-                is_match = False
-                
-                if has_animal_col and pd.notna(row['Animal']):
-                    if animal_lower in str(row['Animal']).lower():
-                        is_match = True
-                else:
-                    # Fallback: Check if animal name is in Disease or Description
-                    text_to_check = str(row.get('Disease', '')) + " " + str(row.get('Description', ''))
-                    if animal_lower in text_to_check.lower():
-                        is_match = True
-                        
-                if is_match:
-                    filtered_indices.append(idx)
-                    
+            species = self.canonical_species(animal)
+            filtered_indices = kb.rag_species_index.get(species) if species else None
+
             # Only apply filter if we found matches (fallback to all if filter is too strict/dataset missing labels)
             if filtered_indices:
-                valid_indices = filtered_indices
-                print(f"[RAG] Metadata filter applied: {len(valid_indices)} records found for '{animal}'")
+                print(f"[RAG] Metadata filter applied: {len(filtered_indices)} records found for '{animal}'")
             else:
+                species = None
                 print(f"[RAG] Metadata filter found no exact matches for '{animal}', searching entire DB.")
 
-        # Subset the embeddings tensor based on filtered indices
-        filtered_embeddings = self.rag_embeddings[valid_indices]
-
-        # ── Keyword Extraction Step ───────────────────────────────────────────
-        # Extract clinical symptom keywords BEFORE embedding search
-        extracted = self.extract_symptoms_from_narrative(query, animal=animal)
-        search_query = extracted if extracted and extracted != query else query
         print(f"[RAG] Search query after extraction: '{search_query[:60]}'")
 
-        query_embedding = self.embedding_model.encode(search_query, convert_to_tensor=True)
-        
-        # Calculate Cosine Similarity ONLY against the filtered embeddings
-        scores = util.cos_sim(query_embedding, filtered_embeddings)[0]
-
-        # Get top-K indices sorted by score
-        top_local_indices = scores.argsort(descending=True)[:top_k].tolist()
+        # Top-K by cosine similarity from the species sub-index (or the whole KB),
+        # fused with BM25 over the same rows in hybrid mode
+        with span("retrieve"):
+            if self.retrieval_mode == "hybrid" and kb.rag_lexical is not None:
+                _, dense_ids = kb.rag_index.search(query_embedding, RAG_FUSION_DEPTH, species=species)
+                # The raw query keeps exact terms ("parvo", "mange") the extraction may have rephrased
+                lexical_query = query if search_query == query else f"{query} {search_query}"
+                _, lexical_ids = kb.rag_lexical.search(
+                    lexical_query, RAG_FUSION_DEPTH, rows=kb.rag_index.rows.get(species) if species else None
+                )
+                row_ids = np.asarray(reciprocal_rank_fusion(dense_ids.tolist(), lexical_ids.tolist())[:top_k],
+                                     dtype=np.int64)
+                # Reported scores stay cosine similarities, so thresholds and the evaluator's MSE mean the same
+                scores = kb.rag_index.record_scores(query_embedding, kb.rag_embeddings, row_ids)
+            else:
+                scores, row_ids = kb.rag_index.search(query_embedding, top_k, species=species)
 
         results = []
-        for local_idx in top_local_indices:
-            score = scores[local_idx].item()
+        for score, original_idx in zip(scores.tolist(), row_ids.tolist()):
             if score < 0.2:  # Skip very irrelevant results
                 continue
-                
-            # Map the local tensor index back to the original dataframe index
-            original_idx = valid_indices[local_idx]
-            row = self.df_rag.iloc[original_idx]
+
+            row = kb.df_rag.iloc[original_idx]
             
             results.append({
                 "disease": str(row.get("Disease", "Unknown")),
@@ -405,11 +920,14 @@ ABSOLUTE RULES — never violate any of these:
         query: str,
         rag_results: List[Dict],
         known_animal: str = None,
-        is_urgent: bool = False
+        is_urgent: bool = False,
+        token_budget: int = PROMPT_TOKEN_BUDGET,
     ) -> str:
         """
         Build a GPT prompt using retrieved RAG context.
         GPT reasons over multiple retrieved records instead of a single match.
+        Records are deduplicated and trimmed so system instruction + prompt stay within
+        token_budget tokens (see vetbrain_prompt.py).
         """
         subject = known_animal if known_animal else "the pet"
 
@@ -431,19 +949,6 @@ ABSOLUTE RULES — never violate any of these:
                 "End with 'Only a licensed veterinarian can confirm the exact cause.'"
             )
 
-        # Build context block from retrieved records
-        context_lines = []
-        for i, r in enumerate(rag_results, 1):
-            context_lines.append(
-                f"[Record {i}] Disease: {r['disease']}\n"
-                f"  Symptoms: {r['symptoms']}\n"
-                f"  Description: {r['description']}\n"
-                f"  Recognition: {r['recognition']}\n"
-                f"  Treatment context: {r['treatment']}\n"
-                f"  Prevention/Advice: {r['advice']}"
-            )
-        context_block = "\n\n".join(context_lines)
-
         urgency_instruction = ""
         if is_urgent:
             urgency_instruction = (
@@ -452,37 +957,78 @@ ABSOLUTE RULES — never violate any of these:
                 f"or collapses, please go to an emergency clinic immediately.'"
             )
 
-        return (
-            f"You are VetBot for VetConnect Veterinary Clinic.\n\n"
+        # The persona and general rules come with the system instruction; these are the task-specific ones
+        header = (
             f"The owner has a {subject} and reports: \"{query}\"\n\n"
-            f"Below are the most relevant records from our veterinary knowledge base "
-            f"(retrieved by semantic search — sorted by relevance):\n\n"
-            f"{context_block}\n\n"
-            f"INSTRUCTIONS:\n"
-            f"1. Use ONLY the information above to inform your response. "
-            f"Do NOT add conditions, drugs, dosages, or information not present in these records.\n"
-            f"2. You may reference the most relevant condition(s) from the records above, "
-            f"but NEVER state a diagnosis as fact. Use 'Possible causes include' or 'This may be related to'.\n"
-            f"3. Write a 2-3 sentence empathetic, professional response for a {subject} owner.\n"
+            f"Most relevant records from our veterinary knowledge base, best match first:\n\n"
+        )
+        instructions = (
+            f"\n\nINSTRUCTIONS:\n"
+            f"1. Use ONLY the records above. Do NOT add conditions, drugs, dosages, or other information.\n"
+            f"2. Mention the most relevant condition(s) but NEVER state a diagnosis as fact. "
+            f"Use 'Possible causes include' or 'This may be related to'.\n"
+            f"3. Write a 2-3 sentence empathetic, professional response for a {subject} owner."
             f"{urgency_instruction}\n"
             f"Always end with: 'Only a licensed veterinarian can confirm the exact cause.'\n"
             f"Only refer to the {subject}. Never name another species."
         )
 
+        # Whatever the fixed parts leave goes to the records (deduplicated, score-weighted, trimmed)
+        counter = self.prompt_counter
+        fixed = counter.count_cached(self.system_instruction) + counter.count(header) + counter.count_cached(instructions)
+        blocks, kept = assemble_context(rag_results, token_budget - fixed, counter)
+        prompt = header + "\n\n".join(blocks) + instructions
+        total = counter.count_cached(self.system_instruction) + counter.count(prompt)
+        print(f"[PROMPT] {total} tokens with system instruction (budget {token_budget}): "
+              f"{kept['kept']}/{len(rag_results)} records, {kept['duplicates']} duplicate, "
+              f"{kept['over_budget']} over budget")
+        return prompt
+
+    def embed_query(self, text: str):
+        """
+        Encode one query, memoized by normalized text in a bounded LRU.
+        The model is uncased, so lower-casing and collapsing whitespace doesn't change
+        the vector — it just lets repeats and near-repeats skip the encoder.
+        """
+        return self.embed_queries([text])[0]
+
+    def embed_queries(self, texts: List[str]) -> List[Any]:
+        """Batch form of embed_query: every LRU miss is encoded in a single encoder call"""
+        keys = [" ".join(text.lower().split()) for text in texts]
+        found: Dict[str, Any] = {}
+        with self._query_embeddings_lock:
+            for key in keys:
+                embedding = self._query_embeddings.get(key)
+                if embedding is not None:
+                    self._query_embeddings.move_to_end(key)
+                    found[key] = embedding
+        missing = list(dict.fromkeys(k for k in keys if k not in found))
+        if missing:
+            with span("embed"):
+                encoded = self.embedding_model.encode(missing)
+            with self._query_embeddings_lock:
+                for key, embedding in zip(missing, encoded):
+                    self._query_embeddings[key] = embedding
+                    found[key] = embedding
+                while len(self._query_embeddings) > QUERY_EMBEDDING_CACHE_SIZE:
+                    self._query_embeddings.popitem(last=False)
+        return [found[key] for key in keys]
+
     # ──────────────────────────────────────────────────────────────────────────
     # SAFETY DATASET MATCHING (kept for is_dangerous check)
     # ──────────────────────────────────────────────────────────────────────────
     def find_best_match(self, query: str, match_type: str = "symptoms") -> Tuple[Optional[Dict], float]:
         """Find best matching entry in safety symptom database"""
-        if self.df_symptoms.empty or self.symptom_embeddings is None:
+        kb = self.kb
+        if kb.df_symptoms.empty or kb.symptom_embeddings is None:
             return None, 0.0
 
-        query_embedding = self.embedding_model.encode(query, convert_to_tensor=True)
-        scores = util.cos_sim(query_embedding, self.symptom_embeddings)[0]
-        best_idx = scores.argmax().item()
-        best_score = scores[best_idx].item()
+        # Rows are unit length, so the dot product is the cosine similarity
+        scores = dot_rows(kb.symptom_embeddings, self.embed_query(query))
+        best_idx = int(scores.argmax())
+        best_score = float(scores[best_idx])
 
-        return self.df_symptoms.iloc[best_idx].to_dict(), best_score
+        return kb.df_symptoms.iloc[best_idx].to_dict(), best_score
 
     def is_match_dangerous(self, match: Optional[Dict]) -> bool:
         """Check if a safety dataset match is flagged as dangerous"""
@@ -493,10 +1039,9 @@ ABSOLUTE RULES — never violate any of these:
     # ──────────────────────────────────────────────────────────────────────────
     # SYMPTOM EXTRACTION (for narrative inputs)
     # ──────────────────────────────────────────────────────────────────────────
-    def extract_symptoms_from_narrative(self, text: str, animal: str = None) -> str:
-        """Convert behavioral/narrative description to medical symptom terms"""
+    def _symptom_extraction_prompt(self, text: str, animal: str = None) -> str:
         animal_note = f" for a {animal}" if animal else ""
-        prompt = f"""You are a veterinary assistant extracting medical symptoms from a pet owner's description{animal_note}.
+        return f"""You are a veterinary assistant extracting medical symptoms from a pet owner's description{animal_note}.
 
 Owner's description: "{text}"
 
@@ -504,11 +1049,31 @@ Convert behavioral observations into clinical veterinary symptom terms.
 Return ONLY the clinical symptom names, comma-separated. No explanations.
 
 Clinical symptoms:"""
+
+    @staticmethod
+    def _clean_symptom_extraction(text: str, result: str) -> str:
+        result = result.strip().replace('"', '').replace("'", '').strip('.,;:')
+        print(f"[SYMPTOM EXTRACTION] '{text[:50]}' → '{result[:50]}'")
+        return result
+
+    def extract_symptoms_from_narrative(self, text: str, animal: str = None) -> str:
+        """Convert behavioral/narrative description to medical symptom terms"""
         try:
-            result = self.ask_llm_direct(prompt).strip()
-            result = result.replace('"', '').replace("'", '').strip('.,;:')
-            print(f"[SYMPTOM EXTRACTION] '{text[:50]}' → '{result[:50]}'")
-            return result
+            result = self.ask_llm_direct(self._symptom_extraction_prompt(text, animal), task="symptoms")
+            return self._clean_symptom_extraction(text, result)
+        except CassetteMiss:
+            raise
+        except Exception as e:
+            print(f"[SYMPTOM EXTRACTION ERROR] {e}")
+            return text
+
+    async def aextract_symptoms_from_narrative(self, text: str, animal: str = None) -> str:
+        """Async version of extract_symptoms_from_narrative"""
+        try:
+            result = await self.aask_llm_direct(self._symptom_extraction_prompt(text, animal), task="symptoms")
+            return self._clean_symptom_extraction(text, result)
+        except CassetteMiss:
+            raise
         except Exception as e:
             print(f"[SYMPTOM EXTRACTION ERROR] {e}")
             return text
@@ -516,9 +1081,8 @@ Clinical symptoms:"""
     # ──────────────────────────────────────────────────────────────────────────
     # COMPLAINT SUMMARIZER
     # ──────────────────────────────────────────────────────────────────────────
-    def summarize_complaint(self, raw_reason: str) -> str:
-        """Converts raw symptom description into a concise medical complaint label"""
-        prompt = (
+    def _summary_prompt(self, raw_reason: str) -> str:
+        return (
             f'You are a veterinary receptionist summarizing a pet owner\'s complaint.\n'
             f'Owner\'s description: "{raw_reason}"\n\n'
             f'Rules:\n'
@@ -528,12 +1092,32 @@ Clinical symptoms:"""
             f'4. Do NOT include pet names, owner names, or filler words.\n'
             f'Label:'
         )
+
+    @staticmethod
+    def _clean_summary(raw_reason: str, result: str) -> str:
+        result = result.strip().strip('"\'.,;:')
+        if not result or len(result.split()) > 10:
+            words = raw_reason.strip().split()
+            result = ' '.join(words[:6]).title() + ('…' if len(words) > 6 else '')
+        return result
+
+    def summarize_complaint(self, raw_reason: str) -> str:
+        """Converts raw symptom description into a concise medical complaint label"""
         try:
-            result = self.ask_llm_direct(prompt).strip().strip('"\'.,;:')
-            if not result or len(result.split()) > 10:
-                words = raw_reason.strip().split()
-                result = ' '.join(words[:6]).title() + ('…' if len(words) > 6 else '')
-            return result
+            return self._clean_summary(raw_reason, self.ask_llm_direct(self._summary_prompt(raw_reason), task="summary"))
+        except CassetteMiss:
+            raise
+        except Exception:
+            return raw_reason[:60]
+
+    async def asummarize_complaint(self, raw_reason: str) -> str:
+        """Async version of summarize_complaint"""
+        try:
+            return self._clean_summary(
+                raw_reason, await self.aask_llm_direct(self._summary_prompt(raw_reason), task="summary")
+            )
+        except CassetteMiss:
+            raise
         except Exception:
             return raw_reason[:60]
 
@@ -551,67 +1135,237 @@ Clinical symptoms:"""
     # ──────────────────────────────────────────────────────────────────────────
     # LLM CALLS
     # ──────────────────────────────────────────────────────────────────────────
-    def _enforce_rate_limit(self):
-        elapsed = time.time() - self.last_llm_call
-        if elapsed < RATE_LIMIT_SECONDS:
-            time.sleep(RATE_LIMIT_SECONDS - elapsed)
-        self.last_llm_call = time.time()
+    def _prompt_tokens(self, task: str, user_prompt: str, system_msg: Optional[str] = None) -> int:
+        """Input tokens of one outgoing call — reported per task and drawn from the rate budget"""
+        tokens = self.prompt_counter.count(user_prompt) + self.prompt_counter.count_cached(system_msg)
+        PROMPT_TOKENS.observe(tokens, task=task)
+        LLM_CALLS.inc(task=task)
+        return tokens
 
     def ask_llm(self, user_prompt: str) -> str:
         """Call LLM with system instruction"""
-        self._enforce_rate_limit()
+        self._rate_limit_sync(self._prompt_tokens("advice", user_prompt, self.system_instruction))
         return self.ask_llm_direct_with_system(user_prompt, self.system_instruction)
 
-    def ask_llm_direct(self, user_prompt: str) -> str:
-        """Direct LLM call without system instruction (for internal tasks)"""
-        self._enforce_rate_limit()
-        return self.ask_llm_direct_with_system(user_prompt, system_msg=None)
+    def ask_llm_direct(self, user_prompt: str, task: Optional[str] = None) -> str:
+        """
+        Direct LLM call without system instruction (for internal tasks).
+        Passing a task name marks the call as deterministic: it runs at temperature 0
+        and its answer is memoized, so repeats skip the round trip and the rate budget.
+        """
+        cached = self._llm_cache_lookup(task, user_prompt)
+        if cached is not None:
+            return cached
+        self._rate_limit_sync(self._prompt_tokens(task or "direct", user_prompt))
+        result = self.ask_llm_direct_with_system(
+            user_prompt, system_msg=None, temperature=0.0 if task else 0.7
+        )
+        self._llm_cache_store(task, user_prompt, result)
+        return result
 
-    def ask_llm_direct_with_system(self, user_prompt: str, system_msg: Optional[str]) -> str:
-        """Core LLM call with optional system message"""
-        url = "https://openrouter.ai/api/v1/chat/completions"
-        headers = {
+    async def aask_llm(self, user_prompt: str) -> str:
+        """Async version of ask_llm"""
+        await self._rate_limit(self._prompt_tokens("advice", user_prompt, self.system_instruction))
+        return await self.aask_llm_direct_with_system(user_prompt, self.system_instruction)
+
+    async def aask_llm_direct(self, user_prompt: str, task: Optional[str] = None) -> str:
+        """Async version of ask_llm_direct — the SQLite tier of the cache is read and written off the event loop"""
+        cacheable = bool(task) and self.llm_cache is not None
+        cached = await asyncio.to_thread(self._llm_cache_lookup, task, user_prompt) if cacheable else None
+        if cached is not None:
+            return cached
+        await self._rate_limit(self._prompt_tokens(task or "direct", user_prompt))
+        result = await self.aask_llm_direct_with_system(
+            user_prompt, system_msg=None, temperature=0.0 if task else 0.7
+        )
+        if cacheable:
+            await asyncio.to_thread(self._llm_cache_store, task, user_prompt, result)
+        return result
+
+    def _llm_cache_key(self, task: Optional[str], user_prompt: str) -> Optional[str]:
+        if not task or self.llm_cache is None:
+            return None
+        return self.llm_cache.make_key(task, LLM_MODEL, user_prompt)
+
+    def _llm_cache_lookup(self, task: Optional[str], user_prompt: str) -> Optional[str]:
+        cache_key = self._llm_cache_key(task, user_prompt)
+        if not cache_key:
+            return None
+        cached = self.llm_cache.get(cache_key)
+        LLM_CACHE.inc(task=task, result="miss" if cached is None else "hit")
+        return cached
+
+    def _llm_cache_store(self, task: Optional[str], user_prompt: str, result: str):
+        cache_key = self._llm_cache_key(task, user_prompt)
+        if cache_key:
+            self.llm_cache.set(cache_key, result)
+
+    async def _rate_limit(self, tokens: int):
+        if self._replaying:
+            return  # nothing goes out, so nothing to pace
+        with span("ratelimit"):
+            await self.rate_limiter.acquire(tokens)
+
+    def _rate_limit_sync(self, tokens: int):
+        if self._replaying:
+            return
+        with span("ratelimit"):
+            self.rate_limiter.acquire_sync(tokens)
+
+    def use_cassette(self, path: str, mode: str = "replay"):
+        """Route every LLM call through a record/replay cassette (record | replay | strict)"""
+        self.cassette = LLMCassette(path, mode, never_record=(LLM_FALLBACK_REPLY,))
+        # A recording must see every call, and a replay must not depend on this host's memo
+        self.llm_cache = None
+        print(f"📼 LLM cassette: {mode} {path} ({len(self.cassette)} recordings)")
+
+    @property
+    def _replaying(self) -> bool:
+        return self.cassette is not None and self.cassette.replaying
+
+    def _cassette_replay(self, payload: Dict[str, Any]) -> str:
+        recorded = self.cassette.replay(payload)  # raises CassetteMiss in strict mode
+        if recorded is None:
+            print("[CASSETTE] No recording for this request — using the fallback reply.")
+            return LLM_FALLBACK_REPLY
+        return recorded
+
+    def _cassette_record(self, payload: Dict[str, Any], result: str):
+        if self.cassette is not None:
+            self.cassette.record(payload, result)
+
+    @staticmethod
+    def _llm_headers() -> Dict[str, str]:
+        return {
             "Authorization": f"Bearer {API_KEY}",
             "Content-Type": "application/json",
         }
+
+    async def astream_llm(self, user_prompt: str) -> AsyncIterator[str]:
+        """Streaming version of aask_llm — yields content deltas as OpenRouter produces them"""
+        await self._rate_limit(self._prompt_tokens("advice_stream", user_prompt, self.system_instruction))
+        payload = self._llm_payload(user_prompt, self.system_instruction)
+        if self._replaying:
+            yield self._cassette_replay(payload)
+            return
+        payload["stream"] = True
+        produced = []
+        try:
+            print(f"[DEBUG] Streaming from OpenRouter API ({LLM_MODEL})...")
+            with span("llm"):
+                async with self._async_client().stream(
+                    "POST", OPENROUTER_URL, headers=self._llm_headers(), content=json.dumps(payload),
+                ) as res:
+                    if res.status_code != 200:
+                        body = (await res.aread()).decode("utf-8", "replace")
+                        print(f"[ERROR] HTTP {res.status_code}: {body}")
+                    else:
+                        async for line in res.aiter_lines():
+                            if not line.startswith("data:"):
+                                continue  # SSE comments / keep-alives
+                            data = line[len("data:"):].strip()
+                            if data == "[DONE]":
+                                break
+                            choices = json.loads(data).get("choices") or [{}]
+                            delta = (choices[0].get("delta") or {}).get("content")
+                            if delta:
+                                produced.append(delta)
+                                yield delta
+        except Exception as e:
+            print(f"[LLM ERROR] {e}")
+        if not produced:
+            yield LLM_FALLBACK_REPLY
+        else:
+            self._cassette_record(payload, "".join(produced))
+
+    @staticmethod
+    def _llm_payload(user_prompt: str, system_msg: Optional[str], temperature: float = 0.7) -> Dict[str, Any]:
         messages = [
             {"role": "system", "content": system_msg or "You are a helpful assistant."},
             {"role": "user", "content": user_prompt},
         ]
-        payload = {
+        return {
             "model": LLM_MODEL,
             "messages": messages,
-            "temperature": 0.7,
+            "temperature": temperature,
         }
+
+    @staticmethod
+    def _parse_llm_response(status_code: int, body: str) -> str:
+        print(f"[DEBUG] Status Code: {status_code}")
+        if status_code == 200:
+            content = json.loads(body)["choices"][0]["message"]["content"]
+            print(f"[DEBUG] Response: {content[:50]}...")
+            return content
+        print(f"[ERROR] HTTP {status_code}: {body}")
+        return LLM_FALLBACK_REPLY
+
+    def ask_llm_direct_with_system(self, user_prompt: str, system_msg: Optional[str],
+                                   temperature: float = 0.7) -> str:
+        """Core LLM call with optional system message"""
+        payload = self._llm_payload(user_prompt, system_msg, temperature)
+        if self._replaying:
+            return self._cassette_replay(payload)
         try:
             print(f"[DEBUG] Calling OpenRouter API ({LLM_MODEL})...")
-            res = requests.post(url, headers=headers, data=json.dumps(payload), timeout=15)
-            print(f"[DEBUG] Status Code: {res.status_code}")
-            if res.status_code == 200:
-                result = res.json()
-                content = result["choices"][0]["message"]["content"]
-                print(f"[DEBUG] Response: {content[:50]}...")
-                return content
-            else:
-                print(f"[ERROR] HTTP {res.status_code}: {res.text}")
-                return (
-                    "I'm currently unable to reach the AI service. "
-                    "Please book a consultation through VetConnect so a vet can assess your pet directly. "
-                    "Only a licensed veterinarian can confirm the exact cause."
+            with span("llm"):
+                res = self._http.post(
+                    OPENROUTER_URL, headers=self._llm_headers(),
+                    data=json.dumps(payload), timeout=LLM_TIMEOUT_SECONDS,
                 )
+            result = self._parse_llm_response(res.status_code, res.text)
+            self._cassette_record(payload, result)
+            return result
         except Exception as e:
             print(f"[LLM ERROR] {e}")
-            return (
-                "I'm currently unable to reach the AI service. "
-                "Please book a consultation through VetConnect so a vet can assess your pet directly. "
-                "Only a licensed veterinarian can confirm the exact cause."
+            return LLM_FALLBACK_REPLY
+
+    def _async_client(self) -> httpx.AsyncClient:
+        """Shared keep-alive client, recreated if the running event loop changes"""
+        loop = asyncio.get_running_loop()
+        if self._ahttp is None or self._ahttp_loop is not loop:
+            self._ahttp = httpx.AsyncClient(
+                timeout=LLM_TIMEOUT_SECONDS,
+                limits=httpx.Limits(
+                    max_connections=LLM_MAX_CONNECTIONS,
+                    max_keepalive_connections=LLM_MAX_CONNECTIONS,
+                ),
             )
+            self._ahttp_loop = loop
+        return self._ahttp
+
+    async def aask_llm_direct_with_system(self, user_prompt: str, system_msg: Optional[str],
+                                          temperature: float = 0.7) -> str:
+        """Async core LLM call — awaits the response without holding a thread"""
+        payload = self._llm_payload(user_prompt, system_msg, temperature)
+        if self._replaying:
+            return self._cassette_replay(payload)
+        try:
+            print(f"[DEBUG] Calling OpenRouter API ({LLM_MODEL})...")
+            with span("llm"):
+                res = await self._async_client().post(
+                    OPENROUTER_URL, headers=self._llm_headers(), content=json.dumps(payload),
+                )
+            result = self._parse_llm_response(res.status_code, res.text)
+            self._cassette_record(payload, result)
+            return result
+        except Exception as e:
+            print(f"[LLM ERROR] {e}")
+            return LLM_FALLBACK_REPLY
+
+    async def aclose(self):
+        """Close the pooled HTTP clients"""
+        if self._ahttp is not None:
+            await self._ahttp.aclose()
+            self._ahttp = None
+        self._http.close()
+        if self.cassette is not None:
+            self.cassette.close()
 
     # ──────────────────────────────────────────────────────────────────────────
     # ENTITY EXTRACTION
     # ──────────────────────────────────────────────────────────────────────────
-    def extract_entity_with_ai(self, user_input: str, entity_type: str, exclude: str = None) -> str:
-        """Extract specific entities from user input with Tagalog support"""
+    def _entity_prompt(self, user_input: str, entity_type: str, exclude: str = None) -> str:
         exclude_note = (
             f'\n5. Do NOT return "{exclude}" — that is the pet\'s name, not the {entity_type}.'
             if exclude else ""
@@ -626,7 +1380,7 @@ Clinical symptoms:"""
                 "pato → Duck | kalabaw → Buffalo | buriko → Donkey | mula → Mule\n"
                 "Always return the English equivalent, never the Tagalog word."
             )
-        prompt = (
+        return (
             f'TASK: Extract the {entity_type} from the user\'s input.\n'
             f'USER INPUT: "{user_input}"\n'
             f'RULES:\n'
@@ -636,8 +1390,18 @@ Clinical symptoms:"""
             f'4. Remove punctuation. Use Title Case.{exclude_note}{tagalog_note}\n'
             f'Output:'
         )
-        raw = self.ask_llm_direct(prompt).strip().replace('"', '').replace("'", "")
-        return raw.title()
+
+    def extract_entity_with_ai(self, user_input: str, entity_type: str, exclude: str = None) -> str:
+        """Extract specific entities from user input with Tagalog support"""
+        raw = self.ask_llm_direct(self._entity_prompt(user_input, entity_type, exclude), task=f"entity:{entity_type}")
+        return raw.strip().replace('"', '').replace("'", "").title()
+
+    async def aextract_entity_with_ai(self, user_input: str, entity_type: str, exclude: str = None) -> str:
+        """Async version of extract_entity_with_ai"""
+        raw = await self.aask_llm_direct(
+            self._entity_prompt(user_input, entity_type, exclude), task=f"entity:{entity_type}"
+        )
+        return raw.strip().replace('"', '').replace("'", "").title()
 
     # ──────────────────────────────────────────────────────────────────────────
     # DATETIME VALIDATION
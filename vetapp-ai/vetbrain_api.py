@@ -14,19 +14,50 @@ Booking stages:
   → ask_consultation_reason  (Consultation only)
   → ask_datetime → confirm → done
 
+Endpoints:
+  POST /chat         — one JSON reply per message
+  POST /chat/stream  — same logic as /chat, advice tokens streamed as server-sent events
+  POST /triage/batch — severity tier + top diseases for many messages in one call (intake inbox)
+  POST /admin/reload — re-read the knowledge-base CSVs now (X-Admin-Token: $ADMIN_TOKEN, ?force=true
+                       rebuilds even if the files look unchanged)
+
+Knowledge base hot reload:
+  Each worker also polls the CSVs every VETBRAIN_KB_WATCH_SECONDS (default 30, 0 = off) and
+  reloads on change. Only added or edited rows are re-embedded; the new snapshot is swapped in
+  whole, so in-flight requests finish on the version they started with.
+
+Probes:
+  GET /health/live   — 200 as soon as the process serves HTTP
+  GET /health/ready  — 200 once the model is loaded and warmed up, 503 before
+  GET /metrics       — Prometheus text format (stage latencies, LLM calls, cache, booking stages)
+  /chat responses carry a Server-Timing header with the turn's per-stage timings
+
 RUN:
     uvicorn vetbrain_api:app --reload --port 8001
+    SESSION_BACKEND=sqlite uvicorn vetbrain_api:app --workers 4 --port 8001   # shared sessions
 """
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Header, Response
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import Optional
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from typing import List, Optional, Tuple
+from contextvars import ContextVar
+import asyncio
+import json
+import os
+import secrets
 import uuid
 import time
 import re
 
-from vetbrain import VetBrain, RATE_LIMIT_SECONDS
+from vetbrain import KB_WATCH_SECONDS, VetBrain, RATE_LIMIT_SECONDS
+from vetbrain_intents import IntentMatcher
+import vetbrain_metrics
+from vetbrain_metrics import BOOKING_TRANSITIONS, server_timing, span, start_turn
+from vetbrain_ratelimit import current_session
+from vetbrain_sessions import Session, SessionConflict, create_session_store
 
 # ── App & CORS ───────────────────────────────────────────────────────────────
 app = FastAPI(title="VetConnect AI Backend", version="5.0.0")
@@ -41,12 +72,51 @@ app.add_middleware(
 
 brain = VetBrain()
 
+# Idle sessions expire after SESSION_TTL_SECONDS; past SESSION_MAX the least recently used go first.
+# SESSION_BACKEND=sqlite|redis shares conversations across workers (see vetbrain_sessions.py).
+SESSION_TTL_SECONDS   = float(os.getenv("SESSION_TTL_SECONDS", str(2 * 3600)))
+SESSION_MAX           = int(os.getenv("SESSION_MAX", "10000"))
+SESSION_SWEEP_SECONDS = 60
+SESSION_SAVE_ATTEMPTS = 3  # claim / state saves retried after a concurrent update on the same session
+TRIAGE_BATCH_MAX      = int(os.getenv("TRIAGE_BATCH_MAX", "100"))
+ADMIN_TOKEN           = os.getenv("ADMIN_TOKEN", "")  # unset → /admin endpoints always answer 403
+
+sessions = create_session_store(ttl_seconds=SESSION_TTL_SECONDS, max_sessions=SESSION_MAX)
+_background_tasks: list = []
+
+async def _warm_up():
+    """Load corpora + model off the event loop; the server accepts connections meanwhile"""
+    try:
+        await asyncio.to_thread(brain.load_data)
+        print("✅ VetBrain RAG loaded and ready.")
+    except Exception as e:
+        brain.status = f"Failed: {e}"
+        print(f"[STARTUP ERROR] VetBrain failed to load: {e}")
+
+async def _watch_knowledge_base(interval: float):
+    """Reload the knowledge base when its CSVs change on disk (each worker watches for itself)"""
+    while True:
+        await asyncio.sleep(interval)
+        if not brain.ready:
+            continue
+        try:
+            await asyncio.to_thread(brain.reload_data)
+        except Exception as e:
+            print(f"[KB WATCH ERROR] {e}")
+
 @app.on_event("startup")
 async def startup_event():
-    brain.load_data()
-    print("✅ VetBrain RAG loaded and ready.")
-
-sessions: dict = {}
+    _background_tasks.append(asyncio.create_task(_warm_up()))
+    _background_tasks.append(asyncio.create_task(sessions.run_sweeper(SESSION_SWEEP_SECONDS)))
+    if KB_WATCH_SECONDS > 0:
+        _background_tasks.append(asyncio.create_task(_watch_knowledge_base(KB_WATCH_SECONDS)))
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    for task in _background_tasks:
+        task.cancel()
+    await sessions.close()
+    await brain.aclose()
 
 class ChatRequest(BaseModel):
     message:    str
@@ -59,17 +129,47 @@ class ChatResponse(BaseModel):
 
 @app.get("/health")
 def health():
-    return {"status": "ok", "vetbrain": brain.status}
+    return {"status": "ok", "ready": brain.ready, "vetbrain": brain.status,
+            "knowledge_base_version": brain.kb.version,
+            "severity_classifier": brain.severity_stats()}
+
+@app.get("/health/live")
+def health_live():
+    return {"status": "ok"}
+
+@app.get("/health/ready")
+def health_ready():
+    if not brain.ready:
+        return JSONResponse(status_code=503, content={"status": "starting", "vetbrain": brain.status})
+    return {"status": "ready", "vetbrain": brain.status}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return PlainTextResponse(vetbrain_metrics.render(), media_type="text/plain; version=0.0.4")
+
+NOT_READY_REPLY = "⏳ VetConnect AI is still starting up. Please try again in a few seconds."
+
+@app.post("/admin/reload")
+async def admin_reload(force: bool = False, x_admin_token: Optional[str] = Header(None)):
+    """Reload the knowledge base in this worker; other workers pick the change up from their file watch"""
+    if not ADMIN_TOKEN or not secrets.compare_digest(x_admin_token or "", ADMIN_TOKEN):
+        return JSONResponse(status_code=403, content={"error": "invalid admin token"})
+    if not brain.ready:
+        return JSONResponse(status_code=503, content={"error": NOT_READY_REPLY})
+    result = await asyncio.to_thread(brain.reload_data, force)
+    if result.get("error"):
+        return JSONResponse(status_code=500, content=result)
+    return result
 
 class ResetRequest(BaseModel):
     session_id: Optional[str] = None
 
 @app.post("/session/reset")
-def reset_session(req: ResetRequest):
+async def reset_session(req: ResetRequest):
     new_sid = str(uuid.uuid4())
-    sessions[new_sid] = {"stage": "idle", "data": {}, "last_message": 0.0, "correction_log": []}
-    if req.session_id and req.session_id in sessions:
-        del sessions[req.session_id]
+    if req.session_id:
+        await sessions.delete(req.session_id)
+    # The new session is created on its first message, so resets can't pile up empty entries
     return {"session_id": new_sid}
 
 # ── Helpers ───────────────────────────────────────────────────────────────────
@@ -103,20 +203,78 @@ def _resume_prompt(stage: str, data: dict) -> str:
     return prompts.get(stage, "how can I help you?")
 
 
-def _log_correction(session: dict, field: str, old_val, new_val):
-    session.setdefault("correction_log", []).append({
+def _log_correction(session: Session, field: str, old_val, new_val):
+    session.correction_log.append({
         "field": field, "old_value": old_val, "new_value": new_val, "timestamp": time.time(),
     })
 
 
-def _get_rag_reply(query: str, known_animal: str = None, is_urgent: bool = False) -> str:
+class TurnPlan:
+    """
+    Per-turn execution plan for LLM-backed lookups.
+    Each lookup starts at most once as a task, so independent calls can be issued
+    concurrently up front and joined where they are needed — and a lookup repeated
+    later in the same turn (e.g. check_safety on the same text) is never re-sent.
+    """
+
+    def __init__(self, raw: str):
+        self.raw = raw
+        self.intents = INTENTS.scan(raw)   # every routing keyword category, matched once
+        self._tasks: dict = {}
+
+    def _start(self, key: tuple, factory) -> asyncio.Task:
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._tasks[key] = task
+        return task
+
+    def safety(self, text: str = None) -> asyncio.Task:
+        text = text or self.raw
+        return self._start(("safety", text), lambda: brain.acheck_safety(text))
+
+    def summary(self, text: str = None) -> asyncio.Task:
+        text = text or self.raw
+        return self._start(("summary", text), lambda: brain.asummarize_complaint(text))
+
+    def rag(self, text: str = None, animal: str = None) -> asyncio.Task:
+        text = text or self.raw
+        return self._start(("rag", text, animal), lambda: brain.aretrieve_rag_context(text, animal=animal))
+
+    def safety_match(self) -> asyncio.Task:
+        """Best safety-dataset match for the raw message, computed lazily on first use"""
+        return self._start(("safety_match",), lambda: asyncio.to_thread(brain.find_best_match, self.raw))
+
+    def cancel_pending(self):
+        """Drop speculative work the turn ended up not needing"""
+        for task in self._tasks.values():
+            if not task.done():
+                task.cancel()
+            elif not task.cancelled():
+                task.exception()  # mark retrieved so unused failures aren't logged as lost
+
+
+async def _get_rag_reply(query: str, known_animal: str = None, is_urgent: bool = False,
+                         turn: TurnPlan = None) -> str:
     """
     Core RAG function: retrieve relevant disease records, build prompt, call GPT.
     Replaces the old _build_symptom_prompt() + single-match approach.
     """
-    rag_results = brain.retrieve_rag_context(query)
+    if turn is not None:
+        rag_results = await turn.rag(query, known_animal)
+    else:
+        rag_results = await brain.aretrieve_rag_context(query, animal=known_animal)
     prompt = brain.build_rag_prompt(query, rag_results, known_animal=known_animal, is_urgent=is_urgent)
-    return brain.ask_llm(prompt)
+
+    sink = token_sink.get()
+    if sink is None:
+        return await brain.aask_llm(prompt)
+    # /chat/stream — forward tokens as they arrive and still return the full advice
+    parts = []
+    async for token in brain.astream_llm(prompt):
+        parts.append(token)
+        await sink.put(token)
+    return "".join(parts)
 
 
 # ── Correction Intent ─────────────────────────────────────────────────────────
@@ -135,16 +293,69 @@ SERVICE_MAP = {
     "groom":   "Grooming",     "ligo":    "Grooming",
 }
 
+# ── Routing vocabulary ────────────────────────────────────────────────────────
+BOOKING_KEYWORDS = ["book", "appointment", "schedule", "magpa-check", "gusto",
+                    "punta", "yes", "oo", "sige", "sure", "i want to", "gusto ko"]
+HOURS_KEYWORDS    = ["hour", "open", "close", "oras", "bukas", "schedule"]
+SERVICES_KEYWORDS = ["service", "offer", "serbisyo", "magkano", "price", "cost"]
+RESCHEDULE_KEYWORDS = ["cancel", "reschedule", "move", "change appointment"]
+SYMPTOM_INTENT_KEYWORDS = [
+    "check symptom", "symptoms", "my pet is", "my dog is", "my cat is",
+    "not eating", "sick", "ayaw kumain", "matamlay", "may sakit", "nagsusuka",
+    "vomit", "diarrhea", "limp", "lethargy", "wound", "rash", "coughing",
+    "sneezing", "scratch", "laging tulog", "hindi kumakain",
+]
 
-def _handle_correction(session: dict, raw: str) -> Optional[str]:
+# Mid-booking
+EXIT_PHRASES = ["cancel", "stop", "exit", "quit", "nevermind", "never mind", "start over", "ulit", "basta"]
+FAQ_HOURS_KEYWORDS = ["clinic hour", "anong oras", "open", "bukas", "close", "sarado"]
+FAQ_PRICE_KEYWORDS = ["how much", "magkano", "price", "cost", "presyo"]
+MID_SYMPTOM_KEYWORDS = [
+    "scratching", "vomit", "diarrhea", "not eating", "ayaw kumain", "sick",
+    "matamlay", "may sakit", "nagsusuka", "lethargic", "lethargy", "coughing",
+    "sneezing", "wound", "rash", "hindi kumakain", "laging tulog", "itchy",
+    "swollen", "limping", "hiccup", "shaking", "trembling", "nagtatae",
+    "btw", "by the way", "sa totoo lang", "actually my", "also my",
+    "my dog has", "my cat has", "my pet has",
+]
+BOOKING_ANSWER_KEYWORDS = ["confirm", "cancel"]
+SERVICE_ANSWER_KEYWORDS = ["consult", "vacc", "spay", "deworm", "groom", "bakuna", "kapon", "purga", "ligo"]
+REASON_TRIGGERS = ["reason", "symptom", "experiencing", "problem", "issue", "complaint", "concern", "rason", "dahilan"]
+
+# Category → keywords (or keyword → value), compiled once into a single matcher
+ROUTING_KEYWORDS = {
+    "correction":     CORRECTION_TRIGGERS,
+    "service":        SERVICE_MAP,
+    "animal":         {a.lower(): a for a in brain.supported_animals + brain.wildlife_animals},
+    "wildlife":       brain.wildlife_animals,
+    "tagalog_animal": brain.tagalog_animal_map,
+    "booking":        BOOKING_KEYWORDS,
+    "hours":          HOURS_KEYWORDS,
+    "services_info":  SERVICES_KEYWORDS,
+    "reschedule":     RESCHEDULE_KEYWORDS,
+    "symptom":        SYMPTOM_INTENT_KEYWORDS,
+    "exit":           EXIT_PHRASES,
+    "faq_hours":      FAQ_HOURS_KEYWORDS,
+    "faq_price":      FAQ_PRICE_KEYWORDS,
+    "symptom_aside":  MID_SYMPTOM_KEYWORDS,
+    "booking_answer": BOOKING_ANSWER_KEYWORDS,
+    "service_answer": SERVICE_ANSWER_KEYWORDS,
+    "reason":         REASON_TRIGGERS,
+}
+WORD_BOUNDED_INTENTS = ("exit",)
+INTENTS = IntentMatcher(ROUTING_KEYWORDS, word_bounded=WORD_BOUNDED_INTENTS)
+
+
+async def _handle_correction(session: Session, raw: str, turn: TurnPlan) -> Optional[str]:
     lower = raw.lower()
-    data  = session["data"]
-    stage = session["stage"]
+    intents = turn.intents
+    data  = session.data
+    stage = session.stage
 
     if not data:
         return None
 
-    is_correction = any(t in lower for t in CORRECTION_TRIGGERS)
+    is_correction = "correction" in intents
     has_date = bool(re.search(r"\d{1,2}/\d{1,2}/\d{4}", raw))
     has_time = bool(re.search(r"\d{1,2}:\d{2}\s*(AM|PM)", raw, re.IGNORECASE))
 
@@ -157,7 +368,7 @@ def _handle_correction(session: dict, raw: str) -> Optional[str]:
             data["datetime"] = raw
             _log_correction(session, "datetime", old_val, raw)
             if stage in ("ask_datetime", "confirm"):
-                session["stage"] = "confirm"
+                session.stage = "confirm"
             return (
                 f"Got it — schedule updated to {raw}. ✅\n\n"
                 "Here's your updated booking:\n"
@@ -184,14 +395,14 @@ def _handle_correction(session: dict, raw: str) -> Optional[str]:
         )
         if needs_reason:
             pname = data.get("pet_name", "your pet")
-            session["stage"] = "ask_consultation_reason"
+            session.stage = "ask_consultation_reason"
             return f"What is {pname} experiencing? Please describe the symptoms or reason for the visit."
         if needs_dt:
-            session["stage"] = "ask_datetime"
+            session.stage = "ask_datetime"
             return ("When would you like to schedule the appointment?\n"
                     "Format: MM/DD/YYYY HH:MM AM/PM (e.g. 03/20/2026 10:00 AM)\n\n"
                     "Our clinic is open Mon\u2013Sat, 7:00 AM \u2013 8:00 PM.")
-        session["stage"] = "confirm"
+        session.stage = "confirm"
         return (
             "Here's your updated booking:\n\n"
             f"\u2022 Service:   {data.get('service', '\u2014')}\n"
@@ -203,7 +414,7 @@ def _handle_correction(session: dict, raw: str) -> Optional[str]:
         )
 
     # 2. Service correction
-    new_service = next((svc for kw, svc in SERVICE_MAP.items() if kw in lower), None)
+    new_service = intents.first("service")
     if new_service and new_service != data.get("service"):
         old_val = data.get("service", "not set")
         data["service"] = new_service
@@ -216,7 +427,7 @@ def _handle_correction(session: dict, raw: str) -> Optional[str]:
             f"\u2022 Reason:    {data.get('consultation_reason', '\u2014')}\n"
             if svc == "Consultation" and data.get("consultation_reason") else ""
         )
-        session["stage"] = "confirm"
+        session.stage = "confirm"
         return (
             f"No worries! Service updated to {new_service}. ✅\n\n"
             "Here's your updated booking:\n\n"
@@ -229,20 +440,17 @@ def _handle_correction(session: dict, raw: str) -> Optional[str]:
         )
 
     # 3. Animal correction
-    new_animal = next(
-        (a for a in brain.supported_animals + brain.wildlife_animals if a.lower() in lower), None
-    )
+    new_animal = intents.first("animal")
     if new_animal and new_animal != data.get("animal"):
         if new_animal in brain.wildlife_animals:
-            session["stage"] = "idle"
-            session["data"]  = {}
+            session.reset()
             return f"🦁 Sorry, we don't handle {new_animal}s. We only treat domestic and farm animals. Please contact a wildlife rescue centre."
         old_val = data.get("animal", "not set")
         data["animal"] = new_animal
         data.pop("breed", None)
         _log_correction(session, "animal", old_val, new_animal)
         if not data.get("breed"):
-            session["stage"] = "ask_breed"
+            session.stage = "ask_breed"
             return f"Updated — your pet is a {new_animal}! ✅\n\nWhat breed is your {new_animal.lower()}? (Type 'unknown' if not sure)"
         return f"Updated — your pet is a {new_animal}! ✅\n\n" + _next_after_correction()
 
@@ -252,7 +460,7 @@ def _handle_correction(session: dict, raw: str) -> Optional[str]:
         whitelist = brain.BREED_WHITELIST.get(animal_for_breed, [])
         direct_breed = next((w for w in whitelist if w in lower or lower.strip() in w), None)
         candidate = direct_breed.title() if direct_breed else _clean_extracted(
-            brain.extract_entity_with_ai(raw, "breed", exclude=data.get("pet_name"))
+            await brain.aextract_entity_with_ai(raw, "breed", exclude=data.get("pet_name"))
         )
         if (candidate and candidate.lower() not in ("none", "null", "")
                 and candidate.lower() != data.get("breed", "").lower()
@@ -263,32 +471,32 @@ def _handle_correction(session: dict, raw: str) -> Optional[str]:
             existing_name = data.get("pet_name")
             if existing_name:
                 return f"Breed updated to {candidate}! ✅\n\n" + _next_after_correction()
-            session["stage"] = "ask_pet_name"
+            session.stage = "ask_pet_name"
             return f"Breed updated to {candidate}! ✅\n\nWhat's your pet's name?"
 
     # 5. Consultation reason correction
     if data.get("service") == "Consultation" and data.get("consultation_reason"):
-        reason_triggers = ["reason", "symptom", "experiencing", "problem", "issue", "complaint", "concern", "rason", "dahilan"]
-        if any(t in lower for t in reason_triggers):
+        if "reason" in intents:
             old_val = data.get("consultation_reason", "not set")
             new_reason = raw
             for trigger in CORRECTION_TRIGGERS:
                 new_reason = re.sub(re.escape(trigger), "", new_reason, flags=re.IGNORECASE)
             new_reason = new_reason.strip().strip(".,;")
             if new_reason:
-                complaint_label = brain.summarize_complaint(new_reason)
+                # Summary, safety and retrieval are independent — issue them together
+                known_animal = data.get("animal")
+                complaint_label, (safety_tier_c, safety_msg_c), _ = await asyncio.gather(
+                    turn.summary(new_reason), turn.safety(new_reason), turn.rag(new_reason, known_animal)
+                )
                 data["consultation_reason"] = complaint_label
                 data["consultation_reason_raw"] = new_reason
                 _log_correction(session, "consultation_reason", old_val, complaint_label)
-                safety_tier_c, safety_msg_c = brain.check_safety(new_reason)
                 if safety_tier_c == "acute":
-                    session["stage"] = "idle"
-                    session["data"]  = {}
+                    session.reset()
                     return safety_msg_c
                 # RAG-based advice for corrected reason
-                known_animal = data.get("animal")
                 is_urgent = (safety_tier_c == "urgent")
-                advice = _get_rag_reply(new_reason, known_animal=known_animal, is_urgent=is_urgent)
+                advice = await _get_rag_reply(new_reason, known_animal=known_animal, is_urgent=is_urgent, turn=turn)
                 return (f"Reason updated! ✅\n\n🩺 {advice}\n\n"
                         "━━━━━━━━━━━━━━━━━━━━\n" + _next_after_correction())
 
@@ -313,11 +521,120 @@ def _handle_correction(session: dict, raw: str) -> Optional[str]:
     )
 
 
+# ── Batch triage ──────────────────────────────────────────────────────────────
+class TriageItem(BaseModel):
+    message: str
+    animal:  Optional[str] = None   # detected from the message when omitted
+
+class TriageBatchRequest(BaseModel):
+    items: List[TriageItem] = Field(..., min_length=1, max_length=TRIAGE_BATCH_MAX)
+    top_k: int = Field(3, ge=1, le=10)
+
+class TriageResult(BaseModel):
+    index:    int
+    message:  str
+    animal:   Optional[str] = None
+    tier:     str                    # acute | urgent | ok | invalid
+    alert:    Optional[str] = None
+    diseases: List[dict] = []
+
+class TriageBatchResponse(BaseModel):
+    results: List[TriageResult]
+
+
+@app.post("/triage/batch", response_model=TriageBatchResponse)
+async def triage_batch(req: TriageBatchRequest):
+    """
+    Screen many owner messages in one pass (no session, no per-message throttle).
+    Queries are embedded in one encoder call; every LLM call in the batch queues
+    under one scheduler session, so a big batch can't starve live chats.
+    """
+    if not brain.ready:
+        return JSONResponse(status_code=503, content={"detail": NOT_READY_REPLY})
+    current_session.set(f"triage:{uuid.uuid4()}")
+    texts = [brain.sanitize_input(item.message) for item in req.items]
+    valid = [i for i, text in enumerate(texts) if text]
+    animals = [req.items[i].animal or brain.detect_species(texts[i]) for i in valid]
+
+    safety, rag = await asyncio.gather(
+        asyncio.gather(*(brain.acheck_safety(texts[i]) for i in valid)),
+        brain.aretrieve_rag_context_batch([texts[i] for i in valid], animals, top_k=req.top_k),
+    )
+
+    results = [TriageResult(index=i, message=text, tier="invalid") for i, text in enumerate(texts)]
+    for i, animal, (tier, alert), records in zip(valid, animals, safety, rag):
+        results[i] = TriageResult(
+            index=i,
+            message=texts[i],
+            animal=animal,
+            tier=tier,
+            alert=alert or None,
+            diseases=[{"disease": r["disease"], "score": r["score"]} for r in records],
+        )
+    print(f"[TRIAGE] Batch of {len(texts)}: " + ", ".join(
+        f"{tier}={sum(r.tier == tier for r in results)}" for tier in ("acute", "urgent", "ok", "invalid")
+    ))
+    return TriageBatchResponse(results=results)
+
+
 # ── Main chat endpoint ────────────────────────────────────────────────────────
+# Set by /chat/stream: advice tokens are pushed here while the turn is running
+token_sink: ContextVar[Optional[asyncio.Queue]] = ContextVar("token_sink", default=None)
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.post("/chat/stream")
+async def chat_stream(req: ChatRequest):
+    """
+    Runs the same turn as /chat but streams it as server-sent events:
+      event: token  — {"text": ...} advice deltas as the LLM generates them
+      event: done   — the full ChatResponse (reply, session_id, booking_data)
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def run_turn() -> ChatResponse:
+        token_sink.set(queue)
+        try:
+            reply, _ = await _chat_turn(req)
+            return reply
+        finally:
+            await queue.put(None)
+
+    turn_task = asyncio.create_task(run_turn())
+
+    async def events():
+        while (token := await queue.get()) is not None:
+            yield _sse("token", {"text": token})
+        yield _sse("done", jsonable_encoder(await turn_task))
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.post("/chat", response_model=ChatResponse)
-def chat(req: ChatRequest):
+async def chat(req: ChatRequest, response: Response):
+    reply, spans = await _chat_turn(req)
+    response.headers["Server-Timing"] = server_timing(spans)
+    return reply
+
+
+async def _chat_turn(req: ChatRequest) -> Tuple[ChatResponse, dict]:
+    """One /chat turn plus its per-stage timings; never raises"""
+    spans = start_turn()
+    with span("turn"):
+        reply = await _chat_or_fallback(req)
+    return reply, spans
+
+
+async def _chat_or_fallback(req: ChatRequest) -> ChatResponse:
     try:
-        return _chat_handler(req)
+        return await _chat_handler(req)
     except Exception as e:
         print(f"[CHAT ERROR] Unhandled exception: {e}")
         sid = req.session_id or "unknown"
@@ -332,174 +649,212 @@ def chat(req: ChatRequest):
         )
 
 
-def _chat_handler(req: ChatRequest):
+async def _chat_handler(req: ChatRequest):
     sid = req.session_id or str(uuid.uuid4())
-    if sid not in sessions:
-        sessions[sid] = {"stage": "idle", "data": {}, "last_message": 0.0, "correction_log": []}
-    session = sessions[sid]
-
-    # Rate limiting
-    now = time.time()
-    elapsed = now - session.get("last_message", 0.0)
-    if elapsed < RATE_LIMIT_SECONDS:
-        remaining = round(RATE_LIMIT_SECONDS - elapsed, 1)
-        return ChatResponse(reply=f"⏳ Please wait {remaining}s before sending another message.", session_id=sid)
-    session["last_message"] = now
+    if not brain.ready:
+        return ChatResponse(reply=NOT_READY_REPLY, session_id=sid)
+    current_session.set(sid)  # LLM calls in this turn queue fairly under this session
 
     # Input sanitization
-    raw = brain.sanitize_input(req.message)
-    if not raw:
-        return ChatResponse(reply="Please type a message.", session_id=sid)
+    with span("sanitize"):
+        raw = brain.sanitize_input(req.message)
+
+    session = None
+    for attempt in range(SESSION_SAVE_ATTEMPTS):
+        loaded = await sessions.get_or_create(sid)
+
+        # Rate limiting
+        now = time.time()
+        elapsed = now - loaded.last_message
+        if elapsed < RATE_LIMIT_SECONDS:
+            remaining = round(RATE_LIMIT_SECONDS - elapsed, 1)
+            return ChatResponse(reply=f"⏳ Please wait {remaining}s before sending another message.", session_id=sid)
+        if not raw:
+            return ChatResponse(reply="Please type a message.", session_id=sid)
+
+        # Claim the turn first so a parallel message on another worker sees the throttle
+        loaded.last_message = now
+        try:
+            await sessions.save(loaded)
+            session = loaded
+            break
+        except SessionConflict:
+            print(f"[SESSIONS] Concurrent update on session {sid} — retrying claim (attempt {attempt + 1}).")
+
+    if session is None:
+        return ChatResponse(
+            reply="⏳ Your previous message is still being processed. Please try again in a moment.",
+            session_id=sid,
+        )
+
+    # The turn runs exactly once from here; only its state changes are retried
+    before = session.snapshot()
+    turn = TurnPlan(raw)
+    try:
+        response = await _route_turn(session, sid, raw, turn)
+    finally:
+        turn.cancel_pending()
+    if session.stage != before["stage"]:
+        BOOKING_TRANSITIONS.inc(from_stage=before["stage"], to_stage=session.stage)
+    await _save_turn(session, before)
+    return response
+
+
+async def _save_turn(session: Session, before: dict):
+    """Persist what the turn changed; on a conflict, replay just those changes onto the newer copy"""
+    sid = session.session_id
+    after = session.snapshot()
+    for attempt in range(SESSION_SAVE_ATTEMPTS):
+        try:
+            await sessions.save(session)
+            return
+        except SessionConflict:
+            print(f"[SESSIONS] Concurrent update on session {sid} — reapplying this turn's changes (attempt {attempt + 1}).")
+            session = await sessions.get_or_create(sid)
+            session.apply_changes(before, after)
+    print(f"[SESSIONS] ⚠️  Session {sid} kept changing — this turn's state changes were not saved.")
+
+
+async def _route_turn(session: Session, sid: str, raw: str, turn: TurnPlan):
     lower = raw.lower()
+    intents = turn.intents
+
+    # The consultation-reason turn needs a summary and RAG retrieval that don't depend
+    # on the safety verdict — start them now so they overlap with the safety check.
+    # Not when a keyword already says the turn ends earlier (acute, correction, exit):
+    # those LLM calls would be thrown away and still count against the rate limit.
+    if (session.stage == "ask_consultation_reason" and len(raw.strip()) >= 3
+            and "correction" not in intents and "exit" not in intents
+            and not brain.has_acute_keyword(raw)):
+        turn.summary()
+        turn.rag(raw, session.data.get("animal"))
 
     # Safety layer — runs FIRST
-    safety_tier, safety_msg = brain.check_safety(raw)
+    safety_tier, safety_msg = await turn.safety()
     if safety_tier == "acute":
-        session["stage"] = "idle"
-        session["data"]  = {}
+        session.reset()
         return ChatResponse(reply=safety_msg, session_id=sid)
 
     # Correction intent — runs SECOND
-    if session["stage"] not in ("idle", "done") and session.get("data"):
-        correction_reply = _handle_correction(session, raw)
+    if session.stage not in ("idle", "done") and session.data:
+        correction_reply = await _handle_correction(session, raw, turn)
         if correction_reply:
             return ChatResponse(reply=correction_reply, session_id=sid)
 
     # Mid-booking flow
-    if session["stage"] not in ("idle", "done"):
-        result = _handle_booking_flow(session, raw)
+    if session.stage not in ("idle", "done"):
+        result = await _handle_booking_flow(session, raw, turn)
         if isinstance(result, tuple):
             reply, booking_data = result
             return ChatResponse(reply=reply, session_id=sid, booking_data=booking_data)
         return ChatResponse(reply=result, session_id=sid)
 
     # ── Idle intent routing ───────────────────────────────────────────────────
-    booking_keywords = ["book", "appointment", "schedule", "magpa-check", "gusto",
-                        "punta", "yes", "oo", "sige", "sure", "i want to", "gusto ko"]
-    if any(kw in lower for kw in booking_keywords):
-        session["stage"] = "ask_service"
-        session["data"]  = {}
-        session["correction_log"] = []
+    if "booking" in intents:
+        session.reset("ask_service")
         return ChatResponse(
             reply="I'd be happy to help you book an appointment! 🐾\n\nWhat service do you need?\n\n• Consultation\n• Vaccination\n• Spay & Neuter\n• Deworming\n• Grooming",
             session_id=sid,
         )
 
-    if any(kw in lower for kw in ["hour", "open", "close", "oras", "bukas", "schedule"]):
+    if "hours" in intents:
         return ChatResponse(reply="🕐 Clinic Hours:\nMonday – Saturday: 7:00 AM – 8:00 PM\nSunday: Closed\n\nAppointments outside these hours cannot be booked.", session_id=sid)
 
-    if any(kw in lower for kw in ["service", "offer", "serbisyo", "magkano", "price", "cost"]):
+    if "services_info" in intents:
         return ChatResponse(
             reply="🏥 We offer the following services:\n\n• Consultation — bring medical records\n• Vaccination — anti-rabies, 5-in-1, Parvo\n• Spay & Neuter — fasting required (8–12 hrs)\n• Deworming — every 2 weeks for puppies\n• Grooming — inform us if your pet is aggressive\n\nWould you like to book an appointment?",
             session_id=sid,
         )
 
-    if any(kw in lower for kw in ["cancel", "reschedule", "move", "change appointment"]):
+    if "reschedule" in intents:
         return ChatResponse(reply="To cancel or reschedule, please go to the My Appointments tab in the sidebar and select the appointment you'd like to modify.", session_id=sid)
 
     # Symptom screening — now uses RAG
-    symptom_intent_kw = [
-        "check symptom", "symptoms", "my pet is", "my dog is", "my cat is",
-        "not eating", "sick", "ayaw kumain", "matamlay", "may sakit", "nagsusuka",
-        "vomit", "diarrhea", "limp", "lethargy", "wound", "rash", "coughing",
-        "sneezing", "scratch", "laging tulog", "hindi kumakain",
-    ]
-    if any(kw in lower for kw in symptom_intent_kw):
+    if "symptom" in intents:
         if lower.strip() in ("check symptom", "check symptoms", "symptoms", "symptom"):
             return ChatResponse(
                 reply="Sure! Please describe your pet's symptoms and I'll help assess them.\n\nFor example: 'My dog has been vomiting for 2 days' or 'My cat is not eating and seems lethargic.'",
                 session_id=sid
             )
-        mentioned_animal = next((a for a in brain.supported_animals if a.lower() in lower), None)
+        mentioned_animal = brain.detect_species(raw)
 
-        # Use safety dataset to check if dangerous
-        match, score = brain.find_best_match(raw, "symptoms")
         # is_urgent based on GPT safety tier only (not csv_dangerous)
         # Reason: 96% of clean-data.csv rows are flagged dangerous — unreliable for urgency
         is_urgent = (safety_tier == "urgent")
 
         # RAG-based response
-        reply = _get_rag_reply(raw, known_animal=mentioned_animal, is_urgent=is_urgent)
+        reply = await _get_rag_reply(raw, known_animal=mentioned_animal, is_urgent=is_urgent, turn=turn)
         reply += "\n\nWould you like to book a consultation? Just say 'yes' or 'book an appointment' and I'll get you started. 🐾"
         return ChatResponse(reply=reply, session_id=sid)
 
     # Wildlife check
-    for animal in brain.wildlife_animals:
-        if animal.lower() in lower:
-            return ChatResponse(reply=f"🦁 We're a domestic and farm animal clinic — we don't handle {animal}s. Please contact a wildlife rescue centre or zoo veterinarian.", session_id=sid)
+    animal = intents.first("wildlife")
+    if animal:
+        return ChatResponse(reply=f"🦁 We're a domestic and farm animal clinic — we don't handle {animal}s. Please contact a wildlife rescue centre or zoo veterinarian.", session_id=sid)
 
     # Generic fallback
-    return ChatResponse(reply=brain.ask_llm(raw), session_id=sid)
+    return ChatResponse(reply=await brain.aask_llm(raw), session_id=sid)
 
 
 # ── Booking Flow Handler ──────────────────────────────────────────────────────
-def _handle_booking_flow(session: dict, raw: str):
-    stage = session["stage"]
-    data  = session["data"]
+async def _handle_booking_flow(session: Session, raw: str, turn: TurnPlan):
+    stage = session.stage
+    data  = session.data
     lower = raw.lower()
+    intents = turn.intents
 
     # Escape hatch
-    exit_phrases = ["cancel", "stop", "exit", "quit", "nevermind", "never mind", "start over", "ulit", "basta"]
-    if any(re.search(r'\b' + re.escape(p) + r'\b', lower) for p in exit_phrases) and stage != "confirm":
-        session["stage"] = "idle"
-        session["data"]  = {}
+    if "exit" in intents and stage != "confirm":
+        session.reset()
         return "No problem! Booking cancelled. How else can I help you? 🐾"
 
     # FAQ shortcuts
-    if any(kw in lower for kw in ["clinic hour", "anong oras", "open", "bukas", "close", "sarado"]):
+    if "faq_hours" in intents:
         return f"🕐 We're open Mon–Sat: 7:00 AM – 8:00 PM. Sunday: Closed.\n\nNow back to your booking — {_resume_prompt(stage, data)}"
 
-    if any(kw in lower for kw in ["how much", "magkano", "price", "cost", "presyo"]):
+    if "faq_price" in intents:
         return f"💰 Pricing varies per procedure. Please call the clinic for exact rates.\n\nNow back to your booking — {_resume_prompt(stage, data)}"
 
     # Mid-booking symptom aside — now uses RAG
-    mid_symptom_kw = [
-        "scratching", "vomit", "diarrhea", "not eating", "ayaw kumain", "sick",
-        "matamlay", "may sakit", "nagsusuka", "lethargic", "lethargy", "coughing",
-        "sneezing", "wound", "rash", "hindi kumakain", "laging tulog", "itchy",
-        "swollen", "limping", "hiccup", "shaking", "trembling", "nagtatae",
-        "btw", "by the way", "sa totoo lang", "actually my", "also my",
-        "my dog has", "my cat has", "my pet has",
-    ]
-    is_symptom_aside = any(kw in lower for kw in mid_symptom_kw)
+    is_symptom_aside = "symptom_aside" in intents
     is_direct_booking_answer = (
-        any(kw in lower for kw in ["confirm", "cancel"])
+        "booking_answer" in intents
         or bool(re.search(r"\d{1,2}/\d{1,2}/\d{4}", raw))
         or stage in ("ask_breed", "ask_pet_name", "ask_consultation_reason")
-        or (stage == "ask_service" and any(kw in lower for kw in ["consult", "vacc", "spay", "deworm", "groom", "bakuna", "kapon", "purga", "ligo"]))
+        or (stage == "ask_service" and "service_answer" in intents)
     )
     if is_symptom_aside and not is_direct_booking_answer:
         known_animal = data.get("animal")
-        safety_tier_aside, _ = brain.check_safety(raw)
+        safety_tier_aside, _ = await turn.safety()
         is_urgent = (safety_tier_aside == "urgent")
-        advice = _get_rag_reply(raw, known_animal=known_animal, is_urgent=is_urgent)
+        advice = await _get_rag_reply(raw, known_animal=known_animal, is_urgent=is_urgent, turn=turn)
         return f"I noticed a health concern — let me address that first! 🩺\n\n{advice}\n\n━━━━━━━━━━━━━━━━━━━━\nNow, back to your booking — {_resume_prompt(stage, data)}"
 
     # ask_service
     if stage == "ask_service":
-        matched_service = next((svc for kw, svc in SERVICE_MAP.items() if kw in lower), None)
+        matched_service = intents.first("service")
         if not matched_service:
-            matched_service = brain.ask_llm_direct(
+            matched_service = (await brain.aask_llm_direct(
                 f"Extract the vet service from this text: '{raw}'. "
-                "Choose ONE from: Consultation, Vaccination, Spay & Neuter, Deworming, Grooming. Return ONLY the service name."
-            ).strip()
+                "Choose ONE from: Consultation, Vaccination, Spay & Neuter, Deworming, Grooming. Return ONLY the service name.",
+                task="service",
+            )).strip()
         valid_services = ["Consultation", "Vaccination", "Spay & Neuter", "Deworming", "Grooming"]
         if matched_service not in valid_services:
             return "I didn't catch that. Please choose one of:\nConsultation, Vaccination, Spay & Neuter, Deworming, or Grooming."
         data["service"] = matched_service
-        session["stage"] = "ask_animal"
+        session.stage = "ask_animal"
         return f"Got it — {matched_service}! 🐾\n\nWhat type of animal is your pet?\n(e.g. Dog, Cat, Rabbit, Bird, Horse…)"
 
     # ask_animal
     if stage == "ask_animal":
-        raw_lower = raw.lower().strip()
-        direct_animal = next((a for a in brain.supported_animals + brain.wildlife_animals if a.lower() in raw_lower), None)
-        tagalog_animal = next((eng for tl, eng in brain.tagalog_animal_map.items() if tl in raw_lower), None)
-        animal = direct_animal or tagalog_animal or _clean_extracted(brain.extract_entity_with_ai(raw, "animal species"))
+        direct_animal = intents.first("animal")
+        tagalog_animal = intents.first("tagalog_animal")
+        animal = direct_animal or tagalog_animal or _clean_extracted(await brain.aextract_entity_with_ai(raw, "animal species"))
         supported = [a.lower() for a in brain.supported_animals]
         wildlife  = [w.lower() for w in brain.wildlife_animals]
         if animal.lower() in wildlife:
-            session["stage"] = "idle"
+            session.stage = "idle"
             return f"🦁 Sorry, we don't handle {animal}s. We only treat domestic and farm animals. Please contact a wildlife rescue centre."
         if animal.lower() not in supported or animal.lower() == "none":
             if not animal or animal.lower() == "none":
@@ -507,7 +862,7 @@ def _handle_booking_flow(session: dict, raw: str):
             return (f"We don't currently serve {animal}s. We accept: Dogs, Cats, Rabbits, Hamsters, Turtles, Birds, "
                     "Cows, Hens, Pigs, Goats, Sheep, Horses, Ducks, Buffalos, Cattle, Donkeys, and Mules.\n\nWhat type of animal is your pet?")
         data["animal"] = animal
-        session["stage"] = "ask_breed"
+        session.stage = "ask_breed"
         return f"A {animal} — got it! 🐕\n\nWhat breed is your {animal.lower()}? (Type 'unknown' if not sure)"
 
     # ask_breed
@@ -516,7 +871,7 @@ def _handle_booking_flow(session: dict, raw: str):
         universal_breeds = {"unknown", "mixed", "crossbreed", "mongrel", "native", "local", "not sure", "di alam", "mix"}
         if raw.lower().strip() in universal_breeds:
             data["breed"] = "Unknown"
-            session["stage"] = "ask_pet_name"
+            session.stage = "ask_pet_name"
             return "No problem! What's your pet's name?"
         raw_lower_breed = raw.lower().strip()
         whitelist = brain.BREED_WHITELIST.get(animal, [])
@@ -524,15 +879,15 @@ def _handle_booking_flow(session: dict, raw: str):
         if direct_match:
             breed = direct_match.title()
             data["breed"] = breed
-            session["stage"] = "ask_pet_name"
+            session.stage = "ask_pet_name"
             return f"{breed} — lovely! 🐾\n\nWhat's your pet's name?"
-        breed = _clean_extracted(brain.extract_entity_with_ai(raw, "breed", exclude=data.get("pet_name")))
+        breed = _clean_extracted(await brain.aextract_entity_with_ai(raw, "breed", exclude=data.get("pet_name")))
         if not breed or breed.lower() in ("none", "null", ""):
             return f"I didn't catch a breed name. What breed is your {animal.lower()}? (Type 'unknown' or 'mixed' if you're not sure)"
         if not brain.validate_breed_for_species(breed, animal):
             return f"'{breed}' doesn't seem to be a {animal} breed. Could you double-check? (Or type 'unknown' / 'mixed')"
         data["breed"] = breed
-        session["stage"] = "ask_pet_name"
+        session.stage = "ask_pet_name"
         return f"{breed} — lovely! 🐾\n\nWhat's your pet's name?"
 
     # ask_pet_name
@@ -549,12 +904,12 @@ def _handle_booking_flow(session: dict, raw: str):
             if 1 <= len(words) <= 3 and all(re.match(r"^[A-Za-z\-']+$", w) for w in words):
                 name = clean_raw.title()
             else:
-                name = _clean_extracted(brain.extract_entity_with_ai(raw, "pet name"))
+                name = _clean_extracted(await brain.aextract_entity_with_ai(raw, "pet name"))
         if not name or name.lower() in ("none", ""):
             return "What should I call your pet? Please enter their name."
         data["pet_name"] = name
         if data.get("service") == "Consultation":
-            session["stage"] = "ask_consultation_reason"
+            session.stage = "ask_consultation_reason"
             return (
                 f"Nice to meet {name}! 🐾\n\n"
                 f"Since you're booking a Consultation, could you describe what {name} is experiencing?\n"
@@ -562,7 +917,7 @@ def _handle_booking_flow(session: dict, raw: str):
                 "This helps our vet prepare for the visit."
             )
         else:
-            session["stage"] = "ask_datetime"
+            session.stage = "ask_datetime"
             return (f"Nice to meet {name}! 🐾\n\nWhen would you like to schedule the appointment?\n"
                     "Format: MM/DD/YYYY HH:MM AM/PM (e.g. 03/20/2026 10:00 AM)\n\nOur clinic is open Mon–Sat, 7:00 AM – 8:00 PM.")
 
@@ -575,36 +930,32 @@ def _handle_booking_flow(session: dict, raw: str):
             return (f"Could you describe what {pet_name} is experiencing? "
                     "For example: 'vomiting', 'not eating', 'lethargic', 'skin rash', etc.")
 
-        # Safety check
-        safety_tier, safety_msg = brain.check_safety(raw)
+        # Safety check (already issued for this turn, alongside summary + retrieval)
+        safety_tier, safety_msg = await turn.safety()
         if safety_tier == "acute":
-            session["stage"] = "idle"
-            session["data"]  = {}
+            session.reset()
             return safety_msg
 
-        # Safety check - acute only from GPT assessment
-        match, score = brain.find_best_match(raw, "symptoms")
-        csv_dangerous = brain.is_match_dangerous(match)
-
-        if csv_dangerous and safety_tier == "acute":
-            session["stage"] = "idle"
-            session["data"]  = {}
+        # Safety dataset cross-check — acute only from GPT assessment, so the match
+        # is only computed when the tier makes it matter
+        if safety_tier == "acute" and brain.is_match_dangerous((await turn.safety_match())[0]):
+            session.reset()
             return (
                 "🚨 EMERGENCY ALERT: The symptoms you described match a condition flagged as dangerous. "
                 "Do not wait — bring your pet to the clinic IMMEDIATELY or contact an emergency veterinarian. "
                 "Only a licensed veterinarian can confirm the exact cause."
             )
 
-        # Summarize and generate RAG-based advice
-        complaint_label = brain.summarize_complaint(raw)
+        # Join the summary + retrieval started at the top of the turn, then generate advice
+        complaint_label, _ = await asyncio.gather(turn.summary(), turn.rag(raw, known_animal))
         data["consultation_reason"] = complaint_label
         data["consultation_reason_raw"] = raw
 
         # is_urgent based on GPT safety tier only
         is_urgent = (safety_tier == "urgent")
-        advice = _get_rag_reply(raw, known_animal=known_animal, is_urgent=is_urgent)
+        advice = await _get_rag_reply(raw, known_animal=known_animal, is_urgent=is_urgent, turn=turn)
 
-        session["stage"] = "ask_datetime"
+        session.stage = "ask_datetime"
         return (
             f"Thank you for letting us know! 🩺\n\n"
             "━━━━━━━━━━━━━━━━━━━━\n"
@@ -622,7 +973,7 @@ def _handle_booking_flow(session: dict, raw: str):
         if not valid:
             return f"⚠️ {error}\n\nPlease re-enter the date and time (e.g. 03/20/2026 10:00 AM)."
         data["datetime"] = raw
-        session["stage"] = "confirm"
+        session.stage = "confirm"
         reason_line = (
             f"• Reason:    {data.get('consultation_reason')}\n"
             if data.get("service") == "Consultation" and data.get("consultation_reason") else ""
@@ -652,9 +1003,7 @@ def _handle_booking_flow(session: dict, raw: str):
                 "appointmentStatus":        "pending",
                 "assignedVet":              "Pending assignment",
             }
-            session["stage"] = "done"
-            session["data"]  = {}
-            session["correction_log"] = []
+            session.reset("done")
             return (
                 "✅ Appointment booked successfully!\n\n"
                 "Your request has been submitted and is pending confirmation. "
@@ -662,15 +1011,14 @@ def _handle_booking_flow(session: dict, raw: str):
                 "You can view your appointment in the My Appointments tab."
             ), booking_data
         elif "cancel" in lower:
-            session["stage"] = "idle"
-            session["data"]  = {}
+            session.reset()
             return "Booking cancelled. Feel free to start a new conversation anytime! 🐾"
         else:
-            correction = _handle_correction(session, raw)
+            correction = await _handle_correction(session, raw, turn)
             if correction:
                 return correction
             return ("Please type 'confirm' to book your appointment, or 'cancel' to start over.\n"
                     "You can also correct any detail — e.g. 'Actually, it's vaccine instead of grooming'.")
 
-    session["stage"] = "idle"
+    session.reset()
     return "Something went wrong. Let's start over — how can I help you today?"
\ No newline at end of file
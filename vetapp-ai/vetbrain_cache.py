@@ -0,0 +1,112 @@
+"""
+VetConnect AI — vetbrain_cache.py
+=================================
+Two-tier memo for deterministic LLM tasks (severity, extraction, summaries).
+
+  Tier 1 — in-process LRU with TTL (no I/O on a hit)
+  Tier 2 — local SQLite file in WAL mode, shared by every worker on the host
+
+Keys are the task type + model + the prompt with whitespace collapsed, so
+"my dog is vomiting" and "my dog  is\nvomiting" share one entry. Case is kept:
+it can change what the LLM extracts (names, "Max" vs "max"). Callers decide what
+is cacheable; the cache itself never stores the LLM error-fallback reply.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Whitespace-insensitive form of a prompt"""
+    return " ".join(prompt.split())
+
+
+class LLMResponseCache:
+    def __init__(self, path: str, max_entries: int = 4096, ttl_seconds: float = 7 * 24 * 3600,
+                 never_cache: Tuple[str, ...] = ()):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.never_cache = set(never_cache)
+        self.hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+
+        self._db = None
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(path, timeout=5, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.commit()
+        except sqlite3.Error as e:
+            print(f"⚠️  LLM cache store unavailable ({e}). Using in-memory cache only.")
+            self._db = None
+
+    @staticmethod
+    def make_key(task: str, model: str, prompt: str) -> str:
+        raw = f"{task}\x00{model}\x00{normalize_prompt(prompt)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and entry[1] > now:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry:
+                del self._memory[key]
+
+            if self._db is not None:
+                try:
+                    row = self._db.execute(
+                        "SELECT response, expires_at FROM llm_cache WHERE key = ? AND expires_at > ?",
+                        (key, now),
+                    ).fetchone()
+                except sqlite3.Error:
+                    row = None
+                if row:
+                    self._remember(key, row[0], row[1])
+                    self.hits += 1
+                    return row[0]
+
+            self.misses += 1
+            return None
+
+    def set(self, key: str, response: str):
+        if not response or response in self.never_cache:
+            return
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            self._remember(key, response, expires_at)
+            if self._db is None:
+                return
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, response, expires_at) VALUES (?, ?, ?)",
+                    (key, response, expires_at),
+                )
+                self._writes += 1
+                if self._writes % 500 == 0:
+                    self._db.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (time.time(),))
+                self._db.commit()
+            except sqlite3.Error as e:
+                print(f"⚠️  LLM cache write failed ({e}).")
+
+    def _remember(self, key: str, response: str, expires_at: float):
+        self._memory[key] = (response, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
@@ -0,0 +1,153 @@
+"""
+VetConnect AI — vetbrain_cassette.py
+====================================
+Record/replay of OpenRouter traffic, for deterministic evaluation and
+regression runs that cost nothing and need no network.
+
+  record — calls go out as usual and every answer is appended to the cassette
+  replay — answers come from the cassette, nothing goes out; a miss gets the
+           LLM fallback reply, like an outage would
+  strict — replay, but a miss raises CassetteMiss
+
+Requests are keyed by sha256 of model + messages + temperature, the exact
+payload VetBrain sends, so a changed prompt template shows up as a miss.
+The file is append-only JSON lines ({"k": key, "r": response}): an interrupted
+recording keeps every call up to the last one, and re-recording a request just
+supersedes the older line when the cassette is loaded.
+
+    VETBRAIN_CASSETTE=eval.cassette VETBRAIN_CASSETTE_MODE=record python evaluate_vetbrain.py
+    python evaluate_vetbrain.py --cassette eval.cassette --cassette-mode strict
+    python vetbrain_cassette.py eval.cassette [--compact]   — entries, size, superseded lines
+"""
+
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Dict, Iterable, Optional
+
+CASSETTE_MODES = ("record", "replay", "strict")
+
+
+class CassetteMiss(LookupError):
+    """Strict replay found no recording for a request"""
+
+
+class LLMCassette:
+    def __init__(self, path: str, mode: str = "replay", never_record: Iterable[str] = ()):
+        if mode not in CASSETTE_MODES:
+            raise ValueError(f"cassette mode must be one of {', '.join(CASSETTE_MODES)}, not {mode!r}")
+        self.path = path
+        self.mode = mode
+        self.never_record = set(never_record)
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+        self.lines = 0
+        self._entries: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._file = None
+        self._load()
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode != "record"
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def make_key(payload: Dict[str, Any]) -> str:
+        # Transport flags like "stream" are left out: a streamed and a plain call share one recording
+        request = {field: payload.get(field) for field in ("model", "messages", "temperature")}
+        raw = json.dumps(request, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            if self.replaying:
+                print(f"⚠️  Cassette {self.path} not found — every LLM call will miss.")
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line_no, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                    self._entries[entry["k"]] = entry["r"]
+                    self.lines += 1
+                except (json.JSONDecodeError, KeyError, TypeError):
+                    # Usually a half-written last line from an interrupted recording
+                    print(f"⚠️  Skipping unreadable cassette line {line_no} in {self.path}.")
+
+    def replay(self, payload: Dict[str, Any]) -> Optional[str]:
+        """Recorded answer for this request, or None on a miss (CassetteMiss in strict mode)"""
+        key = self.make_key(payload)
+        with self._lock:
+            response = self._entries.get(key)
+            if response is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if response is None and self.mode == "strict":
+            raise CassetteMiss(f"no recording for request {key[:12]} in {self.path}")
+        return response
+
+    def record(self, payload: Dict[str, Any], response: str):
+        if self.replaying or not response or response in self.never_record:
+            return
+        key = self.make_key(payload)
+        line = json.dumps({"k": key, "r": response}, ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            if self._file is None:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(line + "\n")
+            self._file.flush()
+            self._entries[key] = response
+            self.recorded += 1
+            self.lines += 1
+
+    def compact(self):
+        """Rewrite the file with one line per request, dropping superseded recordings"""
+        with self._lock:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for key, response in self._entries.items():
+                    f.write(json.dumps({"k": key, "r": response}, ensure_ascii=False, separators=(",", ":")) + "\n")
+            os.replace(tmp_path, self.path)
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self.lines = len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "mode": self.mode,
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "recorded": self.recorded,
+        }
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+if __name__ == "__main__":
+    # python vetbrain_cassette.py FILE [--compact]
+    import sys
+
+    if len(sys.argv) < 2:
+        sys.exit("usage: python vetbrain_cassette.py FILE [--compact]")
+    cassette = LLMCassette(sys.argv[1], mode="replay")
+    size_kb = os.path.getsize(cassette.path) / 1024 if os.path.exists(cassette.path) else 0.0
+    print(f"{cassette.path}: {len(cassette)} recordings, {cassette.lines - len(cassette)} superseded lines, "
+          f"{size_kb:.1f} KB")
+    if "--compact" in sys.argv[2:]:
+        cassette.compact()
+        print(f"✅ Compacted to {os.path.getsize(cassette.path) / 1024:.1f} KB")
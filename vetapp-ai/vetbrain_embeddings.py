@@ -0,0 +1,236 @@
+"""
+VetConnect AI — vetbrain_embeddings.py
+======================================
+Sentence-embedding backends (VETBRAIN_EMBEDDING_BACKEND).
+
+  torch — sentence-transformers on PyTorch, full precision (default)
+  onnx  — the same MiniLM exported to ONNX, weights quantized to int8, run with
+          onnxruntime + the `tokenizers` package. No torch import at serve time,
+          a smaller resident set and faster per-query encodes on CPU-only hosts.
+
+Both return float32 numpy rows with unit length, so cosine similarity is a dot
+product everywhere downstream (safety match, severity kNN, vector index).
+
+    python vetbrain_embeddings.py export   — export + quantize the model (needs torch once)
+    python vetbrain_embeddings.py bench    — parity on both corpora, latency and RSS per backend
+"""
+
+import os
+from typing import List, Sequence
+
+import numpy as np
+
+from vetbrain_storage import normalize_rows
+
+EMBEDDING_BACKEND = os.getenv("VETBRAIN_EMBEDDING_BACKEND", "torch").lower()
+ONNX_MODEL_DIR = os.getenv(
+    "VETBRAIN_ONNX_DIR", os.path.join(os.getenv("VETBRAIN_CACHE_DIR", ".vetbrain_cache"), "onnx")
+)
+ONNX_THREADS = int(os.getenv("VETBRAIN_ONNX_THREADS", "0"))   # 0 = onnxruntime default
+MAX_SEQ_LENGTH = 256    # all-MiniLM-L6-v2 truncation length
+BATCH_SIZE = 64
+
+
+class TorchEmbedder:
+    """sentence-transformers model on PyTorch."""
+
+    backend = "torch"
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+        self.model_name = model_name
+        self.model = SentenceTransformer(model_name)
+        self.dim = self.model.get_sentence_embedding_dimension()
+        # Same key as before the backends were split, so existing embedding caches stay valid
+        self.cache_key = model_name
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        vectors = self.model.encode(texts, batch_size=BATCH_SIZE, convert_to_numpy=True)
+        return normalize_rows(vectors)
+
+
+class OnnxEmbedder:
+    """int8-quantized ONNX export of the model, mean-pooled like sentence-transformers."""
+
+    backend = "onnx"
+
+    def __init__(self, model_name: str, model_dir: str = ONNX_MODEL_DIR):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        path = _onnx_paths(model_name, model_dir)
+        self.model_name = model_name
+        self.cache_key = f"{model_name}+onnx-int8"
+        self.tokenizer = Tokenizer.from_file(path["tokenizer"])
+        self.tokenizer.enable_truncation(max_length=MAX_SEQ_LENGTH)
+        self.tokenizer.enable_padding()
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if ONNX_THREADS:
+            options.intra_op_num_threads = ONNX_THREADS
+        self.session = ort.InferenceSession(path["int8"], options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        hidden_size = self.session.get_outputs()[0].shape[-1]
+        # Static in the export; probe with one text if the graph left it symbolic
+        self.dim = hidden_size if isinstance(hidden_size, int) else self._encode_batch([""]).shape[1]
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.vstack([self._encode_batch(texts[i:i + BATCH_SIZE]) for i in range(0, len(texts), BATCH_SIZE)])
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        batch = self.tokenizer.encode_batch(texts)
+        mask = np.array([e.attention_mask for e in batch], dtype=np.int64)
+        feeds = {
+            "input_ids": np.array([e.ids for e in batch], dtype=np.int64),
+            "attention_mask": mask,
+            "token_type_ids": np.array([e.type_ids for e in batch], dtype=np.int64),
+        }
+        hidden = self.session.run(None, {k: v for k, v in feeds.items() if k in self.input_names})[0]
+        # Mean pooling over real tokens, then L2 normalisation (the model's Pooling + Normalize modules)
+        weights = mask[..., None].astype(np.float32)
+        pooled = (hidden * weights).sum(axis=1) / np.maximum(weights.sum(axis=1), 1e-9)
+        return normalize_rows(pooled)
+
+
+def _onnx_paths(model_name: str, model_dir: str = ONNX_MODEL_DIR) -> dict:
+    base = os.path.join(model_dir, model_name.replace("/", "__"))
+    return {
+        "dir": base,
+        "fp32": os.path.join(base, "model.onnx"),
+        "int8": os.path.join(base, "model.int8.onnx"),
+        "tokenizer": os.path.join(base, "tokenizer.json"),
+    }
+
+
+def export_onnx(model_name: str, model_dir: str = ONNX_MODEL_DIR) -> str:
+    """Export the transformer to ONNX and quantize its weights to int8 (one-off, needs torch)"""
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from sentence_transformers import SentenceTransformer
+
+    path = _onnx_paths(model_name, model_dir)
+    os.makedirs(path["dir"], exist_ok=True)
+    st_model = SentenceTransformer(model_name, device="cpu")
+    transformer = st_model[0].auto_model.eval()
+    tokenizer = st_model.tokenizer
+    tokenizer.save_pretrained(path["dir"])
+
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in sample]
+    dynamic = {n: {0: "batch", 1: "sequence"} for n in names}
+    dynamic["last_hidden_state"] = {0: "batch", 1: "sequence"}
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer, tuple(sample[n] for n in names), path["fp32"],
+            input_names=names, output_names=["last_hidden_state"],
+            dynamic_axes=dynamic, opset_version=17,
+        )
+    quantize_dynamic(path["fp32"], path["int8"], weight_type=QuantType.QInt8)
+    print(f"✅ ONNX model exported: {path['int8']}")
+    return path["int8"]
+
+
+def create_embedder(model_name: str, backend: str = EMBEDDING_BACKEND):
+    """Build the backend selected by VETBRAIN_EMBEDDING_BACKEND (torch | onnx)"""
+    if backend == "onnx":
+        if os.path.exists(_onnx_paths(model_name)["int8"]):
+            try:
+                embedder = OnnxEmbedder(model_name)
+                print(f"[EMBEDDINGS] ONNX int8 backend ({_onnx_paths(model_name)['int8']})")
+                return embedder
+            except ImportError as e:
+                print(f"⚠️  ONNX backend unavailable ({e}). Using PyTorch instead.")
+        else:
+            print("⚠️  No exported ONNX model found — run `python vetbrain_embeddings.py export`. Using PyTorch instead.")
+    elif backend != "torch":
+        print(f"⚠️  Unknown VETBRAIN_EMBEDDING_BACKEND '{backend}'. Using PyTorch.")
+    return TorchEmbedder(model_name)
+
+
+if __name__ == "__main__":
+    # python vetbrain_embeddings.py export | bench
+    import json
+    import resource
+    import subprocess
+    import sys
+    import tempfile
+    import time
+
+    MODEL_NAME = "all-MiniLM-L6-v2"
+    QUERIES = [
+        "my dog has been vomiting for 3 days and won't eat",
+        "my cat is scratching a lot, might be fleas",
+        "ang aso ko ay nagsusuka at matamlay",
+        "my goat has a swollen leg and is limping",
+        "my rabbit hasn't pooped since yesterday",
+    ]
+
+    def corpora() -> dict:
+        """The two corpora exactly as VetBrain.load_data builds them"""
+        import pandas as pd
+        from vetbrain import VetBrain
+
+        safety = pd.read_csv("clean-data.csv")
+        symptoms = safety[[f"Symptom {i}" for i in range(1, 6)]].apply(
+            lambda x: ", ".join(x.dropna().astype(str)), axis=1
+        )
+        rag = pd.read_csv("Animal_disease_spreadsheet_-_Sheet1.csv").rename(columns={"Unnamed: 0": "Disease"})
+        return {
+            "safety": (safety["Animal"].astype(str) + " " + symptoms.astype(str)).tolist(),
+            "rag": VetBrain()._build_rag_chunks(rag)[0],
+        }
+
+    def run_backend(backend: str, out_dir: str):
+        """Child process: one backend only, so peak RSS is its own"""
+        started = time.perf_counter()
+        embedder = create_embedder(MODEL_NAME, backend)
+        load_s = time.perf_counter() - started
+        for name, texts in corpora().items():
+            np.save(os.path.join(out_dir, f"{backend}-{name}.npy"), embedder.encode(texts))
+        np.save(os.path.join(out_dir, f"{backend}-queries.npy"), embedder.encode(QUERIES))
+        for query in QUERIES:   # warm-up
+            embedder.encode([query])
+        timings = []
+        for _ in range(20):
+            for query in QUERIES:
+                started = time.perf_counter()
+                embedder.encode([query])
+                timings.append((time.perf_counter() - started) * 1000)
+        print(json.dumps({
+            "backend": embedder.backend,
+            "load_s": round(load_s, 2),
+            "p50_ms": round(float(np.percentile(timings, 50)), 2),
+            "p95_ms": round(float(np.percentile(timings, 95)), 2),
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        }))
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "bench"
+    if command == "export":
+        export_onnx(MODEL_NAME)
+    elif command == "_run":
+        run_backend(sys.argv[2], sys.argv[3])
+    elif command == "bench":
+        with tempfile.TemporaryDirectory() as out_dir:
+            for backend in ("torch", "onnx"):
+                result = subprocess.run(
+                    [sys.executable, __file__, "_run", backend, out_dir], capture_output=True, text=True, check=True
+                )
+                print(result.stdout.strip().splitlines()[-1])
+            queries = {b: np.load(os.path.join(out_dir, f"{b}-queries.npy")) for b in ("torch", "onnx")}
+            for name in ("safety", "rag"):
+                ref, test = (np.load(os.path.join(out_dir, f"{b}-{name}.npy")) for b in ("torch", "onnx"))
+                cosine = (ref * test).sum(axis=1)
+                ref_top = np.argsort(-(queries["torch"] @ ref.T), axis=1)[:, :5]
+                test_top = np.argsort(-(queries["onnx"] @ test.T), axis=1)[:, :5]
+                overlap = np.mean([len(set(a) & set(b)) / 5 for a, b in zip(ref_top, test_top)])
+                print(f"{name:<7} {len(ref):>5} rows  cosine vs torch: mean {cosine.mean():.4f}  "
+                      f"min {cosine.min():.4f}  top-5 overlap {overlap:.2f}")
+    else:
+        sys.exit(f"unknown command {command!r} (export | bench)")
@@ -0,0 +1,391 @@
+"""
+VetConnect AI — vetbrain_index.py
+=================================
+Vector index backends for RAG retrieval (VETBRAIN_VECTOR_INDEX).
+
+  exact — dot product against every row + partial top-k selection (argpartition)
+  ivf   — inverted-file index: k-means coarse clusters, only the nprobe closest
+          clusters are scored. Built at load time, persisted next to the
+          embedding cache, so later starts only read it back.
+  hnsw  — graph index via the optional `hnswlib` package (falls back to ivf)
+  auto  — exact below IVF_MIN_ROWS rows, ivf above (default)
+
+All indexes work on L2-normalized vectors, so scores are cosine similarities,
+and all return (scores, row_ids) sorted best-first. float16 and int8 matrices
+(see vetbrain_storage.py — already unit rows, usually memory-mapped) are kept
+as they are and scored block by block in float32, so a compact matrix never
+gets a full-size float32 copy; float32 rows are used without a copy too. Exact per-species indexes score their rows of
+the shared matrix in place instead of copying them.
+
+SpeciesIndexes can also index passages: given a chunk → record map, it pools
+chunk hits back to one score per record (max, or sum over retrieved chunks).
+
+Rebuilding after a knowledge-base reload (SpeciesIndexes(..., previous=)): exact
+indexes are free to rebuild; IVF indexes keep the previous snapshot's centroids
+and only re-bucket the rows, skipping k-means; HNSW graphs are rebuilt.
+"""
+
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from vetbrain_storage import QuantizedRows, normalize_rows
+
+VECTOR_INDEX_KIND = os.getenv("VETBRAIN_VECTOR_INDEX", "auto").lower()
+IVF_MIN_ROWS = 20000      # below this an exact scan is already sub-millisecond
+IVF_NPROBE = int(os.getenv("VETBRAIN_IVF_NPROBE", "16"))
+IVF_TRAIN_ITERATIONS = 10
+IVF_TRAIN_SAMPLE = 32     # k-means trains on at most this many points per cluster
+SCORE_BLOCK_ROWS = 65536  # float16 rows upcast per block while scoring
+NORM_CHECK_ROWS = 16      # rows whose length stored_rows checks
+HNSW_M = 16
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+
+
+def stored_rows(matrix):
+    """
+    Search-ready matrix. Every storage format already holds unit rows
+    (vetbrain_storage.to_storage), so float32 memmaps are used as is like float16
+    and int8 — only a sample of row norms is checked, never the whole matrix copied.
+    """
+    if isinstance(matrix, QuantizedRows) or matrix.dtype == np.float16:
+        return matrix
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix[:NORM_CHECK_ROWS], axis=-1)
+    if not np.allclose(norms, 1.0, atol=1e-3):
+        raise ValueError("index rows must be L2-normalized (see vetbrain_index.normalize_rows)")
+    return matrix
+
+
+def dot_rows(vectors, query: np.ndarray, ids: Optional[np.ndarray] = None,
+             block: int = SCORE_BLOCK_ROWS) -> np.ndarray:
+    """
+    vectors[ids] @ query in float32. float16 and int8 rows (and gathered subsets)
+    are upcast one block at a time.
+    """
+    if ids is None and not isinstance(vectors, QuantizedRows) and vectors.dtype == np.float32:
+        return vectors @ query
+    n = vectors.shape[0] if ids is None else ids.shape[0]
+    scores = np.empty(n, dtype=np.float32)
+    for start in range(0, n, block):
+        part = vectors[start:start + block] if ids is None else vectors[ids[start:start + block]]
+        if isinstance(part, QuantizedRows):
+            scores[start:start + block] = (part.codes.astype(np.float32) @ query) * part.scales
+        else:
+            scores[start:start + block] = part.astype(np.float32, copy=False) @ query
+    return scores
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Positions of the k largest scores, best first — O(n) selection instead of a full sort"""
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < scores.shape[0]:
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(scores.shape[0])
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+class ExactIndex:
+    """Full scan; with ids, over those rows of a shared matrix (results are positions in ids)."""
+
+    kind = "exact"
+
+    def __init__(self, vectors: np.ndarray, ids: Optional[np.ndarray] = None):
+        self.vectors = stored_rows(vectors)
+        self.ids = ids
+
+    def __len__(self) -> int:
+        return self.vectors.shape[0] if self.ids is None else self.ids.shape[0]
+
+    def search(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        scores = dot_rows(self.vectors, query, self.ids)
+        ids = top_k(scores, k)
+        return scores[ids], ids
+
+
+class IVFIndex:
+    """Coarse-quantized index: rows are bucketed by nearest k-means centroid."""
+
+    kind = "ivf"
+
+    def __init__(self, vectors: np.ndarray, centroids: np.ndarray, order: np.ndarray,
+                 offsets: np.ndarray, nprobe: int = IVF_NPROBE):
+        self.vectors = vectors
+        self.centroids = centroids
+        self.order = order        # row ids grouped by cluster
+        self.offsets = offsets    # cluster c owns order[offsets[c]:offsets[c + 1]]
+        self.nprobe = nprobe
+
+    def __len__(self) -> int:
+        return self.vectors.shape[0]
+
+    @staticmethod
+    def _assign(vectors: np.ndarray, centroids: np.ndarray, chunk: int = 65536) -> np.ndarray:
+        labels = np.empty(vectors.shape[0], dtype=np.int32)
+        for start in range(0, vectors.shape[0], chunk):
+            labels[start:start + chunk] = np.argmax(vectors[start:start + chunk] @ centroids.T, axis=1)
+        return labels
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, nlist: Optional[int] = None, seed: int = 0,
+              centroids: Optional[np.ndarray] = None) -> "IVFIndex":
+        """k-means clustering, or with `centroids` (e.g. from the previous snapshot) only the row assignment"""
+        stored = stored_rows(vectors)
+        # Training reads float32 rows; only compact storage needs an upcast copy
+        vectors = stored if isinstance(stored, np.ndarray) and stored.dtype == np.float32 else normalize_rows(vectors)
+        n = vectors.shape[0]
+        if centroids is not None and centroids.shape[1] == vectors.shape[1]:
+            return cls._bucket(stored, vectors, centroids)
+        nlist = max(1, min(n, nlist or int(4 * np.sqrt(n))))
+        rng = np.random.default_rng(seed)
+        sample = vectors[rng.choice(n, size=min(n, nlist * IVF_TRAIN_SAMPLE), replace=False)]
+
+        # Spherical k-means on the sample
+        centroids = sample[rng.choice(sample.shape[0], size=nlist, replace=False)].copy()
+        for _ in range(IVF_TRAIN_ITERATIONS):
+            labels = cls._assign(sample, centroids)
+            counts = np.bincount(labels, minlength=nlist)
+            by_cluster = sample[np.argsort(labels, kind="stable")]
+            filled = counts > 0  # empty clusters keep their previous centroid
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[filled]
+            centroids[filled] = normalize_rows(np.add.reduceat(by_cluster, starts, axis=0))
+
+        return cls._bucket(stored, vectors, centroids)
+
+    @classmethod
+    def _bucket(cls, stored, vectors: np.ndarray, centroids: np.ndarray) -> "IVFIndex":
+        nlist = centroids.shape[0]
+        labels = cls._assign(vectors, centroids)
+        order = np.argsort(labels, kind="stable").astype(np.int64)
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(labels, minlength=nlist))
+        return cls(stored, centroids, order, offsets)
+
+    def save(self, path: str):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, centroids=self.centroids, order=self.order, offsets=self.offsets)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, vectors: np.ndarray) -> "IVFIndex":
+        with np.load(path) as data:
+            index = cls(stored_rows(vectors), data["centroids"], data["order"], data["offsets"])
+        if index.offsets[-1] != index.vectors.shape[0]:
+            raise ValueError("index does not match the embeddings")
+        return index
+
+    def search(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        probes = top_k(self.centroids @ query, self.nprobe)
+        ids = np.concatenate([self.order[self.offsets[c]:self.offsets[c + 1]] for c in probes])
+        scores = dot_rows(self.vectors[ids], query)
+        best = top_k(scores, k)
+        return scores[best], ids[best]
+
+
+class HNSWIndex:
+    """Thin wrapper over hnswlib (optional dependency)."""
+
+    kind = "hnsw"
+
+    def __init__(self, graph, size: int):
+        self.graph = graph
+        self.size = size
+
+    def __len__(self) -> int:
+        return self.size
+
+    @classmethod
+    def build(cls, vectors: np.ndarray) -> "HNSWIndex":
+        import hnswlib
+        vectors = normalize_rows(vectors)
+        graph = hnswlib.Index(space="ip", dim=vectors.shape[1])
+        graph.init_index(max_elements=vectors.shape[0], ef_construction=HNSW_EF_CONSTRUCTION, M=HNSW_M)
+        graph.add_items(vectors, np.arange(vectors.shape[0]))
+        graph.set_ef(HNSW_EF_SEARCH)
+        return cls(graph, vectors.shape[0])
+
+    def save(self, path: str):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        self.graph.save_index(tmp_path)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, vectors: np.ndarray) -> "HNSWIndex":
+        import hnswlib
+        graph = hnswlib.Index(space="ip", dim=vectors.shape[1])
+        graph.load_index(path, max_elements=vectors.shape[0])
+        if graph.get_current_count() != vectors.shape[0]:
+            raise ValueError("index does not match the embeddings")
+        graph.set_ef(HNSW_EF_SEARCH)
+        return cls(graph, vectors.shape[0])
+
+    def search(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        k = min(k, self.size)
+        self.graph.set_ef(max(HNSW_EF_SEARCH, k))
+        labels, distances = self.graph.knn_query(query, k=k)
+        # inner-product space reports 1 - similarity
+        return 1.0 - distances[0], labels[0].astype(np.int64)
+
+
+def _resolve_kind(kind: str, rows: int) -> str:
+    if kind == "auto":
+        return "exact" if rows < IVF_MIN_ROWS else "ivf"
+    if kind == "hnsw":
+        try:
+            import hnswlib  # noqa: F401
+        except ImportError:
+            print("⚠️  hnswlib not installed. Using the IVF index instead.")
+            return "ivf"
+    if kind not in ("exact", "ivf", "hnsw"):
+        print(f"⚠️  Unknown VETBRAIN_VECTOR_INDEX '{kind}'. Using exact search.")
+        return "exact"
+    return kind
+
+
+def build_index(vectors: np.ndarray, cache_stem: Optional[str] = None, kind: str = VECTOR_INDEX_KIND,
+                ids: Optional[np.ndarray] = None, previous=None):
+    """
+    Build (or load from `{cache_stem}.{kind}`) the index selected by `kind` for these vectors
+    (or for rows `ids` of them). cache_stem should change whenever the vectors do — the
+    embedding cache path is used. `previous` is the index this one replaces, if any.
+    """
+    rows = vectors.shape[0] if ids is None else ids.shape[0]
+    kind = _resolve_kind(kind, rows)
+    if kind == "exact" or rows == 0:
+        return ExactIndex(vectors, ids)
+    if ids is not None:
+        vectors = vectors[ids]  # approximate indexes keep their own copy of their rows
+
+    index_cls = IVFIndex if kind == "ivf" else HNSWIndex
+    path = f"{cache_stem}.{kind}" if cache_stem else None
+    if path and os.path.exists(path):
+        try:
+            return index_cls.load(path, vectors)
+        except Exception as e:
+            print(f"⚠️  Vector index unreadable ({e}). Rebuilding.")
+
+    if kind == "ivf" and isinstance(previous, IVFIndex):
+        index = IVFIndex.build(vectors, centroids=previous.centroids)
+    else:
+        index = index_cls.build(vectors)
+    if path:
+        try:
+            index.save(path)
+        except OSError as e:
+            print(f"⚠️  Could not write vector index ({e}).")
+    return index
+
+
+class SpeciesIndexes:
+    """
+    One index over the whole knowledge base plus one per species subset.
+
+    With chunk_offsets (record r owns vectors[offsets[r]:offsets[r + 1]]) the vectors are
+    passages; searches return records, selected by `pooling` — "max" (best passage) or
+    "sum" (all of the record's retrieved passages) — and scored and sorted by their best passage.
+    `previous` is the SpeciesIndexes of the snapshot being replaced; its indexes seed the new ones.
+    """
+
+    def __init__(self, vectors: np.ndarray, species_rows: Dict[str, List[int]],
+                 cache_stem: Optional[str] = None, kind: str = VECTOR_INDEX_KIND,
+                 chunk_offsets: Optional[np.ndarray] = None, pooling: str = "max",
+                 previous: Optional["SpeciesIndexes"] = None):
+        self.pooling = pooling
+        self.chunk_offsets = chunk_offsets
+        self.chunk_rows: Optional[np.ndarray] = None
+        self.max_chunks = 1
+        if chunk_offsets is not None:
+            counts = np.diff(chunk_offsets)
+            self.chunk_rows = np.repeat(np.arange(counts.shape[0], dtype=np.int64), counts)
+            self.max_chunks = int(counts.max()) if counts.shape[0] else 1
+
+        self.all = build_index(vectors, cache_stem, kind, previous=previous.all if previous else None)
+        self.rows: Dict[str, np.ndarray] = {}
+        self.species: Dict[str, object] = {}
+        self._species_vectors: Dict[str, np.ndarray] = {}   # species → global vector ids
+        for species, rows in species_rows.items():
+            rows = np.asarray(rows, dtype=np.int64)
+            self.rows[species] = rows
+            ids = rows if chunk_offsets is None else np.concatenate(
+                [np.arange(chunk_offsets[r], chunk_offsets[r + 1]) for r in rows]
+            ).astype(np.int64)
+            self._species_vectors[species] = ids
+            stem = f"{cache_stem}.{species.lower()}" if cache_stem else None
+            self.species[species] = build_index(
+                vectors, stem, kind, ids=ids, previous=previous.species.get(species) if previous else None
+            )
+
+    def search(self, query: np.ndarray, k: int, species: Optional[str] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k (cosine scores, knowledge-base row ids), restricted to one species if given"""
+        query = normalize_rows(query).reshape(-1)
+        # Enough passages that k distinct records survive pooling
+        depth = k if self.chunk_rows is None else (k - 1) * self.max_chunks + 1
+        if species in self.species:
+            scores, local = self.species[species].search(query, depth)
+            ids = self._species_vectors[species][local]
+        else:
+            scores, ids = self.all.search(query, depth)
+        if self.chunk_rows is None:
+            return scores, ids
+        return self._pool(scores, self.chunk_rows[ids], k)
+
+    def _pool(self, scores: np.ndarray, rows: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        best: Dict[int, float] = {}
+        total: Dict[int, float] = {}
+        for score, row in zip(scores.tolist(), rows.tolist()):
+            best[row] = max(best.get(row, score), score)
+            total[row] = total.get(row, 0.0) + score
+        rank = total if self.pooling == "sum" else best
+        kept = sorted(best, key=lambda row: -rank[row])[:k]
+        # Scores stay cosine (best passage) and come back best-first like every other index;
+        # "sum" pooling decides which records make the top k, not the order they are reported in
+        kept.sort(key=lambda row: -best[row])
+        return np.array([best[row] for row in kept], dtype=np.float32), np.array(kept, dtype=np.int64)
+
+    def record_scores(self, query: np.ndarray, vectors: np.ndarray, rows: Sequence[int]) -> np.ndarray:
+        """Cosine score of each given record — its best passage when the vectors are passages"""
+        query = normalize_rows(query).reshape(-1)
+        if self.chunk_offsets is None:
+            return dot_rows(vectors, query, np.asarray(rows, dtype=np.int64))
+        return np.array([
+            dot_rows(vectors[self.chunk_offsets[r]:self.chunk_offsets[r + 1]], query).max() for r in rows
+        ], dtype=np.float32)
+
+    def describe(self) -> str:
+        kinds = sorted({index.kind for index in [self.all, *self.species.values()]})
+        if self.chunk_rows is not None:
+            records = self.chunk_offsets.shape[0] - 1
+            return (f"{'/'.join(kinds)} ({len(self.all)} passages over {records} records, {self.pooling} pooling, "
+                    f"{len(self.species)} species sub-indexes)")
+        return f"{'/'.join(kinds)} ({len(self.all)} rows, {len(self.species)} species sub-indexes)"
+
+
+if __name__ == "__main__":
+    # Micro-benchmark: python vetbrain_index.py [rows ...]
+    import sys
+    import time
+
+    sizes: Sequence[int] = [int(a) for a in sys.argv[1:]] or [1000, 10000, 100000, 1000000]
+    rng = np.random.default_rng(0)
+    for n in sizes:
+        # Clustered synthetic corpus (topics + noise), closer to real sentence embeddings than pure noise
+        topics = rng.standard_normal((max(1, n // 100), 384), dtype=np.float32)
+        vectors = normalize_rows(topics[rng.integers(0, topics.shape[0], n)] + 0.5 * rng.standard_normal((n, 384), dtype=np.float32))
+        queries = normalize_rows(vectors[rng.choice(n, 50)] + 0.3 * rng.standard_normal((50, 384), dtype=np.float32))
+        exact = ExactIndex(vectors)
+        truth = [exact.search(q, 5)[1] for q in queries]
+        for kind in ("exact", "ivf"):
+            started = time.perf_counter()
+            index = build_index(vectors, kind=kind)
+            built = time.perf_counter() - started
+            started = time.perf_counter()
+            hits = [index.search(q, 5)[1] for q in queries]
+            per_query = (time.perf_counter() - started) / len(queries) * 1000
+            recall = np.mean([len(set(a) & set(b)) / 5 for a, b in zip(hits, truth)])
+            print(f"{n:>8} rows  {kind:<5}  build {built:7.2f}s  query {per_query:7.3f} ms  recall@5 {recall:.2f}")
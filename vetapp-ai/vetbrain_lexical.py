@@ -0,0 +1,178 @@
+"""
+VetConnect AI — vetbrain_lexical.py
+===================================
+BM25 inverted index for the RAG knowledge base, fused with the dense index.
+
+MiniLM similarity blurs exact clinical terms ("parvo", "mange", "bloat");
+a lexical index catches them. Each term's posting list stores the row ids and
+the row's full BM25 term weight (idf × saturated, length-normalised tf), all
+computed at load time, so a query is just a sum over the postings of its terms.
+
+Owners shorten disease names ("parvo" for parvovirus), so a query term of at
+least PREFIX_MIN_LENGTH characters also matches every indexed term it is a
+prefix of; a row scores the best of those matches once, not their sum.
+
+    reciprocal_rank_fusion(dense_ids, lexical_ids)  — Cormack et al. RRF, k = 60
+
+    python vetbrain_lexical.py   — recall@k on the evaluator's retrieval cases:
+                                   dense vs hybrid, with and without the LLM
+                                   symptom-extraction step
+"""
+
+import bisect
+import math
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from vetbrain_index import top_k
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60
+PREFIX_MIN_LENGTH = 4   # shorter query terms match exactly ("cat" must not hit "cattle")
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_SUFFIXES = ("ing", "ed", "es", "s")
+STOPWORDS = frozenset(
+    "a an and are as at be been but by can do does for from has have he her his how i if in into is it its "
+    "me my no not of on or our she so some such than that the their them then there these they this to too "
+    "up was we were what when which while who will with would you your also very much many may might".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens, stopwords dropped, one common suffix stripped (vomiting/vomits → vomit)"""
+    tokens = []
+    for token in _TOKEN.findall(text.lower()):
+        if token in STOPWORDS or len(token) < 2:
+            continue
+        if len(token) > 4:
+            for suffix in _SUFFIXES:
+                if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+                    token = token[:-len(suffix)]
+                    break
+        tokens.append(token)
+    return tokens
+
+
+class BM25Index:
+    """documents: one text per knowledge-base row, in row order"""
+
+    def __init__(self, documents: Sequence[str], k1: float = BM25_K1, b: float = BM25_B):
+        tokenized = [tokenize(doc) for doc in documents]
+        self.size = len(tokenized)
+        lengths = np.array([len(tokens) for tokens in tokenized], dtype=np.float32)
+        avg_length = float(lengths.mean()) if self.size and lengths.mean() > 0 else 1.0
+
+        postings: Dict[str, Dict[int, int]] = {}
+        for row, tokens in enumerate(tokenized):
+            for term, tf in Counter(tokens).items():
+                postings.setdefault(term, {})[row] = tf
+
+        # term → (row ids, precomputed BM25 weight of the term in each row)
+        self._postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        for term, rows_tf in postings.items():
+            rows = np.fromiter(rows_tf.keys(), dtype=np.int64, count=len(rows_tf))
+            tf = np.fromiter(rows_tf.values(), dtype=np.float32, count=len(rows_tf))
+            df = len(rows_tf)
+            idf = math.log(1.0 + (self.size - df + 0.5) / (df + 0.5))
+            norm = k1 * (1.0 - b + b * lengths[rows] / avg_length)
+            self._postings[term] = (rows, (idf * tf * (k1 + 1.0) / (tf + norm)).astype(np.float32))
+        self._vocabulary = sorted(self._postings)
+
+    def __len__(self) -> int:
+        return self.size
+
+    @property
+    def vocabulary_size(self) -> int:
+        return len(self._postings)
+
+    def expand(self, term: str) -> List[str]:
+        """Indexed terms a query term matches: itself, plus longer terms it prefixes"""
+        if len(term) < PREFIX_MIN_LENGTH:
+            return [term] if term in self._postings else []
+        matched = []
+        for indexed in self._vocabulary[bisect.bisect_left(self._vocabulary, term):]:
+            if not indexed.startswith(term):
+                break
+            matched.append(indexed)
+        return matched
+
+    def scores(self, query: str) -> np.ndarray:
+        scores = np.zeros(self.size, dtype=np.float32)
+        for term in set(tokenize(query)):
+            matched = self.expand(term)
+            if len(matched) == 1:
+                rows, weights = self._postings[matched[0]]
+                scores[rows] += weights
+            elif matched:
+                best = np.zeros(self.size, dtype=np.float32)
+                for indexed in matched:
+                    rows, weights = self._postings[indexed]
+                    best[rows] = np.maximum(best[rows], weights)
+                scores += best
+        return scores
+
+    def search(self, query: str, k: int, rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k (BM25 scores, row ids) with a score above zero, restricted to `rows` if given"""
+        scores = self.scores(query)
+        if rows is not None:
+            ids = rows[top_k(scores[rows], k)]
+        else:
+            ids = top_k(scores, k)
+        ids = ids[scores[ids] > 0]
+        return scores[ids], ids
+
+
+def reciprocal_rank_fusion(*rankings: Iterable[int], k: int = RRF_K) -> List[int]:
+    """Row ids ordered by Σ 1 / (k + rank) over every ranking they appear in"""
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking, 1):
+            fused[row] = fused.get(row, 0.0) + 1.0 / (k + rank)
+    return sorted(fused, key=lambda row: -fused[row])
+
+
+if __name__ == "__main__":
+    # Retrieval benchmark: python vetbrain_lexical.py
+    # Extraction needs one LLM call per case; set VETBRAIN_CASSETTE to replay them offline.
+    import time
+
+    from evaluate_vetbrain import RETRIEVAL_CASES
+    from vetbrain import VetBrain
+
+    K_VALUES = (1, 3, 5)
+    brain = VetBrain()
+    brain.load_data()
+    topical = [case for case in RETRIEVAL_CASES if case["expected_disease_keywords"]]
+    off_topic = [case for case in RETRIEVAL_CASES if not case["expected_disease_keywords"]]
+    extracted = {case["query"]: brain.extract_symptoms_from_narrative(case["query"]) for case in RETRIEVAL_CASES}
+
+    def hit(results: List[dict], keywords: List[str]) -> bool:
+        text = " ".join(r["disease"].lower() + " " + r["symptoms"].lower() for r in results)
+        return any(kw.lower() in text for kw in keywords)
+
+    print(f"\n{'mode':<8} {'extraction':<11} " + " ".join(f"recall@{k:<3}" for k in K_VALUES)
+          + f" {'off-topic <0.4':>15} {'ms/query':>9}")
+    for mode in ("dense", "hybrid"):
+        brain.retrieval_mode = mode
+        for use_llm in (True, False):
+            recalls = {k: 0 for k in K_VALUES}
+            started = time.perf_counter()
+            for case in topical:
+                search = extracted[case["query"]] if use_llm else case["query"]
+                results = brain._search_rag(case["query"], search, None, max(K_VALUES))
+                for k in K_VALUES:
+                    recalls[k] += hit(results[:k], case["expected_disease_keywords"])
+            low = 0
+            for case in off_topic:
+                search = extracted[case["query"]] if use_llm else case["query"]
+                results = brain._search_rag(case["query"], search, None, max(K_VALUES))
+                low += not results or max(r["score"] for r in results) < 0.4
+            per_query = (time.perf_counter() - started) / len(RETRIEVAL_CASES) * 1000
+            print(f"{mode:<8} {'LLM' if use_llm else 'raw query':<11} "
+                  + " ".join(f"{recalls[k] / len(topical):<10.2f}" for k in K_VALUES)
+                  + f" {low:>9}/{len(off_topic):<5} {per_query:>9.2f}")
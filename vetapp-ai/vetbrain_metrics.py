@@ -0,0 +1,151 @@
+"""
+VetConnect AI — vetbrain_metrics.py
+===================================
+Per-stage latency histograms and counters, rendered in Prometheus text format.
+
+  span("safety")          — times a stage into vetbrain_stage_seconds{stage=...}
+                            and, inside a turn, into that turn's timing table
+  start_turn()            — opens the timing table for one request; tasks and
+                            to_thread calls started from it share the table
+  server_timing(spans)    — the table as a Server-Timing header value
+  render()                — every metric, for GET /metrics
+
+Stages: sanitize, safety, embed, retrieve, ratelimit, llm, turn.
+vetbrain_prompt_tokens{task=...} records the input tokens of every OpenRouter call.
+No prometheus_client dependency; each worker process keeps its own registry.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TOKEN_BUCKETS = (64, 128, 256, 512, 768, 1024, 1536, 2048, 4096, 8192)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(label, "")) for label in self.labels)
+
+    def _label_text(self, key: Tuple[str, ...], extra: str = "") -> str:
+        parts = [f'{label}="{_escape(value)}"' for label, value in zip(self.labels, key)]
+        if extra:
+            parts.append(extra)
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return super().render() + [f"{self.name}{self._label_text(k)} {v:g}" for k, v in values]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+        # key → (per-bucket counts incl. +Inf, sum, count)
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], float, int]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total, n = self._values.get(key) or ([0] * (len(self.buckets) + 1), 0.0, 0)
+            counts[bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value, n + 1)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted((k, (list(c), s, n)) for k, (c, s, n) in self._values.items())
+        lines = super().render()
+        for key, (counts, total, n) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound:g}"'
+                lines.append(f"{self.name}_bucket{self._label_text(key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._label_text(key)} {total:.6f}")
+            lines.append(f"{self.name}_count{self._label_text(key)} {n}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+STAGE_SECONDS = Histogram("vetbrain_stage_seconds", "Time spent per pipeline stage.", ("stage",))
+LLM_CALLS = Counter("vetbrain_llm_calls_total", "OpenRouter calls made, by task type.", ("task",))
+LLM_CACHE = Counter("vetbrain_llm_cache_total", "LLM response cache lookups, by task and result.", ("task", "result"))
+PROMPT_TOKENS = Histogram(
+    "vetbrain_prompt_tokens", "Input tokens per OpenRouter call (system + user prompt), by task type.", ("task",),
+    buckets=TOKEN_BUCKETS,
+)
+BOOKING_TRANSITIONS = Counter(
+    "vetbrain_booking_transitions_total", "Booking stage changes caused by a chat turn.", ("from_stage", "to_stage")
+)
+REGISTRY = [STAGE_SECONDS, LLM_CALLS, LLM_CACHE, PROMPT_TOKENS, BOOKING_TRANSITIONS]
+
+# stage → [total seconds, calls] for the request being served
+_turn_spans: ContextVar[Optional[Dict[str, List[float]]]] = ContextVar("vetbrain_turn_spans", default=None)
+
+
+def start_turn() -> Dict[str, List[float]]:
+    spans: Dict[str, List[float]] = {}
+    _turn_spans.set(spans)
+    return spans
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        spans = _turn_spans.get()
+        if spans is not None:
+            entry = spans.setdefault(stage, [0.0, 0])
+            entry[0] += elapsed
+            entry[1] += 1
+
+
+def server_timing(spans: Dict[str, List[float]]) -> str:
+    """Concurrent spans of one stage are summed, so they can add up to more than the turn"""
+    return ", ".join(
+        f'{stage};dur={seconds * 1000:.1f};desc="{int(calls)}x"'
+        for stage, (seconds, calls) in spans.items()
+    )
+
+
+def render() -> str:
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
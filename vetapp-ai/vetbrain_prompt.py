@@ -0,0 +1,210 @@
+"""
+VetConnect AI — vetbrain_prompt.py
+==================================
+Token-budgeted context assembly for the RAG advice prompt.
+
+An advice call sends the system instruction plus the RAG prompt. The knowledge-base
+records get whatever VETBRAIN_PROMPT_TOKENS leaves after those fixed parts:
+
+  1. dedupe — a record naming the same disease as a higher-ranked one, or whose
+              symptoms + description overlap it ≥ PROMPT_DEDUP_SIMILARITY (Jaccard
+              over word trigrams), is dropped
+  2. share  — the remaining budget is split across records in proportion to their
+              retrieval score; tokens a short record leaves unused pass to the next
+  3. trim   — each record's fields are filled in priority order (symptoms first,
+              advice last) and the field that doesn't fit is cut at a word boundary;
+              a record whose share can't hold its symptoms line is left out (the
+              best-ranked record always gets at least PROMPT_MIN_RECORD_TOKENS)
+
+Counting uses tiktoken with the model's encoding (o200k_base for gpt-4o-mini),
+falling back to the ~4 characters per token estimate when tiktoken isn't installed
+or its encoding file can't be fetched (set TIKTOKEN_CACHE_DIR on offline hosts).
+The same counts feed the tokens-per-minute budget and vetbrain_prompt_tokens.
+
+    python vetbrain_prompt.py [budget ...]   — prompt tokens and records kept on the
+                                               evaluator's response cases, per budget
+"""
+
+import os
+import re
+import threading
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from vetbrain_ratelimit import estimate_tokens
+
+PROMPT_TOKEN_BUDGET = int(os.getenv("VETBRAIN_PROMPT_TOKENS", "1300"))  # system + user prompt
+PROMPT_ENCODING = os.getenv("VETBRAIN_PROMPT_ENCODING", "o200k_base")
+PROMPT_DEDUP_SIMILARITY = 0.8
+PROMPT_MIN_RECORD_TOKENS = 40   # smaller shares are dropped rather than rendered as a stub
+PROMPT_MIN_FIELD_TOKENS = 8
+SHINGLE_WORDS = 3
+
+# (result key, label) in the order a record's budget is spent
+RECORD_FIELDS = (
+    ("symptoms", "Symptoms"),
+    ("description", "Description"),
+    ("recognition", "Recognition"),
+    ("treatment", "Treatment context"),
+    ("advice", "Prevention/Advice"),
+)
+ELLIPSIS = "…"
+
+_WORD = re.compile(r"[a-z0-9]+")
+_MISSING = {"", "nan", "none", "null"}
+
+
+class TokenCounter:
+    """Tokenizer-accurate counts for the LLM's encoding; loaded on first use"""
+
+    def __init__(self, encoding: str = PROMPT_ENCODING):
+        self.encoding_name = encoding
+        self._encoding = None
+        self._loaded = False
+        self._lock = threading.Lock()
+        # The system instruction and instruction blocks repeat on every call
+        self.count_cached = lru_cache(maxsize=64)(self.count)
+
+    def _load(self):
+        with self._lock:
+            if self._loaded:
+                return
+            try:
+                import tiktoken
+                self._encoding = tiktoken.get_encoding(self.encoding_name)
+            except Exception as e:
+                print(f"⚠️  tiktoken unavailable ({e}). Prompt token counts are estimates (~4 characters/token).")
+            self._loaded = True
+
+    @property
+    def exact(self) -> bool:
+        if not self._loaded:
+            self._load()
+        return self._encoding is not None
+
+    def count(self, text: Optional[str]) -> int:
+        if not text:
+            return 0
+        if not self._loaded:
+            self._load()
+        if self._encoding is None:
+            return estimate_tokens(text)
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text: str, tokens: int) -> str:
+        """Longest word-boundary prefix of text that fits `tokens` tokens, ellipsis included"""
+        if self.count(text) <= tokens:
+            return text
+        room = tokens - self.count(ELLIPSIS)
+        if room <= 0:
+            return ""
+        if self._encoding is None:
+            prefix = text[:room * 4]
+        else:
+            prefix = self._encoding.decode(self._encoding.encode(text, disallowed_special=())[:room])
+        cut = prefix.rfind(" ")
+        prefix = prefix[:cut] if cut > 0 else prefix
+        return prefix.rstrip(" ,;:.-") + ELLIPSIS
+
+
+def _clean(value) -> str:
+    text = " ".join(str(value).split()) if value is not None else ""
+    return "" if text.lower() in _MISSING else text
+
+
+def _shingles(text: str) -> set:
+    words = _WORD.findall(text.lower())
+    if len(words) < SHINGLE_WORDS:
+        return set(words)
+    return {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+
+def dedupe_records(records: Sequence[Dict], threshold: float = PROMPT_DEDUP_SIMILARITY) -> List[Dict]:
+    """Records in their ranked order, minus any that repeat a higher-ranked one"""
+    kept: List[Dict] = []
+    names = set()
+    seen: List[set] = []
+    for record in records:
+        name = _clean(record.get("disease")).lower()
+        shingles = _shingles(f"{_clean(record.get('symptoms'))} {_clean(record.get('description'))}")
+        if name and name in names:
+            continue
+        if shingles and any(len(shingles & other) / len(shingles | other) >= threshold for other in seen):
+            continue
+        kept.append(record)
+        names.add(name)
+        seen.append(shingles)
+    return kept
+
+
+def render_record(number: int, record: Dict, tokens: int, counter: TokenCounter) -> Optional[str]:
+    """One "[Record n]" block within `tokens` tokens, or None if not even its symptoms fit"""
+    if tokens < PROMPT_MIN_RECORD_TOKENS:
+        return None
+    block = f"[Record {number}] Disease: {_clean(record.get('disease')) or 'Unknown'}"
+    used = counter.count(block)
+    for key, label in RECORD_FIELDS:
+        value = _clean(record.get(key))
+        if not value:
+            continue
+        prefix = f"\n  {label}: "
+        room = tokens - used - counter.count(prefix)
+        if room < PROMPT_MIN_FIELD_TOKENS:
+            if key == "symptoms":
+                return None
+            break
+        line = prefix + counter.truncate(value, room)
+        block += line
+        used += counter.count(line)
+    return block
+
+
+def assemble_context(records: Sequence[Dict], budget: int, counter: TokenCounter) -> Tuple[List[str], Dict[str, int]]:
+    """
+    Record blocks fitting `budget` tokens in total (joined with blank lines), and
+    counts of the records kept, dropped as duplicates and dropped for budget.
+    """
+    unique = dedupe_records(records)
+    weights = [max(float(r.get("score", 0.0)), 0.01) for r in unique]
+    separator = counter.count("\n\n")
+    blocks: List[str] = []
+    remaining = budget
+    for i, record in enumerate(unique):
+        share = int(remaining * weights[i] / sum(weights[i:]))
+        if i == 0:
+            share = max(share, PROMPT_MIN_RECORD_TOKENS)
+        block = render_record(len(blocks) + 1, record, share - (separator if blocks else 0), counter)
+        if block is None:
+            continue
+        blocks.append(block)
+        remaining -= counter.count(block) + (separator if len(blocks) > 1 else 0)
+    return blocks, {
+        "kept": len(blocks),
+        "duplicates": len(records) - len(unique),
+        "over_budget": len(unique) - len(blocks),
+    }
+
+
+if __name__ == "__main__":
+    # Prompt size per budget: python vetbrain_prompt.py [budget ...]
+    import sys
+
+    from evaluate_vetbrain import RESPONSE_CASES
+    from vetbrain import VetBrain
+
+    budgets = [int(a) for a in sys.argv[1:]] or [10 ** 6, 2000, PROMPT_TOKEN_BUDGET, 900]
+    brain = VetBrain()
+    brain.load_data()
+    retrieved = [(case, brain.retrieve_rag_context(case["query"], animal=case["animal"])) for case in RESPONSE_CASES]
+    counter = brain.prompt_counter
+    print(f"\ntokenizer: {counter.encoding_name if counter.exact else '~4 characters/token estimate'}")
+    print(f"{'budget':>8} {'avg tokens':>11} {'max tokens':>11} {'avg records':>12}")
+    for budget in budgets:
+        totals, records = [], []
+        for case, results in retrieved:
+            prompt = brain.build_rag_prompt(case["query"], results, known_animal=case["animal"],
+                                            is_urgent=case["is_urgent"], token_budget=budget)
+            totals.append(counter.count(prompt) + counter.count_cached(brain.system_instruction))
+            records.append(prompt.count("[Record "))
+        label = "none" if budget >= 10 ** 6 else str(budget)
+        print(f"{label:>8} {sum(totals) / len(totals):>11.0f} {max(totals):>11} {sum(records) / len(records):>12.1f}")
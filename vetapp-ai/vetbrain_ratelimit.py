@@ -0,0 +1,116 @@
+"""
+VetConnect AI — vetbrain_ratelimit.py
+=====================================
+Outbound rate-limit scheduler for OpenRouter calls.
+
+Every LLM call draws from two token buckets:
+  • requests per second  (LLM_REQUESTS_PER_SECOND)
+  • tokens per minute    (LLM_TOKENS_PER_MINUTE, estimated from the prompt)
+
+Async callers wait in a per-session queue. A single dispatcher task serves
+the queues round-robin, so one busy conversation cannot starve the others,
+and all waiting is done with asyncio.sleep so the event loop keeps serving
+requests. Sync callers (evaluator, interactive tester) draw from the same
+buckets and only block their own thread.
+"""
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+from typing import Deque, Optional, Tuple
+
+# Conversation the current LLM call is made for — set once per /chat turn
+current_session: ContextVar[str] = ContextVar("current_session", default="default")
+
+
+def estimate_tokens(*texts: Optional[str]) -> int:
+    """Rough prompt size (~4 characters per token) for the tokens-per-minute budget"""
+    return max(1, sum(len(t) for t in texts if t) // 4)
+
+
+class TokenBucket:
+    """Refills `rate` tokens per second up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` tokens are available (0.0 if they are available now)"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        amount = min(amount, self.capacity)  # oversized requests wait for a full bucket
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float):
+        self.tokens -= min(amount, self.capacity)
+
+
+class RateLimitScheduler:
+    """Fair, non-blocking scheduler enforcing requests/second and tokens/minute budgets."""
+
+    def __init__(self, requests_per_second: float, tokens_per_minute: float, burst: Optional[float] = None):
+        self._requests = TokenBucket(requests_per_second, max(1.0, burst or requests_per_second))
+        self._tokens = TokenBucket(tokens_per_minute / 60.0, tokens_per_minute)
+        self._lock = threading.Lock()
+        self._queues: "OrderedDict[str, Deque[Tuple[asyncio.Future, int]]]" = OrderedDict()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._loop = None
+
+    def _try_acquire(self, tokens: int) -> float:
+        """Take one request + `tokens` from the buckets, or return how long to wait"""
+        with self._lock:
+            now = time.monotonic()
+            wait = max(self._requests.wait_time(1, now), self._tokens.wait_time(tokens, now))
+            if wait == 0.0:
+                self._requests.consume(1)
+                self._tokens.consume(tokens)
+            return wait
+
+    async def acquire(self, tokens: int = 1, session: Optional[str] = None) -> float:
+        """Wait for a slot without blocking the event loop. Returns seconds spent waiting."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._queues.clear()
+            self._dispatcher = None
+            self._loop = loop
+
+        started = time.monotonic()
+        future = loop.create_future()
+        self._queues.setdefault(session or current_session.get(), deque()).append((future, tokens))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = loop.create_task(self._dispatch())
+        await future
+        return time.monotonic() - started
+
+    async def _dispatch(self):
+        # Serve the head of each session's queue in turn (round-robin)
+        while self._queues:
+            session, queue = next(iter(self._queues.items()))
+            future, tokens = queue[0]
+            if not future.done():
+                wait = self._try_acquire(tokens)
+                if wait > 0.0:
+                    await asyncio.sleep(wait)
+                    continue
+                future.set_result(None)
+            queue.popleft()
+            if queue:
+                self._queues.move_to_end(session)
+            else:
+                del self._queues[session]
+
+    def acquire_sync(self, tokens: int = 1) -> float:
+        """Blocking variant for scripts — only the calling thread sleeps."""
+        started = time.monotonic()
+        while True:
+            wait = self._try_acquire(tokens)
+            if wait == 0.0:
+                return time.monotonic() - started
+            time.sleep(wait)
@@ -0,0 +1,324 @@
+"""
+VetConnect AI — vetbrain_sessions.py
+====================================
+Conversation state for vetbrain_api.
+
+Sessions are compact __slots__ records (no per-instance __dict__), and the
+correction log is a bounded ring buffer. Every backend evicts sessions that
+have been idle longer than the TTL, so memory stays bounded no matter how
+many session ids clients send.
+
+Backends (SESSION_BACKEND):
+  memory  — process-local LRU, single worker only (default)
+  sqlite  — one WAL-mode SQLite file, shared by every worker on the host
+  redis   — any Redis-protocol server, shared by every replica
+
+All backends use optimistic versioning: save() only succeeds if the stored
+version still matches the one that was loaded, otherwise SessionConflict is
+raised and the caller reloads and retries. Two turns on the same session that
+land on different workers therefore never silently overwrite each other.
+"""
+
+import asyncio
+import copy
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from typing import Optional
+
+CORRECTION_LOG_LIMIT = 20  # most recent corrections kept per session
+
+
+class SessionConflict(Exception):
+    """The session was saved by another turn since it was loaded."""
+
+
+class Session:
+    __slots__ = ("session_id", "stage", "data", "last_message", "last_seen", "correction_log", "version")
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.stage = "idle"
+        self.data: dict = {}
+        self.last_message = 0.0   # last accepted message (per-session throttle)
+        self.last_seen = time.time()
+        self.correction_log: deque = deque(maxlen=CORRECTION_LOG_LIMIT)
+        self.version = 0          # 0 = never saved
+
+    def reset(self, stage: str = "idle"):
+        """Drop booking progress and corrections"""
+        self.stage = stage
+        self.data = {}
+        self.correction_log.clear()
+
+    def snapshot(self) -> dict:
+        """Deep copy of the persisted fields, to diff what a turn changed"""
+        return copy.deepcopy(self.to_dict())
+
+    def apply_changes(self, before: dict, after: dict):
+        """Replay onto this session only what changed between two snapshots of another copy"""
+        if after["stage"] != before["stage"]:
+            self.stage = after["stage"]
+        if after["data"] != before["data"]:
+            for key in before["data"].keys() - after["data"].keys():
+                self.data.pop(key, None)
+            for key, value in after["data"].items():
+                if before["data"].get(key) != value:
+                    self.data[key] = value
+        if after["correction_log"] != before["correction_log"]:
+            self.correction_log.clear()
+            self.correction_log.extend(after["correction_log"])
+        self.last_message = max(self.last_message, after["last_message"])
+
+    def to_dict(self) -> dict:
+        return {
+            "stage": self.stage,
+            "data": self.data,
+            "last_message": self.last_message,
+            "correction_log": list(self.correction_log),
+        }
+
+    @classmethod
+    def from_dict(cls, session_id: str, payload: dict, version: int) -> "Session":
+        session = cls(session_id)
+        session.stage = payload.get("stage", "idle")
+        session.data = payload.get("data", {})
+        session.last_message = payload.get("last_message", 0.0)
+        session.correction_log.extend(payload.get("correction_log", []))
+        session.version = version
+        return session
+
+
+class SessionBackend(ABC):
+    """Interface shared by every session store."""
+
+    @abstractmethod
+    async def load(self, session_id: str) -> Optional[Session]:
+        ...
+
+    @abstractmethod
+    async def save(self, session: Session):
+        """Persist the session if nobody else saved it since it was loaded, else raise SessionConflict."""
+
+    @abstractmethod
+    async def delete(self, session_id: str):
+        ...
+
+    def sweep(self) -> int:
+        """Remove sessions idle longer than the TTL. Returns how many were evicted."""
+        return 0
+
+    async def get_or_create(self, session_id: str) -> Session:
+        return await self.load(session_id) or Session(session_id)
+
+    async def run_sweeper(self, interval_seconds: float):
+        """Background task: sweep expired sessions every interval"""
+        while True:
+            await asyncio.sleep(interval_seconds)
+            expired = await asyncio.to_thread(self.sweep)
+            if expired:
+                print(f"[SESSIONS] Evicted {expired} idle sessions.")
+
+    async def close(self):
+        pass
+
+
+class InMemorySessionStore(SessionBackend):
+    """Process-local store with idle-TTL and max-size LRU eviction."""
+
+    def __init__(self, ttl_seconds: float, max_sessions: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    async def load(self, session_id: str) -> Optional[Session]:
+        stored = self._sessions.get(session_id)
+        if stored is None:
+            return None
+        if time.time() - stored.last_seen > self.ttl_seconds:
+            del self._sessions[session_id]
+            return None
+        stored.last_seen = time.time()
+        self._sessions.move_to_end(session_id)
+        # Hand out a copy so an unsaved turn never leaks into the stored state
+        return Session.from_dict(session_id, copy.deepcopy(stored.to_dict()), stored.version)
+
+    async def save(self, session: Session):
+        stored = self._sessions.get(session.session_id)
+        if (stored.version if stored else 0) != session.version:
+            raise SessionConflict(session.session_id)
+        saved = Session.from_dict(session.session_id, copy.deepcopy(session.to_dict()), session.version + 1)
+        self._sessions[session.session_id] = saved
+        self._sessions.move_to_end(session.session_id)
+        session.version = saved.version
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    async def delete(self, session_id: str):
+        self._sessions.pop(session_id, None)
+
+    def sweep(self) -> int:
+        cutoff = time.time() - self.ttl_seconds
+        expired = 0
+        # Oldest-accessed first, so stop at the first session that is still fresh
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if session.last_seen > cutoff:
+                break
+            del self._sessions[session_id]
+            expired += 1
+        return expired
+
+
+class SQLiteSessionStore(SessionBackend):
+    """WAL-mode SQLite file — lets several uvicorn workers on one host share conversations."""
+
+    def __init__(self, path: str, ttl_seconds: float, max_sessions: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "session_id TEXT PRIMARY KEY, version INTEGER NOT NULL, "
+            "payload TEXT NOT NULL, last_seen REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS sessions_last_seen ON sessions (last_seen)")
+
+    def _load(self, session_id: str) -> Optional[Session]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT payload, version FROM sessions WHERE session_id = ? AND last_seen > ?",
+                (session_id, time.time() - self.ttl_seconds),
+            ).fetchone()
+        if row is None:
+            return None
+        return Session.from_dict(session_id, json.loads(row[0]), row[1])
+
+    def _save(self, session: Session):
+        payload = json.dumps(session.to_dict())
+        now = time.time()
+        with self._lock:
+            if session.version == 0:
+                # New session — may only replace a row that has already expired
+                cur = self._db.execute(
+                    "INSERT INTO sessions (session_id, version, payload, last_seen) VALUES (?, 1, ?, ?) "
+                    "ON CONFLICT (session_id) DO UPDATE SET version = 1, payload = excluded.payload, "
+                    "last_seen = excluded.last_seen WHERE sessions.last_seen <= ?",
+                    (session.session_id, payload, now, now - self.ttl_seconds),
+                )
+            else:
+                cur = self._db.execute(
+                    "UPDATE sessions SET version = version + 1, payload = ?, last_seen = ? "
+                    "WHERE session_id = ? AND version = ?",
+                    (payload, now, session.session_id, session.version),
+                )
+        if cur.rowcount != 1:
+            raise SessionConflict(session.session_id)
+        session.version += 1
+
+    def _delete(self, session_id: str):
+        with self._lock:
+            self._db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    async def load(self, session_id: str) -> Optional[Session]:
+        return await asyncio.to_thread(self._load, session_id)
+
+    async def save(self, session: Session):
+        await asyncio.to_thread(self._save, session)
+
+    async def delete(self, session_id: str):
+        await asyncio.to_thread(self._delete, session_id)
+
+    def sweep(self) -> int:
+        with self._lock:
+            expired = self._db.execute(
+                "DELETE FROM sessions WHERE last_seen <= ?", (time.time() - self.ttl_seconds,)
+            ).rowcount
+            overflow = self._db.execute(
+                "DELETE FROM sessions WHERE session_id IN ("
+                "SELECT session_id FROM sessions ORDER BY last_seen DESC LIMIT -1 OFFSET ?)",
+                (self.max_sessions,),
+            ).rowcount
+        return expired + overflow
+
+    async def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class RedisSessionStore(SessionBackend):
+    """
+    Redis-protocol store for multi-replica deployments.
+    Takes any redis.asyncio-compatible client, so tests can pass a local stand-in
+    such as fakeredis.aioredis.FakeRedis(). Idle expiry uses Redis key TTLs; the
+    max-size bound is the server's maxmemory policy (use allkeys-lru).
+    """
+
+    def __init__(self, client, ttl_seconds: float, prefix: str = "vetbrain:session:"):
+        self.client = client
+        self.ttl_seconds = int(ttl_seconds)
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str, ttl_seconds: float) -> "RedisSessionStore":
+        import redis.asyncio as redis_asyncio
+        return cls(redis_asyncio.from_url(url), ttl_seconds)
+
+    async def load(self, session_id: str) -> Optional[Session]:
+        key = self.prefix + session_id
+        raw = await self.client.get(key)
+        if raw is None:
+            return None
+        await self.client.expire(key, self.ttl_seconds)  # sliding idle TTL
+        record = json.loads(raw)
+        return Session.from_dict(session_id, record["session"], record["version"])
+
+    async def save(self, session: Session):
+        from redis.exceptions import WatchError
+
+        key = self.prefix + session.session_id
+        record = json.dumps({"version": session.version + 1, "session": session.to_dict()})
+        try:
+            async with self.client.pipeline(transaction=True) as pipe:
+                await pipe.watch(key)
+                raw = await pipe.get(key)
+                if (json.loads(raw)["version"] if raw else 0) != session.version:
+                    raise SessionConflict(session.session_id)
+                pipe.multi()
+                pipe.set(key, record, ex=self.ttl_seconds)
+                await pipe.execute()
+        except WatchError:
+            raise SessionConflict(session.session_id)
+        session.version += 1
+
+    async def delete(self, session_id: str):
+        await self.client.delete(self.prefix + session_id)
+
+    async def close(self):
+        await self.client.aclose()
+
+
+def create_session_store(ttl_seconds: float, max_sessions: int) -> SessionBackend:
+    """Build the backend selected by SESSION_BACKEND (memory | sqlite | redis)"""
+    backend = os.getenv("SESSION_BACKEND", "memory").lower()
+    if backend == "sqlite":
+        cache_dir = os.getenv("VETBRAIN_CACHE_DIR", ".vetbrain_cache")
+        path = os.getenv("SESSION_SQLITE_PATH", os.path.join(cache_dir, "sessions.sqlite3"))
+        print(f"[SESSIONS] SQLite backend at {path}")
+        return SQLiteSessionStore(path, ttl_seconds, max_sessions)
+    if backend == "redis":
+        url = os.getenv("SESSION_REDIS_URL", "redis://localhost:6379/0")
+        print(f"[SESSIONS] Redis backend at {url}")
+        return RedisSessionStore.from_url(url, ttl_seconds)
+    return InMemorySessionStore(ttl_seconds, max_sessions)
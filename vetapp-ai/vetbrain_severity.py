@@ -0,0 +1,158 @@
+"""
+VetConnect AI — vetbrain_severity.py
+====================================
+Local severity classifier — the fast path in front of the LLM severity check.
+
+A distance-weighted kNN over MiniLM embeddings of:
+  • SEVERITY_EXAMPLES — hand-labelled owner messages and ordinary booking chatter
+    like "confirm" (never the evaluator's safety cases, which stay held out)
+  • clean-data.csv rows — weak labels: Dangerous=yes → urgent, no → normal
+
+It answers when the neighbours agree (vote share ≥ SEVERITY_CONFIDENCE) and the
+message is close to a hand-labelled example (similarity ≥ SEVERITY_MIN_SIMILARITY);
+the weak rows can tip a vote but never make a message look familiar on their own.
+Anything else is escalated to the LLM. When the LLM is asked, its answer is
+compared with the local guess, and a sample of confident local answers
+(SEVERITY_SHADOW_RATE) is double-checked the same way, so agreement is measured
+on both paths.
+"""
+
+import os
+import random
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from vetbrain_index import dot_rows, stored_rows
+
+SEVERITY_CONFIDENCE = float(os.getenv("VETBRAIN_SEVERITY_CONFIDENCE", "0.8"))  # > 1 disables the fast path
+SEVERITY_MIN_SIMILARITY = 0.6
+SEVERITY_SHADOW_RATE = float(os.getenv("VETBRAIN_SEVERITY_SHADOW_RATE", "0.05"))
+SEVERITY_NEIGHBOURS = 7
+WEAK_LABEL_WEIGHT = 0.3   # clean-data.csv rows count less than hand-labelled examples
+
+TIERS = ("acute", "urgent", "normal")
+
+SEVERITY_EXAMPLES: List[Tuple[str, str]] = [
+    # evaluate_vetbrain.py's SAFETY_CASES are deliberately left out, so the hit rate
+    # and agreement it reports are measured on messages the classifier has never seen
+
+    # Acute
+    ("my dog was hit by a car and is bleeding a lot", "acute"),
+    ("there is blood everywhere, the wound won't stop bleeding", "acute"),
+    ("my cat fell from the third floor and can't stand up", "acute"),
+    ("my dog's belly is swollen and hard and he keeps trying to vomit", "acute"),
+    ("my male cat is straining and can't pee at all", "acute"),
+    ("my goat is lying down and not responding", "acute"),
+    ("dinudugo ang aso ko at hindi tumitigil", "acute"),
+    ("nahihirapan huminga ang pusa ko", "acute"),
+    ("my dog suddenly fell over and is not moving", "acute"),
+
+    # Urgent
+    ("my dog has had diarrhea for four days now", "urgent"),
+    ("my cat hasn't eaten anything in three days", "urgent"),
+    ("my puppy keeps vomiting and it's getting worse", "urgent"),
+    ("my dog is limping and crying in pain when touched", "urgent"),
+    ("the wound on my dog's leg is swollen and smells bad", "urgent"),
+    ("my rabbit hasn't pooped since yesterday and won't eat", "urgent"),
+    ("my pig has a high fever, diarrhea and is not eating", "urgent"),
+    ("ilang araw nang nagsusuka ang aso ko", "urgent"),
+    ("hindi kumakain ang pusa ko ng tatlong araw at matamlay", "urgent"),
+    ("my dog's eye is red and swollen and not improving", "urgent"),
+
+    # Normal — routine questions
+    ("my dog sneezed a few times today", "normal"),
+    ("my cat is a bit tired today", "normal"),
+    ("my dog didn't finish his food this morning", "normal"),
+    ("when should my puppy get his first shots", "normal"),
+    ("I want to have my cat spayed", "normal"),
+    ("how often should I deworm my puppy", "normal"),
+    ("my dog is licking his paws", "normal"),
+    ("magpapabakuna ako ng aso", "normal"),
+    ("magpapagupit ako ng aso ko", "normal"),
+    ("maliksi naman ang aso ko pero may konting ubo", "normal"),
+
+    # Normal — booking chatter
+    ("hello", "normal"),
+    ("hi, good morning", "normal"),
+    ("book an appointment", "normal"),
+    ("I'd like to schedule a visit", "normal"),
+    ("consultation", "normal"),
+    ("grooming", "normal"),
+    ("confirm", "normal"),
+    ("yes", "normal"),
+    ("no", "normal"),
+    ("cancel", "normal"),
+    ("thank you", "normal"),
+    ("dog", "normal"),
+    ("cat", "normal"),
+    ("labrador", "normal"),
+    ("persian", "normal"),
+    ("Max", "normal"),
+    ("Luna", "normal"),
+    ("03/20/2030 10:00 AM", "normal"),
+    ("tomorrow at 3pm", "normal"),
+    ("actually it's vaccination not grooming", "normal"),
+    ("what are your clinic hours", "normal"),
+]
+
+
+class SeverityClassifier:
+    """kNN severity classifier with escalation stats."""
+
+    def __init__(self, vectors: Union[np.ndarray, Sequence[np.ndarray]], labels: List[str],
+                 weights: Optional[np.ndarray] = None,
+                 confidence: float = SEVERITY_CONFIDENCE, neighbours: int = SEVERITY_NEIGHBOURS):
+        """
+        vectors: one matrix, or several stacked in label order (scored in place, not copied).
+        weights: 1.0 for hand-labelled rows, less for weak labels (default: all hand-labelled)
+        """
+        self.blocks = [stored_rows(v) for v in (vectors if isinstance(vectors, (list, tuple)) else [vectors])]
+        self.labels = np.array([TIERS.index(label) for label in labels])
+        self.weights = np.ones(len(labels), dtype=np.float32) if weights is None else weights.astype(np.float32)
+        self.curated = self.weights >= 1.0
+        self.confidence = confidence
+        self.neighbours = min(neighbours, len(labels))
+        self._lock = threading.Lock()
+        self.counts = {"local": 0, "escalated": 0, "compared": 0, "agreed": 0}
+
+    def predict(self, embedding: np.ndarray) -> Tuple[str, float, float]:
+        """(tier, vote share of that tier, similarity of the nearest hand-labelled example)"""
+        query = embedding / max(float(np.linalg.norm(embedding)), 1e-12)
+        sims = np.concatenate([dot_rows(block, query) for block in self.blocks])
+        nearest = np.argpartition(-sims, self.neighbours - 1)[:self.neighbours]
+        votes = np.zeros(len(TIERS), dtype=np.float32)
+        np.add.at(votes, self.labels[nearest], self.weights[nearest] * np.maximum(sims[nearest], 0.0))
+        total = float(votes.sum())
+        best = int(votes.argmax())
+        share = float(votes[best]) / total if total > 0 else 0.0
+        familiar = float(sims[self.curated].max()) if self.curated.any() else 0.0
+        return TIERS[best], share, familiar
+
+    def classify(self, embedding: np.ndarray) -> Tuple[Optional[str], str]:
+        """
+        Returns (tier or None, local guess). tier is None when the LLM should decide.
+        """
+        tier, share, familiar = self.predict(embedding)
+        confident = share >= self.confidence and familiar >= SEVERITY_MIN_SIMILARITY
+        with self._lock:
+            self.counts["local" if confident else "escalated"] += 1
+        return (tier if confident else None), tier
+
+    def should_shadow(self) -> bool:
+        """Sample a confident local answer for an LLM double-check"""
+        return random.random() < SEVERITY_SHADOW_RATE
+
+    def record_agreement(self, local_tier: str, llm_tier: str):
+        with self._lock:
+            self.counts["compared"] += 1
+            self.counts["agreed"] += int(local_tier == llm_tier)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            counts = dict(self.counts)
+        decided = counts["local"] + counts["escalated"]
+        counts["hit_rate"] = round(counts["local"] / decided, 4) if decided else 0.0
+        counts["agreement"] = round(counts["agreed"] / counts["compared"], 4) if counts["compared"] else 0.0
+        return counts
@@ -0,0 +1,150 @@
+"""
+VetConnect AI — vetbrain_storage.py
+===================================
+Compact on-disk embedding matrices, memory-mapped read-only by every process
+(VETBRAIN_EMBEDDING_STORAGE).
+
+  float32 — unit rows as encoded (reference)
+  float16 — half the size (default)
+  int8    — a quarter of the size: codes = round(row / scale), one float32 scale
+            per row (scale = max |row| / 127), saved as `<stem>.npy` + `<stem>.scales.npy`
+
+Files are opened with np.load(mmap_mode="r"), so uvicorn workers, the evaluator
+and the benchmarks on one host share a single page-cache copy of each matrix
+instead of holding a private one each. Scoring upcasts blocks to float32
+(see vetbrain_index.dot_rows); queries themselves stay float32.
+
+Cosine tolerance against the float32 path (max absolute error, unit queries):
+  float16 — ≤ 1e-3   (11-bit mantissa: ≤ 2^-11 relative error per element)
+  int8    — ≤ 1e-2   (≤ scale / 2 per element; typically ~1e-3 on MiniLM rows)
+
+    python vetbrain_storage.py   — measured error and top-5 agreement vs float32
+"""
+
+import os
+from typing import Optional
+
+import numpy as np
+
+STORAGE_FORMATS = ("float32", "float16", "int8")
+STORAGE_TOLERANCE = {"float32": 1e-6, "float16": 1e-3, "int8": 1e-2}
+
+EMBEDDING_STORAGE = os.getenv("VETBRAIN_EMBEDDING_STORAGE", "float16").lower()
+if EMBEDDING_STORAGE not in STORAGE_FORMATS:
+    print(f"⚠️  Unknown VETBRAIN_EMBEDDING_STORAGE '{EMBEDDING_STORAGE}'. Using float16.")
+    EMBEDDING_STORAGE = "float16"
+
+
+class QuantizedRows:
+    """int8 rows with one float32 scale per row: row ≈ codes * scale"""
+
+    dtype = np.dtype(np.int8)
+
+    def __init__(self, codes: np.ndarray, scales: np.ndarray):
+        self.codes = codes
+        self.scales = scales
+
+    @property
+    def shape(self):
+        return self.codes.shape
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + self.scales.nbytes
+
+    def __len__(self) -> int:
+        return self.codes.shape[0]
+
+    def __getitem__(self, rows) -> "QuantizedRows":
+        return QuantizedRows(self.codes[rows], self.scales[rows])
+
+    def dequantize(self) -> np.ndarray:
+        return self.codes.astype(np.float32) * self.scales[:, None]
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        matrix = self.dequantize()
+        return matrix if dtype is None else matrix.astype(dtype, copy=False)
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """float32 copy with unit-length rows (cosine similarity becomes a dot product)"""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def quantize_int8(matrix: np.ndarray) -> QuantizedRows:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    scales = (np.abs(matrix).max(axis=1) / 127.0).astype(np.float32) if matrix.shape[0] else np.zeros(0, np.float32)
+    scales = np.maximum(scales, 1e-12)
+    codes = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype(np.int8)
+    return QuantizedRows(codes, scales)
+
+
+def to_storage(matrix: np.ndarray, storage: str = EMBEDDING_STORAGE):
+    """Unit rows in the given storage format (in memory)"""
+    matrix = normalize_rows(matrix)
+    if storage == "int8":
+        return quantize_int8(matrix)
+    return matrix.astype(np.float16) if storage == "float16" else matrix
+
+
+def _scales_path(path: str) -> str:
+    return f"{os.path.splitext(path)[0]}.scales.npy"
+
+
+def _save_array(path: str, array: np.ndarray):
+    # Write-then-rename so concurrent workers never map a partial file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+def save_embeddings(path: str, matrix, storage: str = EMBEDDING_STORAGE):
+    """Save a matrix (already converted with to_storage) to path (+ scales for int8)"""
+    if storage == "int8":
+        _save_array(_scales_path(path), matrix.scales)
+        _save_array(path, matrix.codes)
+    else:
+        _save_array(path, np.asarray(matrix))
+
+
+def load_embeddings(path: str, storage: str = EMBEDDING_STORAGE, mmap: bool = True):
+    """Read-only memory map of a saved matrix (np.memmap, or QuantizedRows for int8)"""
+    mode: Optional[str] = "r" if mmap else None
+    codes = np.load(path, mmap_mode=mode)
+    if storage == "int8":
+        return QuantizedRows(codes, np.load(_scales_path(path), mmap_mode=mode))
+    return codes
+
+
+if __name__ == "__main__":
+    # Tolerance check: python vetbrain_storage.py [cached .npy files written as float32 ...]
+    import sys
+
+    # Same module object vetbrain_index checks isinstance against (not this __main__ copy)
+    from vetbrain_storage import to_storage
+    from vetbrain_index import dot_rows, top_k
+
+    rng = np.random.default_rng(0)
+    if len(sys.argv) > 1:
+        corpora = {os.path.basename(p): np.load(p).astype(np.float32) for p in sys.argv[1:]}
+    else:
+        # Clustered synthetic corpus with MiniLM's shape
+        topics = rng.standard_normal((50, 384), dtype=np.float32)
+        corpora = {"synthetic": topics[rng.integers(0, 50, 5000)] + 0.5 * rng.standard_normal((5000, 384), dtype=np.float32)}
+
+    for name, matrix in corpora.items():
+        reference = normalize_rows(matrix)
+        queries = normalize_rows(reference[rng.choice(len(reference), 100)] + 0.3 * rng.standard_normal(
+            (100, reference.shape[1]), dtype=np.float32))
+        truth = [dot_rows(reference, q) for q in queries]
+        for storage in STORAGE_FORMATS:
+            stored = to_storage(matrix, storage)
+            scores = [dot_rows(stored, q) for q in queries]
+            error = max(float(np.abs(s - t).max()) for s, t in zip(scores, truth))
+            overlap = np.mean([len(set(top_k(s, 5)) & set(top_k(t, 5))) / 5 for s, t in zip(scores, truth)])
+            status = "✅" if error <= STORAGE_TOLERANCE[storage] else "❌"
+            print(f"{name:<24} {storage:<8} {stored.nbytes / 1024:>9.0f} KB  max |Δcos| {error:.2e} "
+                  f"(≤ {STORAGE_TOLERANCE[storage]:.0e} {status})  top-5 agreement {overlap:.3f}")